@@ -1,9 +1,10 @@
 # app.py
 import os, time, webbrowser, sys, threading
-from flask import Flask, render_template, g, request, Blueprint
+from flask import Flask, render_template, g, request, Blueprint, Response
 from dotenv import load_dotenv
 from time import perf_counter
-from db import fetch_one
+import metrics
+import quarters
 
 def _load_env_external():
     """Load .env from safe locations without bundling, and never override real OS env."""
@@ -55,14 +56,14 @@ def create_app():
     )
     app.config["SECRET_KEY"] = os.getenv("FLASK_SECRET", "dev-secret")
 
-    # --- non-blocking schema warm ---
+    # --- non-blocking schema check (one version query; migrates only if behind) ---
     def _warm():
         with app.app_context():
-            from routes.admin import _ensure_min_schema
+            from migrate import ensure_current
             try:
-                _ensure_min_schema()
+                ensure_current()
             except Exception as e:
-                app.logger.error("Schema warm failed: %s", e)
+                app.logger.error("Schema migration failed: %s", e)
 
     # Kick it off right away in the background
     threading.Thread(target=_warm, daemon=True).start()
@@ -75,11 +76,17 @@ def create_app():
     def _t1(resp):
         try:
             dt = (perf_counter() - g._t0) * 1000
+            metrics.HTTP_SECONDS.observe(dt / 1000, endpoint=request.endpoint or "unmatched",
+                                         method=request.method, status=resp.status_code)
             app.logger.info("HTTP %.1fms %s %s", dt, request.method, request.path)
         except Exception:
             pass
         return resp
 
+    @app.get("/metrics")
+    def metrics_text():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
     # Blueprints
     from routes.api import bp as api_bp
     from routes.admin import bp as admin_bp
@@ -90,15 +97,8 @@ def create_app():
 
     @app.get("/")
     def index():
-        # fetch current quarter name (null-safe)
-        row = fetch_one("""
-            SELECT COALESCE(name, code) AS title
-            FROM quarters
-            WHERE is_current = TRUE
-            LIMIT 1
-        """)
-        current = (row or {}).get("title") or ""
-        return render_template("index.html", current_quarter=current)
+        # current quarter title, cached per process (quarters.py)
+        return render_template("index.html", current_quarter=quarters.current_title())
 
     return app
 
@@ -122,4 +122,9 @@ if __name__ == "__main__":
     if os.environ.get("WERKZEUG_RUN_MAIN") == "true" or not app.debug:
         threading.Thread(target=_open, daemon=True).start()
 
-    app.run(host=host, port=port, debug=(not is_frozen))
\ No newline at end of file
+    if is_frozen:
+        # the exe serves real traffic: waitress, not the single-threaded dev server
+        from serve import serve
+        serve(app, host=host, port=port)
+    else:
+        app.run(host=host, port=port, debug=True)
\ No newline at end of file
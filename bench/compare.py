@@ -0,0 +1,43 @@
+# bench/compare.py
+# Side-by-side of two bench/run.py reports:
+#   python bench/compare.py base.json head.json [--fail-over 20]
+# --fail-over N exits 1 when any scenario's p95 got more than N% slower.
+import sys, json, argparse
+
+COLS = ("rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def _delta(a: float, b: float) -> str:
+    if not a:
+        return "   n/a"
+    return f"{(b - a) / a * 100:+6.1f}%"
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare two benchmark reports")
+    ap.add_argument("base")
+    ap.add_argument("head")
+    ap.add_argument("--fail-over", type=float, help="max allowed p95 regression in percent")
+    a = ap.parse_args()
+    with open(a.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(a.head, encoding="utf-8") as f:
+        head = json.load(f)
+
+    print(f"base {base['meta'].get('commit')}  ->  head {head['meta'].get('commit')}")
+    print(f"{'scenario':13s}" + "".join(f"{c:>26s}" for c in COLS))
+    regressed = []
+    for name in sorted(set(base["scenarios"]) | set(head["scenarios"])):
+        b, h = base["scenarios"].get(name), head["scenarios"].get(name)
+        if not b or not h:
+            print(f"{name:13s}  (only in {'head' if h else 'base'})")
+            continue
+        cells = "".join(f"{b[c]:9.1f} -> {h[c]:7.1f} {_delta(b[c], h[c])}" for c in COLS)
+        print(f"{name:13s}{cells}")
+        if a.fail_over is not None and b["p95_ms"] and (h["p95_ms"] - b["p95_ms"]) / b["p95_ms"] * 100 > a.fail_over:
+            regressed.append(name)
+    if regressed:
+        print(f"p95 regressed more than {a.fail_over}%: {', '.join(regressed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# bench/normalize.py
+# Upload normalisation: timing of routes.admin._normalize_chunk against the per-cell
+# implementation it replaced (kept below as `reference_normalize`):
+#   python bench/normalize.py --rows 100000 --repeat 5
+# The golden check (`reference` vs what _stage_upload stages) is tests/test_normalize.py.
+# No database is touched, but importing routes.admin needs DATABASE_URL set (the engine
+# connects lazily).
+import os, re, sys, time, random, argparse
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
+
+import pandas as pd
+
+ROLES = ["developer", "Tester", " designer ", "Analyst", "architect", "DevOps"]
+
+
+def reference_normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """_normalize_chunk before vectorisation: a Python call (and regex) per cell."""
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    rename_in = {
+        "reserved sprints": "reserved_sprints",
+        "assignment type": "assign_type",
+        "assign_type": "assign_type"
+    }
+    for k, v in rename_in.items():
+        if k in df.columns and v not in df.columns:
+            df.rename(columns={k: v}, inplace=True)
+
+    required_cols = {"tribe","app","resource","role","reserved_sprints"}
+    missing = [c for c in required_cols if c not in set(df.columns)]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+    def _canon(s: str) -> str:
+        s = str(s or "").strip()
+        s = re.sub(r"\s+", " ", s)
+        return s
+    def _title(s: str) -> str:
+        s = _canon(s)
+        return s[:1].upper() + s[1:] if s else s
+
+    df["tribe"]    = df["tribe"].map(_canon)
+    df["tribe"]    = df["tribe"].str.replace(r"\bops\b", "Operations", regex=True)
+    df["app"]      = df["app"].map(_canon)
+    df["resource"] = df["resource"].map(_title)
+    df["role"]     = df["role"].map(_title)
+
+    df["reserved_sprints"] = pd.to_numeric(df["reserved_sprints"], errors="coerce").fillna(0).astype(int)
+    df.loc[df["reserved_sprints"] < 0, "reserved_sprints"] = 0
+    df.loc[df["reserved_sprints"] > 6, "reserved_sprints"] = 6
+    return df
+
+
+def reference(df: pd.DataFrame) -> pd.DataFrame:
+    """The whole-sheet upload result before staging moved to SQL: normalize, drop duplicates, classify."""
+    df = reference_normalize(df)
+    df = df.drop_duplicates(subset=["tribe","app","resource","role"])
+
+    agg = df.groupby("resource").agg(
+        total_reserved=("reserved_sprints","sum"),
+        tribes=("tribe","nunique"),
+    ).reset_index()
+
+    atype_map = {}
+    for row in agg.itertuples(index=False):
+        if row.tribes == 1 and row.total_reserved == 6:
+            atype = "Dedicated"
+        else:
+            atype = "Shared"
+        atype_map[row.resource] = atype
+    df["assign_type"] = df["resource"].map(atype_map)
+    return df
+
+
+def messy_sheet(rows: int, seed: int) -> pd.DataFrame:
+    """
+    Upload-shaped frame as pd.read_excel returns it, with the mess real sheets have:
+    stray/odd whitespace, lower-case names, "ops" tribes, empty and NaN cells, numbers
+    in text columns, out-of-range and non-numeric sprints, and duplicate rows.
+    """
+    rnd = random.Random(seed)
+    resources = max(1, rows // 3)
+    ws = [" ", "  ", "\t", "\u00a0", " \n "]
+    blank = [None, float("nan"), "", "   ", 0]
+
+    def name(base: str) -> str:
+        r = rnd.random()
+        if r < 0.03:
+            return rnd.choice(blank)
+        if r < 0.05:
+            return rnd.randint(1, 20)
+        if r < 0.25:
+            return rnd.choice(ws) + base.replace(" ", rnd.choice(ws)) + rnd.choice(ws)
+        if r < 0.35:
+            return base.lower()
+        return base
+
+    out = []
+    for _ in range(rows):
+        t = rnd.randrange(60)
+        tribe = f"Tribe {t:02d}" if t % 7 else f"ops {t:02d}"
+        sprints = rnd.choice([1, 2, 3, 6, 6, 0, -1, 9, 2.0, "3", "x", None, float("nan")])
+        out.append({
+            "Tribe": name(tribe),
+            "App": name(f"App {t:02d}-{rnd.randint(1, 4)}"),
+            "Resource": name(f"resource {rnd.randrange(resources):05d}"),
+            "Role": name(rnd.choice(ROLES)),
+            "Reserved Sprints": sprints,
+        })
+    return pd.DataFrame(out, columns=["Tribe", "App", "Resource", "Role", "Reserved Sprints"])
+
+
+def _best(fn, df: pd.DataFrame, repeat: int) -> tuple[float, pd.DataFrame]:
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        frame = df.copy()
+        t0 = time.perf_counter()
+        out = fn(frame)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark for upload normalisation")
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--repeat", type=int, default=5)
+    a = ap.parse_args()
+
+    from routes.admin import _normalize_chunk
+
+    df = messy_sheet(a.rows, 0)
+    t_ref, _ = _best(reference_normalize, df, a.repeat)
+    t_new, _ = _best(_normalize_chunk, df, a.repeat)
+    print(f"{a.rows} rows, best of {a.repeat}: reference {t_ref * 1000:.1f}ms  "
+          f"vectorised {t_new * 1000:.1f}ms  ({t_ref / t_new:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+# bench/run.py
+# Load benchmark for the booking hot paths. Drives the app over real HTTP with
+# concurrent clients and writes throughput + latency percentiles as JSON:
+#   python bench/run.py --seed --clients 8 --requests 400 --out bench/results/$(git rev-parse --short HEAD).json
+#   python bench/compare.py bench/results/old.json bench/results/new.json
+# By default the app runs in this process under waitress (serve.settings()); --url
+# targets a server started elsewhere (python serve.py), which is closer to production.
+# --seed first loads a synthetic quarter through the upload path (bench/seed.py) and
+# WIPES plan data: use a scratch database.
+import os, sys, json, math, time, random, argparse, threading, platform, subprocess
+import http.client
+from urllib.parse import urlsplit, urlencode
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
+
+from db import fetch_all, get_current_qid
+
+
+# ---------- HTTP ----------
+class Client:
+    """One keep-alive connection per benchmark thread."""
+    def __init__(self, base_url: str):
+        u = urlsplit(base_url)
+        self.host, self.port = u.hostname, u.port or 80
+        self.conn = None
+
+    def request(self, method: str, path: str, body=None) -> tuple[int, bytes]:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        data = json.dumps(body).encode() if body is not None else None
+        for attempt in (0, 1):  # reconnect once if the server closed an idle socket
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+            try:
+                self.conn.request(method, path, body=data, headers=headers)
+                resp = self.conn.getresponse()
+                return resp.status, resp.read()
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+def _start_server():
+    from waitress import create_server
+    from app import create_app
+    from serve import settings
+    server = create_server(create_app(), host="127.0.0.1", port=0, **settings())
+    threading.Thread(target=server.run, daemon=True).start()
+    return f"http://127.0.0.1:{server.effective_port}", server
+
+
+# ---------- stats ----------
+def _pct(sorted_ms: list[float], p: float) -> float:
+    if not sorted_ms:
+        return 0.0
+    k = min(len(sorted_ms) - 1, max(0, math.ceil(p / 100 * len(sorted_ms)) - 1))  # nearest rank
+    return round(sorted_ms[k], 2)
+
+def _summary(lat_ms: list[float], statuses: dict, seconds: float) -> dict:
+    lat = sorted(lat_ms)
+    n = len(lat)
+    return {
+        "requests": n,
+        "errors": sum(v for k, v in statuses.items() if int(k) >= 500),
+        "status": {str(k): v for k, v in sorted(statuses.items())},
+        "seconds": round(seconds, 3),
+        "rps": round(n / seconds, 1) if seconds else 0.0,
+        "mean_ms": round(sum(lat) / n, 2) if n else 0.0,
+        "p50_ms": _pct(lat, 50),
+        "p95_ms": _pct(lat, 95),
+        "p99_ms": _pct(lat, 99),
+        "max_ms": round(lat[-1], 2) if lat else 0.0,
+    }
+
+def drive(base_url: str, clients: int, requests: int, make_request) -> dict:
+    """Run `requests` calls of make_request(rnd) -> (method, path, body) over `clients` threads."""
+    lock = threading.Lock()
+    todo = iter(range(requests))
+    lat_ms, statuses = [], {}
+
+    def worker(seed):
+        c, rnd = Client(base_url), random.Random(seed)
+        mine, codes = [], {}
+        while True:
+            with lock:
+                if next(todo, None) is None:
+                    break
+            method, path, body = make_request(rnd)
+            t0 = time.perf_counter()
+            try:
+                status, _ = c.request(method, path, body)
+            except Exception:
+                status = 599
+            mine.append((time.perf_counter() - t0) * 1000)
+            codes[status] = codes.get(status, 0) + 1
+        with lock:
+            lat_ms.extend(mine)
+            for k, v in codes.items():
+                statuses[k] = statuses.get(k, 0) + v
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return _summary(lat_ms, statuses, time.perf_counter() - t0)
+
+
+# ---------- scenarios ----------
+def _fixtures(qid: int) -> dict:
+    temps = fetch_all("""
+        SELECT ta.id, ta.tribe_name, r.name AS resource_name, r.role
+        FROM temp_assignments ta JOIN resources r ON r.id = ta.resource_id
+        WHERE ta.quarter_id = :qid
+    """, qid=qid)
+    if not temps:
+        sys.exit("No temp assignments in the current quarter (run with --seed)")
+    return {"temps": temps}
+
+def _booked_ids(qid: int) -> list[int]:
+    return [r["id"] for r in fetch_all(
+        "SELECT id FROM master_assignments WHERE quarter_id = :qid", qid=qid)]
+
+def _sprints(rnd):
+    return rnd.sample(range(1, 7), rnd.randint(1, 2))
+
+def scenarios(fx: dict, qid: int):
+    temps = fx["temps"]
+
+    def availability(rnd):
+        t = rnd.choice(temps)
+        q = urlencode({"tribe": t["tribe_name"], "resource_name": t["resource_name"], "role": t["role"] or ""})
+        return "GET", f"/api/availability?{q}", None
+
+    def book_temp(rnd):
+        return "POST", f"/api/book-temp/{rnd.choice(temps)['id']}", {"sprints": _sprints(rnd)}
+
+    def patch(rnd):
+        if "booked" not in fx:  # first call, after book_temp ran
+            fx["booked"] = _booked_ids(qid) or [0]
+        ids = fx["booked"]
+        return "PATCH", f"/api/assignments/{rnd.choice(ids)}", {f"s{s}": bool(rnd.getrandbits(1)) for s in _sprints(rnd)}
+
+    def assignments(rnd):
+        return "GET", "/api/assignments", None
+
+    def export(rnd):
+        return "GET", "/api/export?format=csv", None
+
+    # order matters: book_temp creates the rows patch edits
+    return [("availability", availability), ("book_temp", book_temp), ("patch", patch),
+            ("assignments", assignments), ("export", export)]
+
+
+def _git_commit() -> str|None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BASE,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def main():
+    ap = argparse.ArgumentParser(description="Booking hot-path load benchmark")
+    ap.add_argument("--url", help="benchmark a running server instead of an in-process one")
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--requests", type=int, default=400, help="per scenario")
+    ap.add_argument("--export-requests", type=int, default=20)
+    ap.add_argument("--only", help="comma-separated scenario names")
+    ap.add_argument("--seed", action="store_true", help="load a synthetic quarter first (wipes plan data)")
+    ap.add_argument("--resources", type=int, default=500)
+    ap.add_argument("--tribes", type=int, default=40)
+    ap.add_argument("--reservations", type=int, default=1500)
+    ap.add_argument("--out", help="write JSON here (default: stdout)")
+    a = ap.parse_args()
+
+    seeded = None
+    if a.seed:
+        from seed import seed
+        seeded = seed(a.resources, a.tribes, a.reservations, "BENCH-Q")
+
+    server = None
+    base_url = a.url
+    if not base_url:
+        base_url, server = _start_server()
+
+    qid = get_current_qid()
+    fx = _fixtures(qid)
+    only = set(a.only.split(",")) if a.only else None
+    results = {}
+    for name, make in scenarios(fx, qid):
+        if only and name not in only:
+            continue
+        n = a.export_requests if name == "export" else a.requests
+        results[name] = drive(base_url, a.clients, n, make)
+        print(f"{name:13s} {results[name]['rps']:8.1f} req/s  p50 {results[name]['p50_ms']:7.1f}ms  "
+              f"p95 {results[name]['p95_ms']:7.1f}ms  p99 {results[name]['p99_ms']:7.1f}ms  "
+              f"status {results[name]['status']}", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "server": "external" if a.url else "in-process waitress",
+            "clients": a.clients,
+            "requests": a.requests,
+            "temp_rows": len(fx["temps"]),
+            "seeded": seeded,
+        },
+        "scenarios": results,
+    }
+    out = json.dumps(report, indent=2)
+    if a.out:
+        os.makedirs(os.path.dirname(os.path.abspath(a.out)), exist_ok=True)
+        with open(a.out, "w", encoding="utf-8") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+    if server is not None:
+        server.close()
+
+if __name__ == "__main__":
+    main()
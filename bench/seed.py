@@ -0,0 +1,76 @@
+# bench/seed.py
+# Synthetic quarter for the benchmarks, loaded through the normal upload path
+# (routes.admin._perform_upload: normalize, classify, COPY, reseed).
+#   python bench/seed.py --resources 500 --tribes 40 --reservations 1500 --quarter BENCH-Q
+# WARNING: an upload wipes and reseeds plan data for every quarter. Point DATABASE_URL
+# at a scratch database.
+import os, sys, random, argparse
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
+
+import pandas as pd
+
+ROLES = ["Developer", "Tester", "Designer", "Analyst", "Architect", "Devops"]
+
+
+def synthetic_plan(resources: int, tribes: int, reservations: int, seed: int = 7) -> pd.DataFrame:
+    """
+    Upload-shaped frame (tribe, app, resource, role, reserved_sprints) with `reservations`
+    rows spread over `resources` resources and `tribes` tribes. A resource's reserved
+    sprints never sum past 6, so the plan passes /admin/upload-validate; every tenth
+    resource goes to a single tribe for all 6 sprints (classified Dedicated).
+    """
+    rnd = random.Random(seed)
+    room = {r: 6 for r in range(resources)}
+    taken = {r: set() for r in range(resources)}
+    rows = []
+    r = 0
+    for _ in range(reservations * 4):  # bounded: stops early once resources are full
+        if len(rows) >= reservations or not room:
+            break
+        r = (r + 1) % resources
+        if r not in room:
+            continue
+        free = [t for t in range(tribes) if t not in taken[r]]
+        if not free:
+            room.pop(r)
+            continue
+        t = rnd.choice(free)
+        n = 6 if r % 10 == 0 and not taken[r] else min(room[r], rnd.randint(1, 3))
+        taken[r].add(t)
+        room[r] -= n
+        if room[r] <= 0:
+            room.pop(r)
+        rows.append({
+            "tribe": f"Tribe {t:03d}",
+            "app": f"App {t:03d}-{rnd.randint(1, 3)}",
+            "resource": f"Resource {r:05d}",
+            "role": ROLES[r % len(ROLES)],
+            "reserved_sprints": n,
+        })
+    return pd.DataFrame(rows, columns=["tribe", "app", "resource", "role", "reserved_sprints"])
+
+def seed(resources: int, tribes: int, reservations: int, quarter: str, seed: int = 7) -> dict:
+    """Upload the synthetic plan into `quarter` (created and made current if new)."""
+    from routes.admin import _perform_upload
+    from db import fetch_one
+
+    df = synthetic_plan(resources, tribes, reservations, seed)
+    exists = fetch_one("SELECT id FROM quarters WHERE code = :v OR name = :v LIMIT 1", v=quarter)
+    if exists:
+        from db import execute
+        execute("UPDATE quarters SET is_current = (id = :id)", id=exists["id"])
+    rows, qid = _perform_upload(df, "current" if exists else "new", None if exists else quarter)
+    return {"quarter_id": qid, "quarter": quarter, "rows": rows,
+            "resources": resources, "tribes": tribes, "reservations": reservations, "seed": seed}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Seed a synthetic quarter through the upload path")
+    ap.add_argument("--resources", type=int, default=500)
+    ap.add_argument("--tribes", type=int, default=40)
+    ap.add_argument("--reservations", type=int, default=1500)
+    ap.add_argument("--quarter", default="BENCH-Q")
+    ap.add_argument("--seed", type=int, default=7)
+    a = ap.parse_args()
+    print(seed(a.resources, a.tribes, a.reservations, a.quarter, a.seed))
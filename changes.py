@@ -0,0 +1,73 @@
+# changes.py
+# Per-quarter data version, bumped by every write that changes what the list endpoints
+# return (booking, patch, upload). Read endpoints turn it into a weak ETag and answer
+# If-None-Match with 304 before touching the database.
+# Versions live in this process; the boot token in the ETag makes a restart
+# invalidate every tag handed out before it. Other server processes learn about
+# writes through notify() (Postgres NOTIFY, see quarters.py); while that listener is
+# down a remote write could go unseen, so conditional() stops answering 304.
+import threading, secrets
+from functools import wraps
+from flask import request, make_response
+from db import get_current_qid
+import quarters
+
+_BOOT = secrets.token_hex(4)
+_lock = threading.Lock()
+_state = {"epoch": 0, "q": {}}  # epoch: bumped for all-quarter writes (upload); q: qid -> n
+NOTIFY_ROWS = 25  # assignment rows per NOTIFY (Postgres caps a payload at 8000 bytes)
+
+
+def version(qid: int|None) -> str:
+    with _lock:
+        return f"{_state['epoch']}.{_state['q'].get(qid, 0)}"
+
+def bump(qid: int|None = None):
+    """Mark one quarter's data (or, with None, every quarter's) as changed."""
+    with _lock:
+        if qid is None:
+            _state["epoch"] += 1
+        else:
+            _state["q"][qid] = _state["q"].get(qid, 0) + 1
+
+def notify(tx, qid: int, rows: list[dict]):
+    """
+    Inside a booking transaction: tell the other server processes which assignment rows
+    it wrote (delivered at COMMIT, dropped on ROLLBACK). Each one bumps its version for
+    `qid`, refreshes those occupancy cells and pushes the rows to its /api/events clients.
+    rows: the "assignment" event fields (id, tribe_name, resource_id, sprint_mask, ...).
+    """
+    for i in range(0, len(rows), NOTIFY_ROWS):
+        quarters.notify(tx, "booking", qid=qid, rows=rows[i:i + NOTIFY_ROWS])
+
+@quarters.on_change
+def _remote_change(reason: str, msg: dict):
+    if reason == "booking":
+        bump(msg.get("qid"))
+    else:
+        # another process uploaded or switched quarters (or we may have missed it)
+        bump()
+
+def etag(qid: int|None) -> str:
+    return f"{_BOOT}-{qid}-{version(qid)}"
+
+
+def conditional(view):
+    """
+    GET decorator: weak ETag from the current quarter's version; 304 on a match.
+    The tag is taken before the view runs, so a write racing the query only makes
+    the next request refetch, never serves stale data under a fresh tag.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        tag = etag(get_current_qid())
+        if quarters.listening() and request.if_none_match.contains_weak(tag):
+            resp = make_response("", 304)
+        else:
+            resp = make_response(view(*args, **kwargs))
+            if resp.status_code != 200:
+                return resp
+        resp.set_etag(tag, weak=True)
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp
+    return wrapper
@@ -1,12 +1,18 @@
 # db.py
-import os, sys, time, logging
+import os, re, sys, time, random, logging, threading
+from contextlib import contextmanager
+from functools import wraps
 from time import monotonic
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError
+import metrics
 from sqlalchemy.orm import declarative_base
 
 logging.basicConfig(level=logging.INFO)
-_q_cache = {"qid": None, "ts": 0.0}
+_RETRY_SQLSTATES = {"40001", "40P01", "55P03"}  # serialization_failure, deadlock_detected, lock_not_available
+TX_RETRIES = int(os.getenv("TX_RETRIES", "3"))
+LOCK_TIMEOUT_MS = int(os.getenv("BOOKING_LOCK_TIMEOUT_MS", "5000"))
 
 def _load_env_once():
     """Load .env from sensible places (exe dir, _MEIPASS, source dir) if DATABASE_URL not set."""
@@ -44,38 +50,270 @@ if not DATABASE_URL:
         "Or set it as a system environment variable."
     )
 
+# Pool sized to serve.py's request slots: at most SERVE_THREADS requests (live-update
+# streams excluded, they don't use the DB) run at once, one connection each; the overflow
+# covers background work (startup warm-up, index builds, uploads, plan capture). A checkout
+# that still finds the pool exhausted waits POOL_TIMEOUT seconds, then raises.
+# Connections open lazily, so the dev server only pays for what it uses.
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE") or os.getenv("SERVE_THREADS") or 16)
+POOL_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "4"))
+POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
 # Single engine (remove duplicate line)
-engine = create_engine(DATABASE_URL, future=True, pool_pre_ping=True)
+engine = create_engine(DATABASE_URL, future=True, pool_pre_ping=True,
+                       pool_size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW, pool_timeout=POOL_TIMEOUT)
 Base = declarative_base()
 
 def get_current_qid():
-    now = monotonic()
-    if _q_cache["qid"] is not None and (now - _q_cache["ts"] < 60):
-        return _q_cache["qid"]
-    row = fetch_one("SELECT id FROM quarters WHERE is_current = TRUE LIMIT 1")
-    _q_cache["qid"] = row["id"] if row else None
-    _q_cache["ts"] = now
-    return _q_cache["qid"]
+    # cached per process, invalidated via LISTEN/NOTIFY (quarters.py imports this module)
+    import quarters
+    return quarters.current_id()
 
-def fetch_all(sql, **params):
+# ---------- statement profiler ----------
+# Every statement is folded into per-fingerprint stats (metrics.fingerprint: literals and
+# bind names stripped). A read-only statement slower than PROFILE_EXPLAIN_MS gets its
+# plan captured with EXPLAIN (ANALYZE, BUFFERS) on a separate connection, in the
+# background, at most once per PROFILE_EXPLAIN_EVERY_SECS per fingerprint.
+# Viewed at /admin/queries.
+PROFILE_EXPLAIN_MS = float(os.getenv("PROFILE_EXPLAIN_MS", "500"))  # 0 disables plan capture
+PROFILE_EXPLAIN_EVERY_SECS = int(os.getenv("PROFILE_EXPLAIN_EVERY_SECS", "600"))
+PROFILE_MAX_STATEMENTS = 500
+_profile = {}  # fingerprint -> stats
+_profile_lock = threading.Lock()
+_explain_slot = threading.Semaphore(1)  # one EXPLAIN ANALYZE at a time
+_READONLY_RE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+_SIDE_EFFECT_RE = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|FOR\s+(NO\s+KEY\s+)?(UPDATE|SHARE)|pg_advisory\w*|pg_notify|NOTIFY|set_config|nextval|setval)\b",
+    re.IGNORECASE)
+
+def _explainable(sql: str) -> bool:
+    # EXPLAIN ANALYZE runs the statement again: only plain reads qualify
+    return bool(_READONLY_RE.match(sql)) and not _SIDE_EFFECT_RE.search(sql)
+
+def _record(sql, params, seconds, rows=None):
+    metrics.observe_query(sql, seconds, rows)
+    fp = metrics.fingerprint(sql)
+    ms = seconds * 1000
+    explain = False
+    with _profile_lock:
+        st = _profile.get(fp)
+        if st is None:
+            if len(_profile) >= PROFILE_MAX_STATEMENTS:
+                return
+            st = _profile[fp] = {"fingerprint": fp, "statement": metrics.normalize_sql(sql),
+                                 "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0,
+                                 "plan": None, "plan_ms": None, "plan_at": None, "_explained": None}
+        st["calls"] += 1
+        st["total_ms"] += ms
+        st["rows"] += rows or 0
+        st["max_ms"] = max(st["max_ms"], ms)
+        if (PROFILE_EXPLAIN_MS and ms >= PROFILE_EXPLAIN_MS and _explainable(sql)
+                and (st["_explained"] is None or monotonic() - st["_explained"] >= PROFILE_EXPLAIN_EVERY_SECS)
+                and _explain_slot.acquire(blocking=False)):
+            st["_explained"] = monotonic()
+            explain = True
+    if explain:
+        threading.Thread(target=_capture_plan, args=(fp, sql, dict(params or {}), ms), daemon=True).start()
+
+def _capture_plan(fp, sql, params, ms):
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT set_config('statement_timeout', '30s', true)"))
+            res = conn.execute(text("EXPLAIN (ANALYZE, BUFFERS) " + sql), params)
+            plan = "\n".join(r[0] for r in res)
+            conn.rollback()
+    except Exception as e:
+        plan = f"EXPLAIN failed: {e}"
+    finally:
+        _explain_slot.release()
+    with _profile_lock:
+        st = _profile.get(fp)
+        if st is not None:
+            st.update(plan=plan, plan_ms=round(ms, 1), plan_at=time.strftime("%Y-%m-%d %H:%M:%S"))
+    logging.info("EXPLAIN captured for %s (%.1fms)", fp, ms)
+
+def profile_stats(order_by: str = "total_ms") -> list[dict]:
+    """Per-fingerprint stats (calls, total/mean/max ms, rows, last captured plan), worst first."""
+    with _profile_lock:
+        out = [{k: v for k, v in st.items() if not k.startswith("_")} for st in _profile.values()]
+    for st in out:
+        st["mean_ms"] = st["total_ms"] / st["calls"] if st["calls"] else 0.0
+    key = order_by if order_by in ("total_ms", "mean_ms", "max_ms", "calls", "rows") else "total_ms"
+    return sorted(out, key=lambda st: st[key], reverse=True)
+
+def reset_profile():
+    with _profile_lock:
+        _profile.clear()
+
+def _fetch_all(conn, sql, params):
     t0 = time.perf_counter()
-    with engine.begin() as conn:
-        res = conn.execute(text(sql), params)
-        rows = [dict(row._mapping) for row in res.all()]
+    res = conn.execute(text(sql), params)
+    rows = [dict(row._mapping) for row in res.all()]
     dt = (time.perf_counter() - t0) * 1000
+    _record(sql, params, dt / 1000, len(rows))
     if dt > 100:
         logging.info("SQL %.1fms:  %s  params=%s", dt, sql.splitlines()[0], params)
     return rows
 
-def fetch_one(sql, **params):
+def _fetch_one(conn, sql, params):
     t0 = time.perf_counter()
-    with engine.begin() as conn:
-        res = conn.execute(text(sql), params).first()
+    res = conn.execute(text(sql), params).first()
     dt = (time.perf_counter() - t0) * 1000
+    _record(sql, params, dt / 1000, 0 if res is None else 1)
     if dt > 100:
         logging.info("SQL1 %.1fms: %s params=%s", dt, sql.splitlines()[0], params)
     return dict(res._mapping) if res is not None else None
 
+def _fetch_iter(conn, sql, params, batch_size):
+    # stream_results -> psycopg named (server-side) cursor; yield_per bounds each FETCH
+    t0 = time.perf_counter()
+    res = conn.execution_options(stream_results=True, yield_per=batch_size).execute(text(sql), params)
+    n = 0
+    try:
+        for part in res.partitions():
+            n += len(part)
+            yield [dict(row._mapping) for row in part]
+    finally:
+        res.close()
+        dt = (time.perf_counter() - t0) * 1000
+        _record(sql, params, dt / 1000, n)
+        if dt > 100:
+            logging.info("SQLi %.1fms: %s rows=%d params=%s", dt, sql.splitlines()[0], n, params)
+
+def _execute(conn, sql, params):
+    t0 = time.perf_counter()
+    conn.execute(text(sql), params)
+    _record(sql, params, time.perf_counter() - t0)
+
+@contextmanager
+def _begin():
+    """engine.begin() that records how long the pool checkout took."""
+    t0 = time.perf_counter()
+    with engine.connect() as conn:
+        metrics.POOL_WAIT_SECONDS.observe(time.perf_counter() - t0)
+        with conn.begin():
+            yield conn
+
+def fetch_all(sql, **params):
+    with _begin() as conn:
+        return _fetch_all(conn, sql, params)
+
+def fetch_one(sql, **params):
+    with _begin() as conn:
+        return _fetch_one(conn, sql, params)
+
+def fetch_iter(sql, batch_size=1000, **params):
+    """
+    Generator of row batches (lists of dicts, at most `batch_size` each) read through a
+    server-side cursor, so large results never sit in memory whole:
+        for batch in fetch_iter("SELECT ...", batch_size=2000, qid=qid):
+            ...
+    The connection is held until the generator is exhausted or closed.
+    """
+    with _begin() as conn:
+        yield from _fetch_iter(conn, sql, params, batch_size)
+
 def execute(sql, **params):
-    with engine.begin() as conn:
-        conn.execute(text(sql), params)
+    with _begin() as conn:
+        _execute(conn, sql, params)
+
+class Tx:
+    """fetch_one/fetch_all/execute bound to the single connection of a transaction()."""
+    def __init__(self, conn):
+        self.conn = conn
+
+    def fetch_all(self, sql, **params):
+        return _fetch_all(self.conn, sql, params)
+
+    def fetch_one(self, sql, **params):
+        return _fetch_one(self.conn, sql, params)
+
+    def fetch_iter(self, sql, batch_size=1000, **params):
+        return _fetch_iter(self.conn, sql, params, batch_size)
+
+    def execute(self, sql, **params):
+        _execute(self.conn, sql, params)
+
+    def copy_rows(self, table, columns, rows):
+        copy_rows(self.conn, table, columns, rows)
+
+    def lock_resources(self, qid, rids):
+        """
+        Serialize booking writes per (quarter, resource) until this transaction ends.
+        Transaction-scoped advisory locks: other resources, and readers, never wait.
+        Keys are taken in ascending order so multi-resource writers can't deadlock;
+        waits are capped by BOOKING_LOCK_TIMEOUT_MS (then retry_on_conflict re-runs).
+        """
+        rids = sorted({int(r) for r in rids if r is not None})
+        if not rids:
+            return
+        self.conn.execute(text("SELECT set_config('lock_timeout', :t, true)"),
+                          {"t": f"{LOCK_TIMEOUT_MS}ms"})
+        self.conn.execute(text("""
+            SELECT pg_advisory_xact_lock(CAST(:qid AS int), k.rid)
+            FROM (SELECT rid FROM unnest(CAST(:rids AS int[])) AS rid ORDER BY rid OFFSET 0) AS k
+        """), {"qid": qid, "rids": rids})
+
+@contextmanager
+def transaction():
+    """
+    Unit of work: one pooled connection, one BEGIN, one COMMIT (ROLLBACK on error).
+        with transaction() as tx:
+            row = tx.fetch_one("SELECT ...", id=1)
+            tx.execute("UPDATE ...", id=1)
+    """
+    with _begin() as conn:
+        yield Tx(conn)
+
+def _sqlstate(exc) -> str|None:
+    orig = getattr(exc, "orig", None)
+    return getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+
+def retry_on_conflict(fn):
+    """
+    Re-run `fn` (a view doing one transaction() plus post-commit work) when its
+    transaction fails with a serialization failure, deadlock or lock timeout.
+    At most TX_RETRIES extra attempts with jittered backoff; then the error propagates.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        for attempt in range(TX_RETRIES + 1):
+            try:
+                return fn(*args, **kwargs)
+            except DBAPIError as e:
+                state = _sqlstate(e)
+                if state not in _RETRY_SQLSTATES or attempt == TX_RETRIES:
+                    raise
+                logging.info("TX retry %d/%d after %s in %s", attempt + 1, TX_RETRIES, state, fn.__name__)
+                time.sleep(random.uniform(0, 0.02 * 2 ** attempt))
+    return wrapper
+
+def copy_rows(conn, table, columns, rows):
+    """
+    Bulk-load `rows` (sequences in `columns` order) into `table` on an open connection.
+    Uses psycopg COPY when the driver supports it, else one executemany INSERT.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    t0 = time.perf_counter()
+    cols = ", ".join(columns)
+    raw = conn.connection.driver_connection
+    cur = raw.cursor()
+    if hasattr(cur, "copy"):
+        with cur:
+            with cur.copy(f"COPY {table} ({cols}) FROM STDIN") as cp:
+                for r in rows:
+                    cp.write_row(r)
+    else:
+        cur.close()
+        binds = ", ".join(f":c{i}" for i in range(len(columns)))
+        conn.execute(text(f"INSERT INTO {table} ({cols}) VALUES ({binds})"),
+                     [{f"c{i}": v for i, v in enumerate(r)} for r in rows])
+    dt = (time.perf_counter() - t0) * 1000
+    _record(f"COPY {table} ({cols}) FROM STDIN", None, dt / 1000, len(rows))
+    if dt > 100:
+        logging.info("COPY %.1fms: %s rows=%d", dt, table, len(rows))
+
+metrics.gauge("db_pool_checked_out", "Pooled connections currently in use.", lambda: engine.pool.checkedout())
+metrics.gauge("db_pool_size", "Configured pool size (plus up to DB_MAX_OVERFLOW).", lambda: POOL_SIZE)
@@ -0,0 +1,97 @@
+# events.py
+# In-process fan-out of booking changes to Server-Sent Events subscribers (/api/events).
+# Writers call publish() after their transaction commits; every open stream gets a
+# compact JSON event and patches its table in place instead of polling.
+# A subscriber that falls behind (queue full) is sent "resync" and dropped; the browser
+# reconnects and reloads, so a slow client never blocks a writer.
+import os, json, queue, threading, time
+import changes
+import metrics
+import quarters
+
+# Every open stream pins a waitress thread (but no DB connection). serve.py adds
+# MAX_STREAMS threads on top of SERVE_THREADS and caps the other requests at
+# SERVE_THREADS, so streams and requests can't take each other's threads; past the cap
+# clients get 503 and poll.
+MAX_STREAMS = int(os.getenv("SSE_MAX_STREAMS", "256"))
+SUB_QUEUE_MAX = 256
+HEARTBEAT_SECS = 15
+STREAM_MAX_SECS = 300  # recycle long streams so server threads aren't pinned forever
+
+_lock = threading.Lock()
+_subs = set()
+_seq = {"n": 0}
+
+
+def publish(kind: str, qid: int|None, **data):
+    """Queue `kind` for every subscriber. Non-blocking."""
+    with _lock:
+        _seq["n"] += 1
+        msg = {"type": kind, "seq": _seq["n"], "quarter_id": qid,
+               "version": changes.version(qid), **data}
+        subs = list(_subs)
+    payload = json.dumps(msg, default=str, separators=(",", ":"))
+    for q in subs:
+        try:
+            q.put_nowait((kind, payload))
+        except queue.Full:
+            _drop(q)
+
+def _drop(q):
+    with _lock:
+        _subs.discard(q)
+    try:
+        # make room for the resync marker; the stream ends after sending it
+        while True:
+            q.get_nowait()
+    except queue.Empty:
+        pass
+    try:
+        q.put_nowait(("resync", "{}"))
+    except queue.Full:
+        pass
+
+def subscriber_count() -> int:
+    with _lock:
+        return len(_subs)
+
+metrics.gauge("sse_streams", "Open /api/events streams.", subscriber_count)
+
+def subscribe():
+    """Register a subscriber queue, or None when MAX_STREAMS are already open."""
+    q = queue.Queue(maxsize=SUB_QUEUE_MAX)
+    with _lock:
+        if len(_subs) >= MAX_STREAMS:
+            return None
+        _subs.add(q)
+    return q
+
+def stream(q):
+    """SSE body generator for one client subscribed with subscribe()."""
+    started = time.monotonic()
+    try:
+        yield "retry: 3000\n\n"
+        while time.monotonic() - started < STREAM_MAX_SECS:
+            try:
+                kind, payload = q.get(timeout=HEARTBEAT_SECS)
+            except queue.Empty:
+                yield ": ping\n\n"
+                continue
+            yield f"event: {kind}\ndata: {payload}\n\n"
+            if kind == "resync":
+                return
+    finally:
+        unsubscribe(q)
+
+def unsubscribe(q):
+    with _lock:
+        _subs.discard(q)
+
+@quarters.on_change
+def _remote_change(reason: str, msg: dict):
+    # writes in another process: tell this process's clients too
+    if reason == "booking":
+        for r in msg.get("rows") or []:
+            publish("assignment", msg.get("qid"), **r)
+    elif reason in ("upload", "set_quarter", "resync"):
+        publish("reload", None, reason=reason)
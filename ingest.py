@@ -0,0 +1,94 @@
+# ingest.py
+# Streaming reader for uploaded plan sheets. Yields the sheet as DataFrame chunks of
+# UPLOAD_CHUNK_ROWS rows instead of one pd.read_excel() of the whole workbook, so memory
+# stays bounded by the chunk size and the caller can load each chunk as it is parsed:
+#   for chunk in iter_chunks(path, progress=lambda frac: ...):
+#       ...
+# .xlsx/.xlsm are read with openpyxl read_only + iter_rows; .csv with pandas chunksize.
+# A chunk looks like the matching slice of pd.read_excel(): header row as columns,
+# empty cells as NaN, index = sheet row number - 2 (so index + 2 is the Excel row).
+import os
+import pandas as pd
+
+CHUNK_ROWS = int(os.getenv("UPLOAD_CHUNK_ROWS", "5000"))
+
+_NAN = float("nan")
+
+
+def iter_chunks(source, filename: str|None = None, chunk_rows: int = CHUNK_ROWS, progress=None):
+    """
+    source: a DataFrame, a file path, or a seekable binary file object (filename picks the format).
+    progress(fraction) is called after each chunk with 0..1 of the input parsed
+    (rows for .xlsx, bytes for .csv), when that is known.
+    """
+    if isinstance(source, pd.DataFrame):
+        yield from _frame_chunks(source, chunk_rows, progress)
+        return
+    name = (filename or (source if isinstance(source, str) else "") or "").lower()
+    if name.endswith(".csv"):
+        yield from _csv_chunks(source, chunk_rows, progress)
+    elif name.endswith(".xls"):
+        # legacy binary workbooks need xlrd; pandas reads them whole
+        yield from _frame_chunks(pd.read_excel(source), chunk_rows, progress)
+    else:
+        yield from _xlsx_chunks(source, chunk_rows, progress)
+
+
+def _frame_chunks(df: pd.DataFrame, chunk_rows: int, progress):
+    total = len(df)
+    if not total:
+        yield df.copy()  # header only: still lets the caller check the columns
+    for start in range(0, total, chunk_rows):
+        yield df.iloc[start:start + chunk_rows].copy()
+        if progress: progress(min(1.0, (start + chunk_rows) / total))
+
+
+def _csv_chunks(source, chunk_rows: int, progress):
+    f = open(source, "rb") if isinstance(source, str) else source
+    try:
+        start = f.tell()
+        size = f.seek(0, os.SEEK_END) - start
+        f.seek(start)
+        for chunk in pd.read_csv(f, chunksize=chunk_rows):
+            yield chunk
+            if progress and size > 0:
+                progress(min(1.0, (f.tell() - start) / size))  # the parser reads ahead: approximate
+    finally:
+        if f is not source:
+            f.close()
+
+
+def _xlsx_chunks(source, chunk_rows: int, progress):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]  # pd.read_excel's default sheet
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        # trailing header cells openpyxl reports for formatting-only columns
+        while header and header[-1] is None:
+            header = header[:-1]
+        width = len(header)
+        cols = [h if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+        # from the sheet's <dimension> tag; absent or wrong in some generated files
+        total = (ws.max_row - 1) if ws.max_row and ws.max_row > 1 else None
+
+        buf, index, yielded = [], [], False
+        for n, values in enumerate(rows):
+            values = values[:width]
+            if all(v is None or v == "" for v in values):
+                continue  # blank lines (and openpyxl's trailing formatted rows)
+            buf.append([_NAN if v is None else v for v in values] + [_NAN] * (width - len(values)))
+            index.append(n)
+            if len(buf) >= chunk_rows:
+                yield pd.DataFrame(buf, columns=cols, index=index).infer_objects()
+                buf, index, yielded = [], [], True
+                if progress and total: progress(min(1.0, (n + 1) / total))
+        if buf or not yielded:
+            yield pd.DataFrame(buf, columns=cols, index=index).infer_objects()
+        if progress: progress(1.0)
+    finally:
+        wb.close()
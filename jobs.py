@@ -0,0 +1,356 @@
+# jobs.py
+# Upload job registry: status, phase, percent, rows, timing and error per job id.
+# JOB_STORE=pg (default) keeps jobs in the upload_jobs table (migration 0006), so any
+# server process can answer a progress poll and jobs survive a restart;
+# JOB_STORE=memory keeps them in this process only (single-process / no-DB dev).
+# Both stores are bounded: jobs older than JOB_TTL_SECS are evicted, and at most
+# JOB_MAX_JOBS are kept (oldest dropped first).
+# Executor (bottom): a fixed pool of UPLOAD_WORKERS threads fed by a bounded queue,
+# one queued/running job per target, cooperative cancellation via checkpoint().
+# With the pg store the one-per-target rule holds across processes too (unique index,
+# migration 0009); the owning process heartbeats its jobs so a crashed one's rows are
+# marked abandoned after JOB_STALE_SECS instead of blocking the target forever.
+import os, time, logging, threading, secrets
+from collections import deque
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from db import fetch_one, execute
+
+JOB_TTL_SECS = int(os.getenv("JOB_TTL_SECS", str(24 * 3600)))
+JOB_MAX_JOBS = int(os.getenv("JOB_MAX_JOBS", "200"))
+JOB_HEARTBEAT_SECS = int(os.getenv("JOB_HEARTBEAT_SECS", "30"))
+JOB_STALE_SECS = int(os.getenv("JOB_STALE_SECS", "120"))
+
+FIELDS = ("status", "phase", "percent", "rows", "target_quarter_id", "error",
+          "target", "queue_position", "cancel_requested")
+FINAL = ("done", "error", "cancelled")
+
+
+def _public(rec: dict) -> dict:
+    """Store record -> the JSON shape /admin/upload_progress returns."""
+    elapsed = rec.get("elapsed_secs")
+    return {
+        "job_id": rec["id"],
+        "status": rec.get("status") or "queued",
+        "phase": rec.get("phase"),
+        "percent": int(rec.get("percent") or 0),
+        "rows": rec.get("rows"),
+        "target_quarter_id": rec.get("target_quarter_id"),
+        "error": rec.get("error"),
+        "target": rec.get("target"),
+        "queue_position": rec.get("queue_position"),
+        "cancel_requested": bool(rec.get("cancel_requested")),
+        "created_at": rec.get("created_at"),
+        "started_at": rec.get("started_at"),
+        "finished_at": rec.get("finished_at"),
+        "elapsed_secs": round(float(elapsed), 1) if elapsed is not None else None,
+    }
+
+
+class MemoryJobStore:
+    def __init__(self):
+        self._jobs = {}  # insertion order = age
+        self._lock = threading.Lock()
+
+    def create(self, job_id: str, **fields):
+        now = datetime.now()
+        with self._lock:
+            self._evict(now)
+            self._jobs[job_id] = {"id": job_id, "status": "queued", "percent": 0,
+                                  "created_at": now, "updated_at": now, **fields}
+
+    def update(self, job_id: str, **fields):
+        now = datetime.now()
+        with self._lock:
+            rec = self._jobs.get(job_id)
+            if rec is None:
+                return
+            rec.update(fields)
+            rec["updated_at"] = now
+            if fields.get("status") == "running" and not rec.get("started_at"):
+                rec["started_at"] = now
+            if fields.get("status") in FINAL:
+                rec["finished_at"] = now
+
+    def get(self, job_id: str) -> dict|None:
+        with self._lock:
+            rec = self._jobs.get(job_id)
+            if rec is None:
+                return None
+            rec = dict(rec)
+        if rec.get("started_at"):
+            rec["elapsed_secs"] = ((rec.get("finished_at") or datetime.now()) - rec["started_at"]).total_seconds()
+        return rec
+
+    def _evict(self, now):
+        for jid in [j for j, r in self._jobs.items()
+                    if (now - r["created_at"]).total_seconds() > JOB_TTL_SECS]:
+            self._jobs.pop(jid, None)
+        while len(self._jobs) >= JOB_MAX_JOBS:
+            self._jobs.pop(next(iter(self._jobs)))
+
+    def touch(self, job_ids):
+        pass  # jobs die with the process: nothing can be left behind
+
+
+class PgJobStore:
+    _COLS = {"status": "status", "phase": "phase", "percent": "percent", "rows": "row_count",
+             "target_quarter_id": "target_quarter_id", "error": "error", "target": "target",
+             "queue_position": "queue_position", "cancel_requested": "cancel_requested"}
+
+    def create(self, job_id: str, **fields):
+        from migrate import ensure_current
+        ensure_current()  # upload_jobs arrives with migrations 0006/0007/0009
+        execute("""
+            DELETE FROM upload_jobs
+            WHERE created_at < NOW() - make_interval(secs => :ttl)
+               OR id IN (SELECT id FROM upload_jobs ORDER BY created_at DESC OFFSET :keep)
+        """, ttl=JOB_TTL_SECS, keep=max(0, JOB_MAX_JOBS - 1))
+        # queued/running jobs nobody heartbeats any more (their process is gone)
+        execute("""
+            UPDATE upload_jobs
+            SET status = 'error', error = 'Abandoned: the server running it stopped',
+                queue_position = NULL, finished_at = NOW(), updated_at = NOW()
+            WHERE status IN ('queued', 'running')
+              AND updated_at < NOW() - make_interval(secs => :stale)
+        """, stale=JOB_STALE_SECS)
+        cols = ["id"] + [self._COLS[k] for k in fields]
+        binds = [":id"] + [f":{k}" for k in fields]
+        try:
+            execute(f"INSERT INTO upload_jobs ({', '.join(cols)}) VALUES ({', '.join(binds)})",
+                    id=job_id, **fields)
+        except IntegrityError:
+            # uq_upload_jobs_active_target: another process has this target queued/running
+            row = fetch_one("""
+                SELECT id FROM upload_jobs
+                WHERE target = :target AND status IN ('queued', 'running')
+            """, target=fields.get("target"))
+            if row is None:
+                raise
+            raise TargetBusy(row["id"])
+
+    def touch(self, job_ids):
+        """Heartbeat: these jobs' owner is alive."""
+        execute("UPDATE upload_jobs SET updated_at = NOW() WHERE id = ANY(:ids)", ids=list(job_ids))
+
+    def update(self, job_id: str, **fields):
+        sets = [f"{self._COLS[k]} = :{k}" for k in fields]
+        status = fields.get("status")
+        if status == "running":
+            sets.append("started_at = COALESCE(started_at, NOW())")
+        if status in FINAL:
+            sets.append("finished_at = NOW()")
+        sets.append("updated_at = NOW()")
+        execute(f"UPDATE upload_jobs SET {', '.join(sets)} WHERE id = :id", id=job_id, **fields)
+
+    def get(self, job_id: str) -> dict|None:
+        row = fetch_one("""
+            SELECT id, status, phase, percent, row_count AS rows, target_quarter_id, error,
+                   target, queue_position, cancel_requested, created_at, started_at, finished_at, updated_at,
+                   EXTRACT(EPOCH FROM (COALESCE(finished_at, NOW()) - started_at)) AS elapsed_secs
+            FROM upload_jobs
+            WHERE id = :id AND created_at >= NOW() - make_interval(secs => :ttl)
+        """, id=job_id, ttl=JOB_TTL_SECS)
+        return row
+
+
+def _make_store():
+    kind = (os.getenv("JOB_STORE") or "pg").strip().lower()
+    return MemoryJobStore() if kind == "memory" else PgJobStore()
+
+store = _make_store()
+
+
+# ---------- API used by routes/admin.py ----------
+def create(**fields) -> str:
+    job_id = secrets.token_hex(8)
+    store.create(job_id, **{k: v for k, v in fields.items() if k in FIELDS})
+    return job_id
+
+def update(job_id: str|None, **fields):
+    """Record progress. Never raises: a failed progress write must not fail the upload."""
+    if not job_id:
+        return
+    fields = {k: v for k, v in fields.items() if k in FIELDS}
+    if "percent" in fields and fields["percent"] is not None:
+        fields["percent"] = max(0, min(100, int(fields["percent"])))
+    try:
+        store.update(job_id, **fields)
+    except Exception as e:
+        logging.warning("job %s progress not saved: %s", job_id, e)
+
+def get(job_id: str) -> dict|None:
+    rec = store.get(job_id)
+    return _public(rec) if rec else None
+
+
+# ---------- executor ----------
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "1"))
+UPLOAD_QUEUE_MAX = int(os.getenv("UPLOAD_QUEUE_MAX", "10"))
+
+class JobCancelled(Exception):
+    pass
+
+class QueueFull(Exception):
+    pass
+
+class TargetBusy(Exception):
+    def __init__(self, job_id: str|None):
+        super().__init__(f"job {job_id or '(being queued)'} is already queued or running for this target")
+        self.job_id = job_id
+
+
+class Executor:
+    """
+    Runs fn(job_id) -> dict of result fields on a fixed set of worker threads.
+    The job store row is kept current: queued (with queue_position) -> running ->
+    done / error / cancelled. fn should call checkpoint(job_id) at safe points.
+    """
+    def __init__(self, workers: int, queue_max: int):
+        self.workers, self.queue_max = max(1, workers), max(1, queue_max)
+        self._cv = threading.Condition()
+        self._queue = deque()   # (job_id, target, fn, cleanup)
+        self._active = {}       # target -> job_id, queued or running
+        self._running = set()
+        self._cancel = set()    # running job ids asked to stop in this process
+        self._done = {}         # job_id -> threading.Event, for wait()
+        self._reserved = 0      # slots held by submit() while the job row is written
+        self._threads = []
+
+    def submit(self, target: str, fn, cleanup=None, **fields) -> str:
+        """Queue fn under `target`; cleanup() runs once the job ends, even if it never started."""
+        # reserve target + slot under the lock; the job row is written outside it so
+        # workers and cancel() never wait on the job store
+        with self._cv:
+            if target in self._active:
+                raise TargetBusy(self._active[target])
+            waiting = len(self._queue) + self._reserved
+            if waiting >= self.queue_max:
+                raise QueueFull(f"{waiting} uploads already waiting")
+            self._active[target] = None
+            self._reserved += 1
+        try:
+            job_id = create(status="queued", phase="queued", percent=0, target=target,
+                            queue_position=waiting + 1, **fields)
+        except BaseException:
+            with self._cv:
+                self._reserved -= 1
+                self._active.pop(target, None)
+            raise
+        with self._cv:
+            self._reserved -= 1
+            self._queue.append((job_id, target, fn, cleanup))
+            self._active[target] = job_id
+            self._done[job_id] = threading.Event()
+            position = len(self._queue)
+            self._start_threads()
+            self._cv.notify()
+        if position != waiting + 1:
+            update(job_id, queue_position=position)
+        return job_id
+
+    def _start_threads(self):
+        if not self._threads:
+            threading.Thread(target=self._heartbeat, name="upload-heartbeat", daemon=True).start()
+        while len(self._threads) < self.workers:
+            t = threading.Thread(target=self._work, name=f"upload-worker-{len(self._threads)}", daemon=True)
+            self._threads.append(t)
+            t.start()
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(JOB_HEARTBEAT_SECS)
+            with self._cv:
+                ids = [jid for jid in self._active.values() if jid]
+            if ids:
+                try:
+                    store.touch(ids)
+                except Exception as e:
+                    logging.warning("job heartbeat failed: %s", e)
+
+    def wait(self, job_id: str, timeout: float|None = None) -> dict|None:
+        ev = self._done.get(job_id)
+        if ev is not None:
+            ev.wait(timeout)
+        return get(job_id)
+
+    def cancel(self, job_id: str) -> str|None:
+        """Cancel a queued job at once, or ask a running one to stop; returns the new status."""
+        with self._cv:
+            item = next((it for it in self._queue if it[0] == job_id), None)
+            if item is not None:
+                self._queue.remove(item)
+                self._active.pop(item[1], None)
+                positions = self._positions()
+            elif job_id in self._running:
+                self._cancel.add(job_id)
+        if item is not None:
+            update(job_id, status="cancelled", phase="cancelled", error="Cancelled before it started",
+                   queue_position=None)
+            self._write_positions(positions)
+            self._finish(job_id, item[3])
+            return "cancelled"
+        rec = get(job_id)
+        if rec is None or rec["status"] in FINAL:
+            return rec and rec["status"]
+        update(job_id, cancel_requested=True)  # seen by the owning process's checkpoint()
+        return "cancelling"
+
+    def checkpoint(self, job_id: str):
+        """Raise JobCancelled if the job was cancelled here or from another process."""
+        if job_id in self._cancel:
+            raise JobCancelled()
+        rec = store.get(job_id)
+        if rec and rec.get("cancel_requested"):
+            raise JobCancelled()
+
+    def queued(self) -> int:
+        with self._cv:
+            return len(self._queue)
+
+    def _positions(self) -> list[tuple[str, int]]:
+        return [(jid, i + 1) for i, (jid, *_) in enumerate(self._queue)]
+
+    def _write_positions(self, positions):
+        for jid, pos in positions:
+            update(jid, queue_position=pos)
+
+    def _finish(self, job_id: str, cleanup=None):
+        if cleanup is not None:
+            try:
+                cleanup()
+            except Exception as e:
+                logging.warning("job %s cleanup failed: %s", job_id, e)
+        ev = self._done.pop(job_id, None)
+        if ev is not None:
+            ev.set()
+
+    def _work(self):
+        while True:
+            with self._cv:
+                while not self._queue:
+                    self._cv.wait()
+                job_id, target, fn, cleanup = self._queue.popleft()
+                self._running.add(job_id)
+                positions = self._positions()
+            self._write_positions(positions)
+            try:
+                self.checkpoint(job_id)  # cancelled from another process while queued
+                update(job_id, status="running", phase="starting", queue_position=None)
+                result = fn(job_id) or {}
+                update(job_id, status="done", phase="done", percent=100, **result)
+            except JobCancelled:
+                update(job_id, status="cancelled", phase="cancelled", error="Cancelled", queue_position=None)
+            except Exception as e:
+                logging.exception("job %s failed", job_id)
+                update(job_id, status="error", error=str(e), queue_position=None)
+            finally:
+                with self._cv:
+                    self._running.discard(job_id)
+                    self._cancel.discard(job_id)
+                    if self._active.get(target) == job_id:
+                        self._active.pop(target)
+                self._finish(job_id, cleanup)
+
+
+uploads = Executor(UPLOAD_WORKERS, UPLOAD_QUEUE_MAX)
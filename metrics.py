@@ -0,0 +1,146 @@
+# metrics.py
+# In-process metrics registry rendered in the Prometheus text format at /metrics.
+# Hot-path cost is one bisect and one small lock per observation; label sets are
+# bounded by design (endpoint names, statement fingerprints, upload targets).
+# Values are per process: scrape every worker process if you run more than one.
+import re, hashlib, threading
+from bisect import bisect_left
+from functools import lru_cache
+
+# seconds; request and query latencies both fall in this range
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UPLOAD_BUCKETS = (1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+_registry = []     # metrics in registration order
+_gauges = []       # (name, help, fn -> number) read at scrape time
+_statements = {}   # fingerprint -> normalized statement, for db_statement_info
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra="") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        out += [f"{self.name}{_labels(self.labelnames, k)} {v}" for k, v in items]
+        return out
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0] * (len(self.buckets) + 2)
+            s[i] += 1
+            s[-1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, s in items:
+            acc = 0
+            for le, n in zip(self.buckets + ("+Inf",), s):
+                acc += n
+                lbl = _labels(self.labelnames, key, 'le="%s"' % le)
+                out.append(f"{self.name}_bucket{lbl} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {s[-1]:.6f}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {acc}")
+        return out
+
+
+def gauge(name: str, help: str, fn):
+    """Register a gauge whose value is read by calling `fn()` at scrape time."""
+    _gauges.append((name, help, fn))
+
+
+def render() -> str:
+    out = []
+    for m in _registry:
+        out += m.render()
+    out += ["# HELP db_statement_info Normalized statement text for each fingerprint.",
+            "# TYPE db_statement_info gauge"]
+    out += [f'db_statement_info{{fingerprint="{fp}",statement="{_escape(st[:200])}"}} 1'
+            for fp, st in sorted(_statements.items())]
+    for name, help, fn in _gauges:
+        try:
+            v = fn()
+        except Exception:
+            continue
+        out += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {v}"]
+    return "\n".join(out) + "\n"
+
+
+# ---------- statement fingerprints ----------
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|(?<!:):[A-Za-z_]\w*")
+_VALUES_RE = re.compile(r"(\((?:[^()]|\(\))*\))(?:\s*,\s*\1)+")  # identical rows, NOW() allowed
+_WS_RE = re.compile(r"\s+")
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql: str) -> str:
+    """
+    Statement shape with comments, literals and bind names removed, e.g.
+    "SELECT id FROM quarters WHERE is_current = ? LIMIT ?". Multi-row VALUES
+    lists collapse to one row so batch sizes share a fingerprint.
+    """
+    s = _COMMENT_RE.sub(" ", sql)
+    s = _LITERAL_RE.sub("?", s)
+    s = _WS_RE.sub(" ", s).strip()
+    return _VALUES_RE.sub(r"\1, ...", s)
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql: str) -> str:
+    """Short stable id of normalize_sql(sql), used as a metrics label."""
+    return hashlib.sha1(normalize_sql(sql).encode("utf-8")).hexdigest()[:12]
+
+
+# ---------- the app's metrics ----------
+HTTP_SECONDS = Histogram("http_request_duration_seconds",
+                         "Request latency by endpoint.", ("endpoint", "method", "status"))
+QUERY_SECONDS = Histogram("db_query_duration_seconds",
+                          "Statement latency by fingerprint.", ("fingerprint",))
+QUERY_ROWS = Counter("db_query_rows_total", "Rows returned by fingerprint.", ("fingerprint",))
+POOL_WAIT_SECONDS = Histogram("db_pool_checkout_seconds", "Time to get a pooled connection.")
+UPLOAD_SECONDS = Histogram("upload_duration_seconds", "Excel upload jobs end to end.",
+                           ("target", "outcome"), buckets=UPLOAD_BUCKETS)
+
+
+def observe_query(sql: str, seconds: float, rows: int|None = None):
+    """Record one statement execution (called from db.py for every query)."""
+    fp = fingerprint(sql)
+    if fp not in _statements:
+        _statements[fp] = normalize_sql(sql)
+    QUERY_SECONDS.observe(seconds, fingerprint=fp)
+    if rows:
+        QUERY_ROWS.inc(rows, fingerprint=fp)
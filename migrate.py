@@ -0,0 +1,178 @@
+# migrate.py
+# Versioned schema migrations: sql/migrations/NNNN_name.sql applied in order, each in
+# its own transaction, recorded in schema_version. Startup only does one
+# SELECT max(version); once the DB is current nothing here touches the catalog again.
+#   python migrate.py          -> apply pending migrations
+#   python migrate.py status   -> print current / latest version
+import os, re, sys, time, logging, threading
+from sqlalchemy import text
+from db import engine
+
+_FILE_RE = re.compile(r"^(\d+)_([\w-]+)\.sql$")
+_DOLLAR_RE = re.compile(r"\$[A-Za-z_][A-Za-z_0-9]*\$|\$\$")
+_LOCK_KEY = 730_006  # pg_advisory_xact_lock key serializing concurrent migrators
+
+_state = {"version": None}  # last version known to be applied in this process
+_lock = threading.Lock()
+
+
+def _migrations_dir() -> str:
+    # same layout in dev and PyInstaller bundles (sql/ ships next to templates/static)
+    if getattr(sys, "frozen", False):
+        base = getattr(sys, "_MEIPASS", os.path.dirname(sys.executable))
+    else:
+        base = os.path.abspath(os.path.dirname(__file__))
+    return os.path.join(base, "sql", "migrations")
+
+def migrations() -> list[tuple[int, str, str]]:
+    """[(version, name, path)] sorted by version."""
+    d = _migrations_dir()
+    out = []
+    for fn in os.listdir(d) if os.path.isdir(d) else []:
+        m = _FILE_RE.match(fn)
+        if m:
+            out.append((int(m.group(1)), m.group(2), os.path.join(d, fn)))
+    out.sort()
+    versions = [v for v, _, _ in out]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration version in {d}")
+    return out
+
+def latest_version() -> int:
+    ms = migrations()
+    return ms[-1][0] if ms else 0
+
+
+# ---------- SQL splitting ----------
+def split_sql(sql: str) -> list[str]:
+    """
+    Split a script into statements on top-level ';'.
+    Semicolons inside '...' / "..." literals, $tag$...$tag$ bodies (DO blocks,
+    functions) and -- / /* */ comments don't count. Comment-only chunks are dropped.
+    """
+    out = []
+    n = len(sql)
+    i = start = 0
+    has_code = False
+    while i < n:
+        ch = sql[i]
+        if sql.startswith("--", i):
+            j = sql.find("\n", i)
+            i = n if j < 0 else j + 1
+            continue
+        if sql.startswith("/*", i):
+            j = sql.find("*/", i + 2)
+            i = n if j < 0 else j + 2
+            continue
+        if ch in ("'", '"'):
+            j = i + 1
+            while j < n:
+                if sql[j] == ch:
+                    if j + 1 < n and sql[j + 1] == ch:  # '' / "" escape
+                        j += 2
+                        continue
+                    break
+                j += 1
+            i = j + 1
+            has_code = True
+            continue
+        if ch == "$":
+            m = _DOLLAR_RE.match(sql, i)
+            if m:
+                tag = m.group(0)
+                j = sql.find(tag, m.end())
+                i = n if j < 0 else j + len(tag)
+                has_code = True
+                continue
+        if ch == ";":
+            if has_code:
+                out.append(sql[start:i].strip())
+            start = i + 1
+            has_code = False
+        elif not ch.isspace():
+            has_code = True
+        i += 1
+    if has_code:
+        out.append(sql[start:].strip())
+    return out
+
+def run_script(conn, sql: str) -> int:
+    """Run every statement of `sql` on `conn` verbatim (no bind-parameter parsing)."""
+    raw = conn.execution_options(no_parameters=True)
+    stmts = split_sql(sql)
+    for s in stmts:
+        raw.exec_driver_sql(s)
+    return len(stmts)
+
+
+# ---------- version table ----------
+def _ensure_version_table(conn):
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+          version INT PRIMARY KEY,
+          name TEXT NOT NULL,
+          applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """)
+
+def current_version() -> int:
+    """Highest applied version; 0 for a database that predates schema_version."""
+    with engine.connect() as conn:
+        exists = conn.exec_driver_sql("SELECT to_regclass('public.schema_version') IS NOT NULL").scalar()
+        if not exists:
+            return 0
+        return int(conn.exec_driver_sql("SELECT COALESCE(MAX(version), 0) FROM schema_version").scalar())
+
+
+# ---------- apply ----------
+def migrate() -> int:
+    """Apply every pending migration. Safe to run from several processes at once."""
+    applied = 0
+    for version, name, path in migrations():
+        with open(path, "r", encoding="utf-8") as f:
+            sql = f.read()
+        t0 = time.perf_counter()
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f"SELECT pg_advisory_xact_lock({_LOCK_KEY})")
+            _ensure_version_table(conn)
+            done = conn.execute(
+                text("SELECT 1 FROM schema_version WHERE version = :v"), {"v": version}
+            ).first()
+            if done:
+                continue
+            n = run_script(conn, sql)
+            conn.execute(
+                text("INSERT INTO schema_version(version, name) VALUES (:v, :n)"),
+                {"v": version, "n": name},
+            )
+        applied += 1
+        logging.info("MIGRATE %04d_%s: %d statements in %.1fms",
+                     version, name, n, (time.perf_counter() - t0) * 1000)
+    v = current_version()
+    _state["version"] = v
+    return v
+
+def ensure_current() -> int:
+    """
+    Startup check: one version query, migrations only if the DB is behind.
+    Memoized, so later callers in the same process don't hit the DB at all.
+    """
+    if _state["version"] is not None:
+        return _state["version"]
+    with _lock:
+        if _state["version"] is None:
+            v = current_version()
+            if v < latest_version():
+                v = migrate()
+            _state["version"] = v
+    return _state["version"]
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "up"
+    if cmd == "status":
+        print(f"schema version {current_version()} (latest {latest_version()})")
+    elif cmd == "up":
+        print(f"✅ schema at version {migrate()}")
+    else:
+        sys.exit("usage: python migrate.py [up|status]")
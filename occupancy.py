@@ -0,0 +1,171 @@
+# occupancy.py
+# In-process sprint occupancy index, one per quarter:
+#   resource_id -> tribe_name -> 6-bit sprint mask (bit 0 = s1 ... bit 5 = s6)
+# plus the temp reservations needed to answer /api/availability without a DB hit.
+# Built lazily from master_assignments/temp_assignments, refreshed by the booking
+# write paths and dropped wholesale after an upload.
+# Every cell carries the MAX(row_version) it was read at (migration 0008): refreshes
+# may land in any order, and one holding an older read than the cell is dropped.
+import threading
+from db import fetch_one, fetch_iter
+import quarters
+
+SPRINTS = ("s1", "s2", "s3", "s4", "s5", "s6")
+FULL_MASK = (1 << len(SPRINTS)) - 1
+
+_lock = threading.RLock()
+_quarters = {}  # qid -> {"occ": {...}, "ver": {...}, "temp": {...}, "rid": {...}}
+
+
+# ---------- mask helpers ----------
+# master_assignments.sprint_mask holds the same packing (generated column, migration 0004).
+def to_mask(row) -> int:
+    """Pack a row/dict with s1..s6 truthy values into a 6-bit int."""
+    m = 0
+    for i, col in enumerate(SPRINTS):
+        if row.get(col):
+            m |= 1 << i
+    return m
+
+def to_flags(mask: int) -> list[int]:
+    """6-bit int -> [0/1]*6 (s1 first), the shape the JSON API returns."""
+    return [(mask >> i) & 1 for i in range(len(SPRINTS))]
+
+def to_columns(mask: int) -> dict:
+    """6-bit int -> {"s1": bool, ...}, bind params for writing the boolean columns."""
+    return {col: bool((mask >> i) & 1) for i, col in enumerate(SPRINTS)}
+
+def sprint_numbers(mask: int) -> list[int]:
+    """6-bit int -> 1-based sprint numbers that are set, e.g. 0b101 -> [1, 3]."""
+    return [i + 1 for i in range(len(SPRINTS)) if (mask >> i) & 1]
+
+def popcount(mask: int) -> int:
+    return bin(mask & FULL_MASK).count("1")
+
+def bit_count_sql(expr: str) -> str:
+    """SQL popcount of a 6-bit mask expression."""
+    return f"bit_count(({expr})::int::bit({len(SPRINTS)}))"
+
+
+# ---------- build ----------
+_BUILD_BATCH_ROWS = 5000
+
+def _rows(batches):
+    for batch in batches:
+        yield from batch
+
+def _build(qid: int) -> dict:
+    # streamed: only the packed masks are kept, never the full row set
+    occ, ver = {}, {}
+    for r in _rows(fetch_iter("""
+        SELECT resource_id, tribe_name, sprint_mask AS mask, row_version
+        FROM master_assignments
+        WHERE quarter_id = :qid AND resource_id IS NOT NULL
+    """, batch_size=_BUILD_BATCH_ROWS, qid=qid)):
+        rid = int(r["resource_id"])
+        by_tribe = occ.setdefault(rid, {})
+        by_tribe[r["tribe_name"]] = by_tribe.get(r["tribe_name"], 0) | int(r["mask"])
+        key = (rid, r["tribe_name"])
+        ver[key] = max(ver.get(key, 0), int(r["row_version"]))
+
+    temp, rid = {}, {}
+    for r in _rows(fetch_iter("""
+        SELECT ta.id, r.id AS resource_id, r.name AS resource_name, r.role,
+               t.name AS tribe_name, ta.tribe_name AS tribe_name_raw,
+               ta.assign_type, ta.reserved_sprints
+        FROM temp_assignments ta
+        JOIN resources r ON r.id = ta.resource_id
+        LEFT JOIN tribes t ON t.id = ta.tribe_id
+        WHERE ta.quarter_id = :qid
+        ORDER BY ta.id
+    """, batch_size=_BUILD_BATCH_ROWS, qid=qid)):
+        res = {
+            "resource_id": int(r["resource_id"]),
+            "resource_name": r["resource_name"],
+            "assign_type": r["assign_type"],
+            "reserved_sprints": r["reserved_sprints"],
+        }
+        # same matching rule as the SQL lookups: t.name = :tname OR ta.tribe_name = :tname
+        for tname in {r["tribe_name"], r["tribe_name_raw"]} - {None}:
+            temp.setdefault((res["resource_id"], tname), {**res, "tribe_name": r["tribe_name"] or tname})
+        rid.setdefault((r["resource_name"], r["role"]), res["resource_id"])
+        rid.setdefault((r["resource_name"], None), res["resource_id"])
+
+    return {"occ": occ, "ver": ver, "temp": temp, "rid": rid}
+
+def _get(qid: int) -> dict:
+    with _lock:
+        idx = _quarters.get(qid)
+        if idx is None:
+            idx = _quarters[qid] = _build(qid)
+        return idx
+
+
+# ---------- reads ----------
+def resource_id(qid: int, name: str, role: str|None = None) -> int|None:
+    """Resource id for a name (+ optional role) reserved somewhere in this quarter."""
+    with _lock:
+        return _get(qid)["rid"].get((name, role or None))
+
+def reservation(qid: int, tribe: str, rid: int) -> dict|None:
+    """Temp reservation of `rid` for `tribe` in this quarter, or None."""
+    with _lock:
+        rec = _get(qid)["temp"].get((int(rid), tribe))
+        return dict(rec) if rec else None
+
+def tribe_masks(qid: int, rid: int) -> dict:
+    """Copy of tribe -> mask for one resource."""
+    with _lock:
+        return dict(_get(qid)["occ"].get(int(rid), {}))
+
+
+# ---------- writes ----------
+def refresh(qid: int, rid: int, tribe_name: str):
+    """Re-read one (resource, tribe) cell after a booking write. No-op if the quarter isn't indexed yet."""
+    with _lock:
+        if qid not in _quarters:
+            return
+    _apply(qid, rid, tribe_name, _read_cell(qid, rid, tribe_name))
+
+def _read_cell(qid: int, rid: int, tribe_name: str) -> dict:
+    """Mask, row count and version of one cell, from one snapshot."""
+    return fetch_one("""
+        SELECT COALESCE(bit_or(sprint_mask), 0) AS mask, COUNT(*) AS n,
+               COALESCE(MAX(row_version), 0) AS version
+        FROM master_assignments
+        WHERE quarter_id = :qid AND resource_id = :rid AND tribe_name = :tname
+    """, qid=qid, rid=rid, tname=tribe_name)
+
+def _apply(qid: int, rid: int, tribe_name: str, cell: dict):
+    with _lock:
+        idx = _quarters.get(qid)
+        if idx is None:
+            return
+        key = (int(rid), tribe_name)
+        version = int(cell["version"])
+        if version < idx["ver"].get(key, 0):
+            return  # read before a write this cell already reflects
+        idx["ver"][key] = version
+        by_tribe = idx["occ"].setdefault(int(rid), {})
+        if cell["n"]:
+            by_tribe[tribe_name] = int(cell["mask"])
+        else:
+            by_tribe.pop(tribe_name, None)
+
+def invalidate(qid: int|None = None):
+    """Drop one quarter (or everything) so the next read rebuilds from the DB."""
+    with _lock:
+        if qid is None:
+            _quarters.clear()
+        else:
+            _quarters.pop(qid, None)
+
+@quarters.on_change
+def _remote_change(reason: str, msg: dict):
+    if reason == "booking":
+        # another process booked: re-read its cells (versioned, so order doesn't matter)
+        for r in msg.get("rows") or []:
+            refresh(msg["qid"], int(r["resource_id"]), r["tribe_name"])
+    elif reason in ("upload", "resync"):
+        # another process re-seeded the plan (or we may have missed it): rebuild on next read
+        invalidate()
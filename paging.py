@@ -0,0 +1,56 @@
+# paging.py
+# Keyset pagination for the list endpoints.
+# A cursor is opaque to clients: urlsafe base64 of the JSON sort key of the last row
+# served. The next page is "rows strictly after that key" in the same ORDER BY, so
+# each page is one bounded index range scan no matter how deep the client pages.
+import os, json, base64
+from datetime import datetime
+
+DEFAULT_LIMIT = int(os.getenv("PAGE_LIMIT", "200"))
+MAX_LIMIT = 1000
+
+
+class BadCursor(ValueError):
+    pass
+
+
+def page_limit(raw) -> int:
+    """?limit= clamped to 1..MAX_LIMIT (DEFAULT_LIMIT when missing or junk)."""
+    try:
+        n = int(raw)
+    except (TypeError, ValueError):
+        return DEFAULT_LIMIT
+    return max(1, min(MAX_LIMIT, n))
+
+def _json_default(v):
+    if isinstance(v, datetime):
+        return v.isoformat()
+    raise TypeError(f"not cursor-serializable: {type(v).__name__}")
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, default=_json_default, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(token: str|None, size: int) -> list|None:
+    """Sort-key list of `size` values, None for no cursor; BadCursor if it was tampered with."""
+    token = (token or "").strip()
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except ValueError as e:
+        raise BadCursor("invalid cursor") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise BadCursor("invalid cursor")
+    return values
+
+def split_page(rows: list, limit: int, key) -> tuple[list, str|None]:
+    """
+    `rows` was fetched with LIMIT limit+1. Returns (rows to serve, next cursor or None);
+    `key(row)` gives the sort-key values of a row.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key(rows[-1]))
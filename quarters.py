@@ -0,0 +1,128 @@
+# quarters.py
+# Current-quarter metadata (id, title, created_at) cached in every process and
+# invalidated through Postgres LISTEN/NOTIFY (the same channel carries booking writes,
+# see changes.notify, which leave the metadata alone):
+#   - writers that change the current quarter or its data call notify() inside their
+#     transaction; Postgres delivers it at COMMIT (and drops it on ROLLBACK)
+#   - each process runs one listener thread on its own connection (outside the pool);
+#     a notification drops the cache and, when it came from another process, runs the
+#     on_change() hooks (the writing process already invalidated its own state)
+# While the listener is connected a cache hit costs nothing and stays valid until the
+# next NOTIFY. If it disconnects, the cache falls back to a short TTL until it's back.
+import json, time, secrets, logging, threading
+from time import monotonic
+import psycopg
+from db import engine, fetch_one
+
+CHANNEL = "quarter_changed"
+FALLBACK_TTL_SECS = 5     # cache lifetime while the listener is down
+RECONNECT_MAX_SECS = 30
+
+_ORIGIN = secrets.token_hex(6)  # tags our own notifications
+_lock = threading.Lock()
+_state = {"meta": None, "ts": 0.0, "gen": 0, "listening": False, "thread": None}
+_hooks = []  # fn(reason, msg) run for other processes' notifications and after a reconnect
+_DATA_ONLY = ("booking",)  # reasons that don't touch the quarters table
+
+
+def _load() -> dict:
+    row = fetch_one("""
+        SELECT id, COALESCE(name, code) AS title, created_at
+        FROM quarters
+        WHERE is_current = TRUE
+        LIMIT 1
+    """)
+    return row or {"id": None, "title": "", "created_at": None}
+
+def current() -> dict:
+    """{"id", "title", "created_at"} of the current quarter (id None if none is set)."""
+    _ensure_listener()
+    meta = _state["meta"]
+    if meta is not None and (_state["listening"] or monotonic() - _state["ts"] < FALLBACK_TTL_SECS):
+        return meta
+    with _lock:
+        gen = _state["gen"]
+        meta = _load()
+        if gen == _state["gen"]:  # don't store a row read before an invalidation landed
+            _state["meta"], _state["ts"] = meta, monotonic()
+    return meta
+
+def current_id() -> int|None:
+    return current()["id"]
+
+def current_title() -> str:
+    return current()["title"] or ""
+
+def invalidate():
+    _state["gen"] += 1
+    _state["meta"] = None
+
+
+def notify(tx, reason: str, **data):
+    """Queue a change notification on `tx`; every process sees it when tx commits."""
+    tx.execute("SELECT pg_notify(:ch, :payload)", ch=CHANNEL,
+               payload=json.dumps({"reason": reason, "origin": _ORIGIN, **data},
+                                  default=str, separators=(",", ":")))
+
+def listening() -> bool:
+    """True while the listener is connected, i.e. other processes' changes reach us."""
+    return _state["listening"]
+
+def on_change(fn):
+    """
+    Register fn(reason, msg) for changes made by OTHER processes ("upload", "set_quarter",
+    "booking"), and "resync" after the listener (re)connects and may have missed some.
+    msg is the decoded notification (extra fields passed to notify()).
+    """
+    _hooks.append(fn)
+    return fn
+
+
+# ---------- listener ----------
+def _conninfo() -> str:
+    # same database as the engine, plain libpq URL (no "+psycopg" driver suffix)
+    return engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+def _dispatch(payload: str):
+    try:
+        msg = json.loads(payload or "{}")
+    except ValueError:
+        msg = {}
+    reason = msg.get("reason", "")
+    if reason not in _DATA_ONLY:
+        invalidate()
+    if msg.get("origin") == _ORIGIN:
+        return
+    for fn in list(_hooks):
+        try:
+            fn(reason, msg)
+        except Exception as e:
+            logging.warning("quarters hook %s failed: %s", getattr(fn, "__name__", fn), e)
+
+def _listen_forever():
+    delay = 1
+    while True:
+        try:
+            with psycopg.connect(_conninfo(), autocommit=True) as conn:
+                conn.execute(f"LISTEN {CHANNEL}")
+                # anything that changed before LISTEN took effect was missed
+                _state["listening"] = True
+                _dispatch('{"reason": "resync"}')
+                delay = 1
+                for n in conn.notifies():
+                    _dispatch(n.payload)
+        except Exception as e:
+            logging.warning("quarters listener disconnected: %s", e)
+        _state["listening"] = False
+        invalidate()
+        time.sleep(delay)
+        delay = min(delay * 2, RECONNECT_MAX_SECS)
+
+def _ensure_listener():
+    if _state["thread"] is not None:
+        return
+    with _lock:
+        if _state["thread"] is None:
+            t = threading.Thread(target=_listen_forever, name="quarters-listen", daemon=True)
+            _state["thread"] = t
+            t.start()
@@ -1,279 +1,22 @@
 # routes/admin.py
 # Admin dashboard: login, set current quarter, upload Excel, normalize + load into quarter & permanent tables.
 from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for
-import os, re, threading, secrets
+import os, time, tempfile
 import pandas as pd
-from db import fetch_one, fetch_all, execute, get_current_qid
+from db import fetch_one, fetch_all, get_current_qid, transaction, profile_stats, reset_profile
+from migrate import ensure_current
+import occupancy
+import quarters
+import changes
+import events
+import metrics
+import jobs
+import ingest
 
 ADMIN_PW = (os.getenv('ADMIN_PASSWORD') or '').strip()
+UPLOAD_LOCK_KEY = 730_023  # pg_advisory_xact_lock key: one reseed at a time across processes
 bp = Blueprint("admin", __name__, template_folder="../templates")
-SCHEMA_WARMED = False
-
-# ------------------------------
-# In-memory progress registry for progressive uploads
-# ------------------------------
-_PROGRESS = {}  # job_id -> {"percent": int, "status": "running|done|error", "rows":int, "target_quarter_id":int, "error":str}
-
-
-# ---------- schema helpers ----------
-def _has_col(table: str, col: str) -> bool:
-    row = fetch_one("""
-        SELECT 1 FROM information_schema.columns
-        WHERE table_name = :t AND column_name = :c
-        LIMIT 1
-    """, t=table, c=col)
-    return bool(row)
-
-def _has_table(table: str) -> bool:
-    row = fetch_one("""
-        SELECT 1
-        FROM information_schema.tables
-        WHERE table_name = :t AND table_schema = 'public'
-        LIMIT 1
-    """, t=table)
-    return bool(row)
-
-def _col_type(table: str, col: str) -> str|None:
-    row = fetch_one("""
-        SELECT data_type
-        FROM information_schema.columns
-        WHERE table_name = :t AND column_name = :c
-        LIMIT 1
-    """, t=table, c=col)
-    return (row or {}).get("data_type") if row else None
-
-# Ensure minimal schema shape for admin flows
-# Supports legacy → new shapes without breaking your existing db.
-def _ensure_min_schema():
-    # quarters: support "label" (initial) or "name" (UI expects name)
-    if _has_col("quarters", "label") and not _has_col("quarters", "name"):
-        execute("ALTER TABLE quarters RENAME COLUMN label TO name")
-    if not _has_col("quarters", "name"):
-        execute("ALTER TABLE quarters ADD COLUMN name text")
-    if not _has_col("quarters", "is_current"):
-        execute("ALTER TABLE quarters ADD COLUMN is_current boolean NOT NULL DEFAULT FALSE")
-    if not _has_col("quarters", "created_at"):
-        execute("ALTER TABLE quarters ADD COLUMN created_at timestamp NOT NULL DEFAULT NOW()")
-
-    # resources table: make sure role column exists
-    if not _has_col("resources", "role"):
-        execute("ALTER TABLE resources ADD COLUMN role TEXT")
-
-    # temp_assignments: ensure core columns exist
-    if not _has_table("temp_assignments"):
-        execute("""
-        CREATE TABLE IF NOT EXISTS temp_assignments (
-          id SERIAL PRIMARY KEY,
-          quarter_id INT NOT NULL REFERENCES quarters(id) ON DELETE CASCADE,
-          tribe_id INT,
-          app_id INT,
-          -- optional denormalized names (for history ease)
-          tribe_name TEXT,
-          app_name TEXT,
-          -- resource linkage
-          resource_id INT,
-          resource_name TEXT,
-          role TEXT,
-          assign_type TEXT,
-          reserved_sprints INT NOT NULL DEFAULT 0
-            CHECK (reserved_sprints >= 0 AND reserved_sprints <= 6)
-        )""")
-        try:
-            execute(
-                "ALTER TABLE temp_assignments "
-                "ADD CONSTRAINT temp_assignments_resource_id_fkey "
-                "FOREIGN KEY (resource_id) REFERENCES resources(id) ON DELETE CASCADE"
-            )
-        except Exception:
-            pass
-    else:
-        # add missing columns if needed
-        if not _has_col("temp_assignments", "quarter_id"):
-            execute("ALTER TABLE temp_assignments ADD COLUMN quarter_id INT NOT NULL REFERENCES quarters(id) ON DELETE CASCADE")
-        if not _has_col("temp_assignments", "resource_id"):
-            try:
-                execute("ALTER TABLE temp_assignments ADD COLUMN resource_id INT")
-                execute(
-                    "ALTER TABLE temp_assignments "
-                    "ADD CONSTRAINT temp_assignments_resource_id_fkey "
-                    "FOREIGN KEY (resource_id) REFERENCES resources(id) ON DELETE CASCADE"
-                )
-            except Exception:
-                pass
-
-    # --- normalize legacy column names in temp_assignments ---
-    if not _has_col("temp_assignments", "resource_name"):
-        if _has_col("temp_assignments", "resource"):
-            execute("ALTER TABLE temp_assignments RENAME COLUMN resource TO resource_name")
-        else:
-            execute("ALTER TABLE temp_assignments ADD COLUMN resource_name TEXT")
-    if not _has_col("temp_assignments", "role"):
-        execute("ALTER TABLE temp_assignments ADD COLUMN role TEXT")
-
-    if not _has_col("temp_assignments", "assign_type"):
-        execute("ALTER TABLE temp_assignments ADD COLUMN assign_type TEXT")
-    try:
-        execute("""
-        DO $$
-        BEGIN
-          IF NOT EXISTS (
-            SELECT 1
-            FROM information_schema.table_constraints c
-            WHERE c.table_name='temp_assignments'
-              AND c.constraint_type='CHECK'
-              AND c.constraint_name='temp_assignments_assign_type_chk'
-          ) THEN
-            ALTER TABLE temp_assignments
-              ADD CONSTRAINT temp_assignments_assign_type_chk
-              CHECK (assign_type IN ('Dedicated','Shared'));
-          END IF;
-        END $$;
-        """)
-    except Exception:
-        pass
 
-    if not _has_col("temp_assignments", "reserved_sprints"):
-        execute("""
-            ALTER TABLE temp_assignments
-            ADD COLUMN reserved_sprints INT NOT NULL DEFAULT 0
-        """)
-        try:
-            execute("""ALTER TABLE temp_assignments
-                    ADD CONSTRAINT ta_reserved_chk
-                    CHECK (reserved_sprints >= 0 AND reserved_sprints <= 6)""")
-        except Exception:
-            pass  # if check exists
-
-    # history_temp_assignments shape (create if missing or add columns if present)
-    if not _has_table("history_temp_assignments"):
-        execute("""
-            CREATE TABLE IF NOT EXISTS history_temp_assignments(
-              quarter_id INT,
-              orig_id INT,
-              tribe_name TEXT,
-              app_name TEXT,
-              resource_id INT,
-              resource_name TEXT,
-              role TEXT,
-              assign_type TEXT,
-              reserved_sprints INT NOT NULL DEFAULT 0
-                CHECK (reserved_sprints >= 0 AND reserved_sprints <= 6)
-            )
-        """)
-    else:
-        if not _has_col("history_temp_assignments", "orig_id"):
-            execute("ALTER TABLE history_temp_assignments ADD COLUMN orig_id INT")
-        if not _has_col("history_temp_assignments", "reserved_sprints"):
-            execute("ALTER TABLE history_temp_assignments ADD COLUMN reserved_sprints INT NOT NULL DEFAULT 0")
-            try:
-                execute("""ALTER TABLE history_temp_assignments
-                        ADD CONSTRAINT hta_reserved_chk
-                        CHECK (reserved_sprints >= 0 AND reserved_sprints <= 6)""")
-            except Exception:
-                pass
-
-    # Make resource_id nullable then ON DELETE SET NULL for history
-    try:
-        execute("""
-        DO $$
-        BEGIN
-            IF EXISTS (
-            SELECT 1 FROM information_schema.columns
-            WHERE table_name = 'history_temp_assignments'
-                AND column_name = 'resource_id'
-                AND is_nullable = 'NO'
-            ) THEN
-            ALTER TABLE history_temp_assignments
-                ALTER COLUMN resource_id DROP NOT NULL;
-            END IF;
-        END $$;
-        """)
-    except Exception:
-        pass
-    try:
-        execute("""
-        DO $$
-        DECLARE
-            conname text;
-        BEGIN
-            SELECT c.conname
-            INTO conname
-            FROM pg_constraint c
-            JOIN pg_class t   ON t.oid = c.conrelid
-            JOIN pg_namespace n ON n.oid = t.relnamespace
-            WHERE c.contype = 'f'
-            AND t.relname = 'history_temp_assignments'
-            AND n.nspname = 'public'
-            AND c.confrelid = 'resources'::regclass;
-
-            IF conname IS NOT NULL THEN
-            EXECUTE format('ALTER TABLE history_temp_assignments DROP CONSTRAINT %I', conname);
-            END IF;
-
-            BEGIN
-            ALTER TABLE history_temp_assignments
-                ADD CONSTRAINT hta_resource_id_fkey
-                FOREIGN KEY (resource_id) REFERENCES resources(id) ON DELETE SET NULL;
-            EXCEPTION WHEN duplicate_object THEN
-            END;
-        END $$;
-        """)
-    except Exception:
-        pass
-
-    # ----- master_assignments -----
-    if not _has_table("master_assignments"):
-        execute("""
-            CREATE TABLE IF NOT EXISTS master_assignments (
-              id SERIAL PRIMARY KEY,
-              quarter_id INT NOT NULL REFERENCES quarters(id) ON DELETE CASCADE,
-              orig_id INT,
-              tribe_name TEXT,
-              app_name TEXT,
-              resource_name TEXT,
-              role TEXT,
-              assignment_type TEXT,
-              s1 BOOLEAN NOT NULL DEFAULT FALSE,
-              s2 BOOLEAN NOT NULL DEFAULT FALSE,
-              s3 BOOLEAN NOT NULL DEFAULT FALSE,
-              s4 BOOLEAN NOT NULL DEFAULT FALSE,
-              s5 BOOLEAN NOT NULL DEFAULT FALSE,
-              s6 BOOLEAN NOT NULL DEFAULT FALSE,
-              edited BOOLEAN NOT NULL DEFAULT FALSE,
-              updated_at TIMESTAMP NOT NULL DEFAULT NOW()
-            )
-        """)
-    else:
-        if not _has_col("history_master_assignments", "orig_id"):
-            execute("ALTER TABLE history_master_assignments ADD COLUMN orig_id INT")
-        if not _has_col("master_assignments", "quarter_id"):
-            execute("ALTER TABLE master_assignments ADD COLUMN quarter_id INT REFERENCES quarters(id) ON DELETE CASCADE")
-        if not _has_col("master_assignments", "tribe_name"):
-            execute("ALTER TABLE master_assignments ADD COLUMN tribe_name TEXT")
-        if not _has_col("master_assignments", "app_name"):
-            execute("ALTER TABLE master_assignments ADD COLUMN app_name TEXT")
-        if not _has_col("master_assignments", "resource_name"):
-            execute("ALTER TABLE master_assignments ADD COLUMN resource_name TEXT")
-        if not _has_col("master_assignments", "role"):
-            execute("ALTER TABLE master_assignments ADD COLUMN role TEXT")
-
-        if not _has_col("master_assignments", "assignment_type") and _has_col("master_assignments", "assign_type"):
-            execute("ALTER TABLE master_assignments RENAME COLUMN assign_type TO assignment_type")
-        if not _has_col("master_assignments", "assignment_type"):
-            execute("ALTER TABLE master_assignments ADD COLUMN assignment_type TEXT")
-
-        for col in ("s1","s2","s3","s4","s5","s6"):
-            if not _has_col("master_assignments", col):
-                execute(f"ALTER TABLE master_assignments ADD COLUMN {col} BOOLEAN NOT NULL DEFAULT FALSE")
-        if not _has_col("master_assignments", "edited"):
-            execute("ALTER TABLE master_assignments ADD COLUMN edited BOOLEAN NOT NULL DEFAULT FALSE")
-        if not _has_col("master_assignments", "updated_at"):
-            execute("ALTER TABLE master_assignments ADD COLUMN updated_at TIMESTAMP NOT NULL DEFAULT NOW()")
-
-    try:
-        execute("CREATE INDEX IF NOT EXISTS idx_master_assignments_qid ON master_assignments(quarter_id)")
-    except Exception:
-        pass
 
 
 # ---------- utils ----------
@@ -295,18 +38,70 @@ def current_quarter_id():
         raise RuntimeError("No current quarter set.")
     return qid
 
-# Tiny progress helper
-def _progress_update(job_id: str|None, percent: int|None=None, status: str|None=None, **extra):
-    if not job_id:
-        return
-    rec = _PROGRESS.get(job_id) or {}
-    if percent is not None:
-        rec["percent"] = max(0, min(100, int(percent)))
-    if status:
-        rec["status"] = status
-    for k, v in extra.items():
-        rec[k] = v
-    _PROGRESS[job_id] = rec
+# Upload phases by progress percent (see the progress plan in _upload)
+_PHASES = ((60, "loading"), (65, "classifying"), (75, "snapshot"), (100, "reseeding"))
+
+def _phase_for(percent: int) -> str:
+    return next((name for upto, name in _PHASES if percent < upto), "finalizing")
+
+def _upload_form():
+    target = (request.form.get("target")
+              or (request.json.get("target") if request.is_json else "")
+              or "current").strip().lower()
+    new_qname = (request.form.get("new_quarter_name")
+                 or (request.json.get("new_quarter_name") if request.is_json else "")
+                 or "").strip()
+    return target, new_qname
+
+def _upload_key(target: str, new_qname: str) -> str:
+    """Executor key for the quarter an upload writes to: one queued/running job per key."""
+    if target == "new":
+        row = fetch_one("SELECT id FROM quarters WHERE code = :name OR name = :name ORDER BY id LIMIT 1",
+                        name=new_qname)
+        return f"quarter:{row['id']}" if row else f"new:{new_qname.lower()}"
+    return f"quarter:{get_current_qid()}"
+
+def _save_upload(f) -> str:
+    """Spool the uploaded file to disk for the worker: the request (and f) is gone by then."""
+    suffix = os.path.splitext(f.filename or "")[1].lower() or ".xlsx"
+    fd, path = tempfile.mkstemp(prefix="upload-", suffix=suffix)
+    with os.fdopen(fd, "wb") as out:
+        f.save(out)
+    return path
+
+def _discard(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _submit_upload(path: str, target: str, new_qname: str) -> str:
+    """
+    Queue an upload of the spooled file at `path` (removed once the job ends, however it ends)
+    on jobs.uploads; raises jobs.TargetBusy / jobs.QueueFull.
+    """
+    def run(job_id):
+        last = {"percent": None}
+        def cb(p):
+            if p == last["percent"]:  # the job store is shared: skip no-op writes
+                return
+            if p < 100:  # 100 is reported after COMMIT: too late to cancel
+                jobs.uploads.checkpoint(job_id)  # raising here rolls the upload back
+            last["percent"] = p
+            jobs.update(job_id, percent=p, phase=_phase_for(p))
+        rows, qid = _perform_upload(path, target, new_qname, progress=cb)
+        return {"rows": int(rows), "target_quarter_id": int(qid)}
+    try:
+        return jobs.uploads.submit(_upload_key(target, new_qname), run, cleanup=lambda: _discard(path))
+    except Exception:
+        _discard(path)
+        raise
+
+def _queue_error(e: Exception):
+    if isinstance(e, jobs.TargetBusy):
+        return jsonify({"error": "An upload for this quarter is already queued or running.",
+                        "job_id": e.job_id}), 409
+    return jsonify({"error": f"Upload queue is full ({e}). Try again later."}), 429
 
 
 # =========================
@@ -336,18 +131,8 @@ def logout():
 @bp.get("/")
 @admin_required
 def dashboard():
-    # Build a COALESCE() only from columns that exist
-    title_cols = []
-    if _has_col("quarters", "code"):
-        title_cols.append("code")
-    if _has_col("quarters", "name"):
-        title_cols.append("name")
-    if _has_col("quarters", "label"):
-        title_cols.append("label")
-    title_expr = "COALESCE(" + ", ".join(title_cols) + ")" if title_cols else "'(no title)'"
-
-    quarters = fetch_all(f"""
-      SELECT id, {title_expr} AS name, is_current, created_at
+    quarters = fetch_all("""
+      SELECT id, COALESCE(name, code) AS name, is_current, created_at
       FROM quarters
       ORDER BY created_at DESC
     """)
@@ -355,49 +140,63 @@ def dashboard():
     return render_template("admin.html", page="dashboard", quarters=quarters, current=current)
 
 
+# =========================
+# QUERY PROFILER (db.py per-fingerprint stats + captured plans)
+# =========================
+@bp.get("/queries")
+@admin_required
+def queries_page():
+    order = request.args.get("order", "total_ms")
+    return render_template("admin_queries.html", stats=profile_stats(order), order=order)
+
+@bp.get("/api/queries")
+@admin_required
+def queries_json():
+    return jsonify(profile_stats(request.args.get("order", "total_ms")))
+
+@bp.post("/queries/reset")
+@admin_required
+def queries_reset():
+    reset_profile()
+    return redirect(url_for("admin.queries_page"))
+
+
 # =========================
 # CURRENT QUARTER APIs
 # (mounted under this blueprint; URL will be /admin/api/current-quarter)
 # =========================
 @bp.get("/api/current-quarter")
 def api_current_quarter():
-    qid = get_current_qid()
-    if not qid:
-        return jsonify({"name": ""})
-    row = fetch_one("SELECT name FROM quarters WHERE id = :id", id=qid)
-    return jsonify({"name": (row or {}).get("name") or ""})
+    return jsonify({"name": quarters.current_title()})
 
 
 @bp.post("/set-quarter")
 @admin_required
 def set_quarter():
-    _ensure_min_schema()
+    ensure_current()
     qname = (request.form.get("quarter_name")
              or (request.json.get("quarter_name") if request.is_json else "")
              or "").strip()
     if not qname:
         return jsonify({"error": "quarter name required"}), 400
 
-    # Detect which title column the table actually has (code > name > label).
-    if _has_col("quarters", "code"):
-        qcol = "code"
-    elif _has_col("quarters", "name"):
-        qcol = "name"
-    elif _has_col("quarters", "label"):
-        qcol = "label"
-    else:
-        execute("ALTER TABLE quarters ADD COLUMN code TEXT")
-        qcol = "code"
-
-    row = fetch_one(f"SELECT id FROM quarters WHERE {qcol} = :v LIMIT 1", v=qname)
-    if not row:
-        execute(f"INSERT INTO quarters({qcol}, is_current, created_at) VALUES (:v, TRUE, NOW())", v=qname)
-        row = fetch_one(f"SELECT id FROM quarters WHERE {qcol} = :v LIMIT 1", v=qname)
-    else:
-        execute("UPDATE quarters SET is_current = TRUE WHERE id = :id", id=row["id"])
-
-    qid = int(row["id"])
-    execute("UPDATE quarters SET is_current = FALSE WHERE id <> :id", id=qid)
+    with transaction() as tx:
+        # quarters carries both title columns (see sql/migrations/0001_baseline.sql)
+        row = tx.fetch_one("SELECT id FROM quarters WHERE code = :v OR name = :v ORDER BY id LIMIT 1", v=qname)
+        if not row:
+            row = tx.fetch_one("""
+                INSERT INTO quarters(code, name, is_current, created_at)
+                VALUES (:v, :v, TRUE, NOW())
+                RETURNING id
+            """, v=qname)
+        else:
+            tx.execute("UPDATE quarters SET is_current = TRUE WHERE id = :id", id=row["id"])
+
+        qid = int(row["id"])
+        tx.execute("UPDATE quarters SET is_current = FALSE WHERE id <> :id", id=qid)
+        quarters.notify(tx, "set_quarter")  # other processes drop their cache at COMMIT
+    quarters.invalidate()
+    events.publish("reload", None, reason="set_quarter")
     return jsonify({"ok": True, "quarter_id": qid, "quarter_name": qname})
 
 
@@ -410,13 +209,41 @@ def upload_validate():
     if not file:
         return jsonify({"ok": False, "error": "No file uploaded"}), 400
 
-    name = (file.filename or "").lower()
-    if name.endswith((".xlsx", ".xls")):
-        df = pd.read_excel(file)
-    else:
-        df = pd.read_csv(file)
+    # pass 1 streams the sheet keeping only per-resource totals; pass 2 (only when some
+    # resource is over 6) collects the rows of the over-booked resources
+    totals = {}
+    try:
+        for chunk in ingest.iter_chunks(file.stream, file.filename):
+            df = _validate_frame(chunk)
+            for res_name, total in df.groupby("resource", dropna=False)["reserved_sprints"].sum().items():
+                totals[res_name] = totals.get(res_name, 0) + int(total)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    over = {r for r, total in totals.items() if total > 6}
+    found = {r: [] for r in over}
+    if over:
+        file.stream.seek(0)
+        for chunk in ingest.iter_chunks(file.stream, file.filename):
+            df = _validate_frame(chunk)
+            df = df[df["resource"].isin(over)]
+            for res_name, grp in df.groupby("resource", dropna=False):
+                found[res_name].append(grp)
+
+    conflicts = []
+    for res_name in sorted(over):
+        grp = pd.concat(found[res_name])
+        conflicts.append({
+            "resource": res_name,
+            "total_reserved": totals[res_name],
+            "rows": (grp.index + 2).tolist(),
+            "rows_preview": grp[["tribe","app","role","reserved_sprints","resource"]].to_dict(orient="records")
+        })
+
+    return jsonify({"ok": len(conflicts) == 0, "conflicts": conflicts})
 
-    cols = [c.strip().lower() for c in df.columns]
+def _validate_frame(df: pd.DataFrame) -> pd.DataFrame:
+    cols = [str(c).strip().lower() for c in df.columns]
     rename = {
         "tribe": "tribe",
         "app": "app",
@@ -431,7 +258,7 @@ def upload_validate():
             colmap[df.columns[cols.index(c)]] = rename[c]
     missing = [k for k in ("tribe","app","role","reserved_sprints","resource") if k not in colmap.values()]
     if missing:
-        return jsonify({"ok": False, "error": f"Missing columns: {missing}"}), 400
+        raise ValueError(f"Missing columns: {missing}")
 
     df = df.rename(columns=colmap)[["tribe","app","role","reserved_sprints","resource"]]
 
@@ -440,28 +267,35 @@ def upload_validate():
     df["role"] = df["role"].astype(str).str.strip()
     df["resource"] = df["resource"].astype(str).str.strip()
     df["reserved_sprints"] = pd.to_numeric(df["reserved_sprints"], errors="coerce").fillna(0).astype(int)
-
-    conflicts = []
-    for res_name, grp in df.groupby("resource", dropna=False):
-        total = int(grp["reserved_sprints"].sum())
-        if total > 6:
-            row_numbers = (grp.index + 2).tolist()
-            preview = grp[["tribe","app","role","reserved_sprints","resource"]].to_dict(orient="records")
-            conflicts.append({
-                "resource": res_name,
-                "total_reserved": total,
-                "rows": row_numbers,
-                "rows_preview": preview
-            })
-
-    return jsonify({"ok": len(conflicts) == 0, "conflicts": conflicts})
+    return df
 
 
 # =========================
 # CORE UPLOAD IMPLEMENTATION
 # (used by both /upload and progressive /upload_excel_progress)
 # =========================
-def _normalize_and_classify(df: pd.DataFrame) -> pd.DataFrame:
+# Cell normalization, vectorised: str(v or "") per cell, then the string rules run once per
+# distinct value (plan sheets repeat the same tribe/app/resource/role names on many rows).
+def _text(col: pd.Series) -> pd.Series:
+    """str(v or "") for every cell: falsy cells (None, "", 0, False) become "", NaN becomes "nan"."""
+    vals = col.to_numpy(dtype=object)  # object first: str() of each value, as map() saw it
+    falsy = (vals == None) | (vals == "") | (vals == 0)  # noqa: E711 (elementwise)
+    return pd.Series(vals, index=col.index).astype(str).mask(falsy, "")
+
+def _canon(u: pd.Series) -> pd.Series:
+    return u.str.strip().str.replace(r"\s+", " ", regex=True)
+
+def _title(u: pd.Series) -> pd.Series:
+    u = _canon(u)
+    return u.str[:1].str.upper() + u.str[1:]
+
+def _by_value(col: pd.Series, fn) -> pd.Series:
+    codes, uniques = pd.factorize(_text(col))
+    out = fn(pd.Series(uniques, dtype=object)).to_numpy(dtype=object)
+    return pd.Series(out[codes], index=col.index, dtype=object)
+
+def _normalize_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    """Column names and cell values; row-local, so it can run per parsed chunk."""
     # normalize expected columns
     df.columns = [str(c).strip().lower() for c in df.columns]
     rename_in = {
@@ -478,179 +312,177 @@ def _normalize_and_classify(df: pd.DataFrame) -> pd.DataFrame:
     if missing:
         raise ValueError(f"Missing required columns: {', '.join(missing)}")
 
-    def _canon(s: str) -> str:
-        s = str(s or "").strip()
-        s = re.sub(r"\s+", " ", s)
-        return s
-    def _title(s: str) -> str:
-        s = _canon(s)
-        return s[:1].upper() + s[1:] if s else s
-
-    df["tribe"]    = df["tribe"].map(_canon)
-    df["tribe"]    = df["tribe"].str.replace(r"\bops\b", "Operations", regex=True)
-    df["app"]      = df["app"].map(_canon)
-    df["resource"] = df["resource"].map(_title)
-    df["role"]     = df["role"].map(_title)
+    df["tribe"]    = _by_value(df["tribe"], lambda u: _canon(u).str.replace(r"\bops\b", "Operations", regex=True))
+    df["app"]      = _by_value(df["app"], _canon)
+    df["resource"] = _by_value(df["resource"], _title)
+    df["role"]     = _by_value(df["role"], _title)
 
     df["reserved_sprints"] = pd.to_numeric(df["reserved_sprints"], errors="coerce").fillna(0).astype(int)
     df.loc[df["reserved_sprints"] < 0, "reserved_sprints"] = 0
     df.loc[df["reserved_sprints"] > 6, "reserved_sprints"] = 6
-    df = df.drop_duplicates(subset=["tribe","app","resource","role"])
-
-    agg = df.groupby("resource").agg(
-        total_reserved=("reserved_sprints","sum"),
-        tribes=("tribe","nunique"),
-    ).reset_index()
-
-    atype_map = {}
-    for row in agg.itertuples(index=False):
-        if row.tribes == 1 and row.total_reserved == 6:
-            atype = "Dedicated"
-        else:
-            atype = "Shared"
-        atype_map[row.resource] = atype
-    df["assign_type"] = df["resource"].map(atype_map)
     return df
 
+_STAGE_COLS = ["seq", "tribe", "app", "resource", "role", "reserved_sprints"]
 
-def _perform_upload(df: pd.DataFrame, target: str, new_qname: str|None, progress=None) -> tuple[int,int]:
+def _stage_upload(tx, chunks) -> int:
+    """
+    On the upload's transaction: normalize each parsed chunk and COPY it into a temp staging
+    table as it arrives, so only one chunk is in memory. Then, over the whole sheet in SQL,
+    drop duplicate (tribe, app, resource, role) rows (first wins, like drop_duplicates) and
+    classify each resource Dedicated (one tribe, 6 sprints in total) or Shared.
+    Returns the number of staged rows.
+    """
+    tx.execute("""
+        CREATE TEMP TABLE _upload_stage(
+          seq INT, tribe TEXT, app TEXT, resource TEXT, role TEXT,
+          assign_type TEXT, reserved_sprints INT
+        ) ON COMMIT DROP
+    """)
+    seq, seen = 0, False
+    for chunk in chunks:
+        seen = True
+        df = _normalize_chunk(chunk).drop_duplicates(subset=["tribe","app","resource","role"])
+        rows = [
+            (seq + i, tribe, app, resource, role, int(reserved))
+            for i, (tribe, app, resource, role, reserved) in enumerate(
+                df[["tribe", "app", "resource", "role", "reserved_sprints"]].itertuples(index=False, name=None))
+        ]
+        tx.copy_rows("_upload_stage", _STAGE_COLS, rows)
+        seq += len(rows)
+    if not seen:
+        _normalize_chunk(pd.DataFrame())  # no header row: raises "Missing required columns"
+
+    tx.execute("ANALYZE _upload_stage")
+    tx.execute("""
+        DELETE FROM _upload_stage s
+        USING (
+          SELECT seq, row_number() OVER (PARTITION BY tribe, app, resource, role ORDER BY seq) AS rn
+          FROM _upload_stage
+        ) d
+        WHERE d.seq = s.seq AND d.rn > 1
+    """)
+    tx.execute("""
+        UPDATE _upload_stage s
+        SET assign_type = CASE WHEN c.tribes = 1 AND c.total_reserved = 6 THEN 'Dedicated' ELSE 'Shared' END
+        FROM (
+          SELECT resource, COUNT(DISTINCT tribe) AS tribes, SUM(reserved_sprints) AS total_reserved
+          FROM _upload_stage
+          GROUP BY resource
+        ) c
+        WHERE c.resource = s.resource
+    """)
+    return int(tx.fetch_one("SELECT COUNT(*) AS n FROM _upload_stage")["n"])
+
+def _reseed(tx, qid_target: int, ta_cols: list[str], ta_vals: list[str]):
+    """
+    Reseed tribes/apps/resources and temp_assignments from _upload_stage with one set-based
+    statement each (foreign keys resolved by a join instead of per-row subqueries).
+    """
+    tx.execute("""
+        INSERT INTO tribes(name)
+        SELECT DISTINCT tribe FROM _upload_stage ORDER BY tribe
+        ON CONFLICT (name) DO NOTHING
+    """)
+    tx.execute("""
+        INSERT INTO apps(name)
+        SELECT DISTINCT app FROM _upload_stage ORDER BY app
+        ON CONFLICT (name) DO NOTHING
+    """)
+    # first row wins per resource, like drop_duplicates(subset=["resource"])
+    tx.execute("""
+        INSERT INTO resources(name, role)
+        SELECT DISTINCT ON (resource) resource, role
+        FROM _upload_stage
+        ORDER BY resource, seq
+        ON CONFLICT (name) DO UPDATE SET role = EXCLUDED.role
+    """)
+    tx.execute(f"""
+        INSERT INTO temp_assignments({', '.join(ta_cols)})
+        SELECT {', '.join(ta_vals)}
+        FROM _upload_stage s
+        LEFT JOIN tribes    t ON t.name = s.tribe
+        LEFT JOIN apps      a ON a.name = s.app
+        LEFT JOIN resources r ON r.name = s.resource
+        ORDER BY s.seq
+    """, qid=qid_target)
+
+
+def _perform_upload(source, target: str, new_qname: str|None, progress=None) -> tuple[int,int]:
     """
     Returns (rows_inserted, target_quarter_id).
+    `source` is a DataFrame or a sheet path (.xlsx/.csv), read in chunks by ingest.iter_chunks.
     `progress(pct)` can be passed to update progress 1..100.
     """
-    _ensure_min_schema()
+    t0 = time.perf_counter()
+    outcome = "error"
+    try:
+        result = _upload(source, target, new_qname, progress)
+        outcome = "ok"
+        return result
+    finally:
+        metrics.UPLOAD_SECONDS.observe(time.perf_counter() - t0, outcome=outcome,
+                                       target=target if target in ("current", "new") else "other")
+
+def _upload(source, target: str, new_qname: str|None, progress=None) -> tuple[int,int]:
+    ensure_current()
     if progress: progress(1)
 
-    df = _normalize_and_classify(df)
-    rows_total = int(len(df))
+    with transaction() as tx:
+        # the reseed below rewrites every quarter's working rows: serialize uploads from all processes
+        tx.execute("SELECT pg_advisory_xact_lock(:k)", k=UPLOAD_LOCK_KEY)
+        cur = tx.fetch_one("SELECT id FROM quarters WHERE is_current = TRUE LIMIT 1")
+        if not cur and target == "current":
+            raise RuntimeError("No current quarter is set. Please set it first.")
 
-    cur = fetch_one("SELECT id FROM quarters WHERE is_current = TRUE LIMIT 1")
-    if not cur and target == "current":
-        raise RuntimeError("No current quarter is set. Please set it first.")
-
-    # Resolve target qid
-    if target == "new":
-        if not new_qname:
-            raise RuntimeError("Please enter the new quarter name before uploading.")
-
-        if _has_col("quarters", "code"):
-            qcol = "code"
-        elif _has_col("quarters", "name"):
-            qcol = "name"
-        elif _has_col("quarters", "label"):
-            qcol = "label"
+        # Resolve target qid
+        if target == "new":
+            if not new_qname:
+                raise RuntimeError("Please enter the new quarter name before uploading.")
+
+            row = tx.fetch_one("SELECT id FROM quarters WHERE code = :name OR name = :name ORDER BY id LIMIT 1", name=new_qname)
+            if not row:
+                row = tx.fetch_one("""
+                    INSERT INTO quarters(code, name, is_current, created_at)
+                    VALUES (:name, :name, FALSE, NOW())
+                    RETURNING id
+                """, name=new_qname)
+
+            qid_target = row["id"]
+            qid_snapshot = cur["id"] if cur else None
         else:
-            execute("ALTER TABLE quarters ADD COLUMN code TEXT")
-            qcol = "code"
+            qid_target = cur["id"]
+            qid_snapshot = cur["id"]
 
-        row = fetch_one(f"SELECT id FROM quarters WHERE {qcol} = :name", name=new_qname)
-        if not row:
-            execute(f"INSERT INTO quarters({qcol}, is_current, created_at) VALUES (:name, FALSE, NOW())", name=new_qname)
-            row = fetch_one(f"SELECT id FROM quarters WHERE {qcol} = :name", name=new_qname)
-
-        qid_target = row["id"]
-        qid_snapshot = cur["id"] if cur else None
-    else:
-        qid_target = cur["id"]
-        qid_snapshot = cur["id"]
+        # Progress plan: parse + staged COPY (1-60, by rows/bytes parsed), classify (60-65),
+        # snapshot + reset (65-75), set-based reseed (75-95), commit + caches (95-100).
+        # Nothing below takes row locks until the snapshot, so parsing doesn't block bookings.
+        parsed = (lambda frac: progress(1 + int(frac * 59))) if progress else None
+        rows_total = _stage_upload(tx, ingest.iter_chunks(source, progress=parsed))
+        if progress: progress(65)
 
-    # Simple progress plan: schema/snapshot(0-20), reseed dims(20-50), inserts(50-95), finalize(95-100)
-    if progress: progress(10)
-
-    execute("BEGIN")
-    try:
         # --- SNAPSHOT (if any) ---
         if qid_snapshot is not None:
-            if _has_col("master_assignments", "assignment_type"):
-                ma_type_expr = "assignment_type"
-            elif _has_col("master_assignments", "assign_type"):
-                ma_type_expr = "assign_type"
-            else:
-                ma_type_expr = "NULL::text"
-
-            def _s(col: str) -> str:
-                dt = _col_type("master_assignments", col)
-                return col if (dt and dt.lower() == "boolean") else f"({col} <> 0)"
-
-            if not _has_table("history_resources"):
-                execute("""
-                    CREATE TABLE IF NOT EXISTS history_resources(
-                      quarter_id INT NOT NULL,
-                      id INT,
-                      name TEXT,
-                      role TEXT
-                    )""")
-            if not _has_table("history_tribes"):
-                execute("""
-                    CREATE TABLE IF NOT EXISTS history_tribes(
-                      quarter_id INT NOT NULL,
-                      id INT,
-                      name TEXT
-                    )""")
-            if not _has_table("history_apps"):
-                execute("""
-                    CREATE TABLE IF NOT EXISTS history_apps(
-                      quarter_id INT NOT NULL,
-                      id INT,
-                      name TEXT
-                    )""")
-            if not _has_table("history_temp_assignments"):
-                execute("""
-                    CREATE TABLE IF NOT EXISTS history_temp_assignments(
-                      quarter_id INT,
-                      id INT,
-                      tribe_name TEXT,
-                      app_name TEXT,
-                      resource_id INT,
-                      resource_name TEXT,
-                      role TEXT,
-                      assign_type TEXT,
-                      reserved_sprints INT NOT NULL DEFAULT 0
-                    )""")
-            if not _has_table("history_master_assignments"):
-                execute("""
-                    CREATE TABLE IF NOT EXISTS history_master_assignments(
-                      quarter_id INT,
-                      id INT,
-                      tribe_name TEXT,
-                      app_name TEXT,
-                      resource_name TEXT,
-                      role TEXT,
-                      assignment_type TEXT,
-                      s1 BOOLEAN, s2 BOOLEAN, s3 BOOLEAN,
-                      s4 BOOLEAN, s5 BOOLEAN, s6 BOOLEAN,
-                      edited BOOLEAN, updated_at TIMESTAMP
-                    )""")
-            if not _has_col("history_temp_assignments", "reserved_sprints"):
-                execute("ALTER TABLE history_temp_assignments ADD COLUMN reserved_sprints INT NOT NULL DEFAULT 0")
-
-            execute("DELETE FROM history_resources WHERE quarter_id = :qid", qid=qid_snapshot)
-            execute("DELETE FROM history_tribes WHERE quarter_id = :qid", qid=qid_snapshot)
-            execute("DELETE FROM history_apps WHERE quarter_id = :qid", qid=qid_snapshot)
-            execute("DELETE FROM history_temp_assignments WHERE quarter_id = :qid", qid=qid_snapshot)
-            execute("DELETE FROM history_master_assignments WHERE quarter_id = :qid", qid=qid_snapshot)
-
-            execute("INSERT INTO history_resources(quarter_id,id,name,role) SELECT :qid,id,name,role FROM resources", qid=qid_snapshot)
-            execute("INSERT INTO history_tribes(quarter_id,id,name) SELECT :qid,id,name FROM tribes", qid=qid_snapshot)
-            execute("INSERT INTO history_apps(quarter_id,id,name) SELECT :qid,id,name FROM apps", qid=qid_snapshot)
-
-            execute(f"""
+            tx.execute("DELETE FROM history_resources WHERE quarter_id = :qid", qid=qid_snapshot)
+            tx.execute("DELETE FROM history_tribes WHERE quarter_id = :qid", qid=qid_snapshot)
+            tx.execute("DELETE FROM history_apps WHERE quarter_id = :qid", qid=qid_snapshot)
+            tx.execute("DELETE FROM history_temp_assignments WHERE quarter_id = :qid", qid=qid_snapshot)
+            tx.execute("DELETE FROM history_master_assignments WHERE quarter_id = :qid", qid=qid_snapshot)
+
+            tx.execute("INSERT INTO history_resources(quarter_id,id,name,role) SELECT :qid,id,name,role FROM resources", qid=qid_snapshot)
+            tx.execute("INSERT INTO history_tribes(quarter_id,id,name) SELECT :qid,id,name FROM tribes", qid=qid_snapshot)
+            tx.execute("INSERT INTO history_apps(quarter_id,id,name) SELECT :qid,id,name FROM apps", qid=qid_snapshot)
+
+            tx.execute("""
               INSERT INTO history_master_assignments(
                 quarter_id, orig_id, tribe_name, app_name, resource_name, role, assignment_type,
                 s1,s2,s3,s4,s5,s6, edited, updated_at
               )
-              SELECT :qid, id, tribe_name, app_name, resource_name, role, {ma_type_expr},
-                     {_s('s1')}::boolean AS s1,
-                     {_s('s2')}::boolean AS s2,
-                     {_s('s3')}::boolean AS s3,
-                     {_s('s4')}::boolean AS s4,
-                     {_s('s5')}::boolean AS s5,
-                     {_s('s6')}::boolean AS s6,
-                     edited, updated_at
+              SELECT :qid, id, tribe_name, app_name, resource_name, role, assignment_type,
+                     s1, s2, s3, s4, s5, s6, edited, updated_at
               FROM master_assignments
             """, qid=qid_snapshot)
 
-            execute("""
+            tx.execute("""
               INSERT INTO history_temp_assignments(
                 quarter_id, orig_id, tribe_name, app_name, resource_id, resource_name, role, assign_type, reserved_sprints
               )
@@ -664,10 +496,8 @@ def _perform_upload(df: pd.DataFrame, target: str, new_qname: str|None, progress
               LEFT JOIN apps   ap ON ap.id = ta.app_id
             """, qid=qid_snapshot)
 
-        if progress: progress(20)
-
         # --- RESET working sets (FK-safe) ---
-        execute("""
+        tx.execute("""
         DELETE FROM master_assignments;
         DELETE FROM temp_assignments;
         DELETE FROM resources;
@@ -676,7 +506,7 @@ def _perform_upload(df: pd.DataFrame, target: str, new_qname: str|None, progress
         """)
 
         # Reset sequences like RESTART IDENTITY
-        execute("""
+        tx.execute("""
         DO $$
         BEGIN
         IF EXISTS (SELECT 1 FROM pg_class WHERE relname = 'master_assignments') THEN
@@ -696,89 +526,30 @@ def _perform_upload(df: pd.DataFrame, target: str, new_qname: str|None, progress
         END IF;
         END $$;
         """)
+        if progress: progress(75)
 
-        # --- RESEED dimensions ---
-        tribes_u = sorted(df["tribe"].unique())
-        apps_u   = sorted(df["app"].unique())
-        res_u    = df[["resource","role"]].drop_duplicates(subset=["resource"])
-
-        total_ops = len(tribes_u) + len(apps_u) + len(res_u) + rows_total
-        done_ops  = 0
-        def _bump():
-            nonlocal done_ops
-            done_ops += 1
-            pct = 20 + int((done_ops / max(1,total_ops)) * 75)  # up to 95%
-            if progress: progress(min(95, pct))
-
-        for t in tribes_u:
-            execute("INSERT INTO tribes(name) VALUES (:n) ON CONFLICT (name) DO NOTHING", n=t)
-            _bump()
-        for a in apps_u:
-            execute("INSERT INTO apps(name) VALUES (:n) ON CONFLICT (name) DO NOTHING", n=a)
-            _bump()
-        for r_name, r_role in res_u.itertuples(index=False):
-            execute("""
-                INSERT INTO resources(name, role) VALUES (:n,:role)
-                ON CONFLICT (name) DO UPDATE SET role = EXCLUDED.role
-            """, n=r_name, role=r_role)
-            _bump()
-
-        # --- Insert temp_assignments ---
-        ta_has_tribe_id   = _has_col("temp_assignments", "tribe_id")
-        ta_has_app_id     = _has_col("temp_assignments", "app_id")
-        ta_has_tribe_name = _has_col("temp_assignments", "tribe_name")
-        ta_has_app_name   = _has_col("temp_assignments", "app_name")
-        ta_has_res_id     = _has_col("temp_assignments", "resource_id")
-
-        if not ta_has_tribe_id and not ta_has_tribe_name:
-            execute("ALTER TABLE temp_assignments ADD COLUMN tribe_name TEXT")
-            ta_has_tribe_name = True
-        if not ta_has_app_id and not ta_has_app_name:
-            execute("ALTER TABLE temp_assignments ADD COLUMN app_name TEXT")
-            ta_has_app_name = True
-        if not ta_has_res_id:
-            execute("ALTER TABLE temp_assignments ADD COLUMN resource_id INT")
-            ta_has_res_id = True
-
-        for row in df.itertuples(index=False):
-            params = {
-                "qid": qid_target,
-                "tribe": row.tribe, "app": row.app,
-                "rname": row.resource, "role": row.role,
-                "atype": row.assign_type,
-                "rs": int(row.reserved_sprints)
-            }
-            cols = ["quarter_id"]
-            vals = [":qid"]
-            if ta_has_tribe_id:
-                cols += ["tribe_id"]; vals += ["(SELECT id FROM tribes WHERE name=:tribe)"]
-            if ta_has_app_id:
-                cols += ["app_id"]; vals += ["(SELECT id FROM apps WHERE name=:app)"]
-            if ta_has_tribe_name:
-                cols += ["tribe_name"]; vals += [":tribe"]
-            if ta_has_app_name:
-                cols += ["app_name"]; vals += [":app"]
-            if ta_has_res_id:
-                cols += ["resource_id"]; vals += ["(SELECT id FROM resources WHERE name=:rname)"]
-            cols += ["resource_name", "role", "assign_type", "reserved_sprints"]
-            vals += [":rname", ":role", ":atype", ":rs"]
-            sql = f"INSERT INTO temp_assignments({', '.join(cols)}) VALUES ({', '.join(vals)})"
-            execute(sql, **params)
-            _bump()
-
-        execute("COMMIT")
-
-        # If user asked to create a new quarter, make it current after upload finishes
-        if target == "new":
-            execute("UPDATE quarters SET is_current = FALSE")
-            execute("UPDATE quarters SET is_current = TRUE WHERE id = :id", id=qid_target)
+        # --- RESEED dimensions + temp_assignments (bulk, set-based) ---
+        cols = ["quarter_id", "tribe_id", "app_id", "tribe_name", "app_name", "resource_id",
+                "resource_name", "role", "assign_type", "reserved_sprints"]
+        vals = [":qid", "t.id", "a.id", "s.tribe", "s.app", "r.id",
+                "s.resource", "s.role", "s.assign_type", "s.reserved_sprints"]
 
-        if progress: progress(100)
-        return rows_total, qid_target
+        _reseed(tx, qid_target, cols, vals)
+        if progress: progress(95)
 
-    except Exception:
-        execute("ROLLBACK")
-        raise
+        # If user asked to create a new quarter, make it current in the same commit
+        if target == "new":
+            tx.execute("UPDATE quarters SET is_current = FALSE")
+            tx.execute("UPDATE quarters SET is_current = TRUE WHERE id = :id", id=qid_target)
+        quarters.notify(tx, "upload")
+
+    # master/temp rows were wiped and reseeded for every quarter
+    quarters.invalidate()
+    occupancy.invalidate()
+    changes.bump()
+    events.publish("reload", None, reason="upload")
+    if progress: progress(100)
+    return rows_total, qid_target
 
 
 # =========================
@@ -791,23 +562,19 @@ def upload_excel():
     if not file:
         return jsonify({"error": "Missing file"}), 400
 
+    target, new_qname = _upload_form()
     try:
-        df = pd.read_excel(file)
+        job_id = _submit_upload(_save_upload(file), target, new_qname)
+    except (jobs.TargetBusy, jobs.QueueFull) as e:
+        return _queue_error(e)
     except Exception as e:
-        return jsonify({"error": f"Failed to read Excel: {e}"}), 400
+        return jsonify({"error": f"Could not register upload job: {e}"}), 500
 
-    target = (request.form.get("target")
-              or (request.json.get("target") if request.is_json else "")
-              or "current").strip().lower()
-    new_qname = (request.form.get("new_quarter_name")
-                 or (request.json.get("new_quarter_name") if request.is_json else "")
-                 or "").strip()
-
-    try:
-        rows, qid = _perform_upload(df, target, new_qname, progress=None)
-        return jsonify({"ok": True, "rows": int(rows), "target_quarter_id": int(qid)})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 400
+    # same contract as before: block until done, but run on the bounded upload workers
+    j = jobs.uploads.wait(job_id) or {}
+    if j.get("status") != "done":
+        return jsonify({"error": j.get("error") or "Upload failed", "job_id": job_id}), 400
+    return jsonify({"ok": True, "rows": int(j["rows"]), "target_quarter_id": int(j["target_quarter_id"])})
 
 
 # =========================
@@ -817,51 +584,40 @@ def upload_excel():
 @admin_required
 def upload_excel_progress():
     """
-    Same form-data as /upload. Returns {"job_id": "..."} immediately and processes in background.
-    Client should poll /admin/upload_progress/<job_id>.
+    Same form-data as /upload. Returns {"job_id": "..."} immediately and queues the upload
+    on jobs.uploads (UPLOAD_WORKERS threads). Client should poll /admin/upload_progress/<job_id>;
+    while queued it reports queue_position. 409 if this quarter already has an upload
+    queued or running, 429 if the queue is full.
     """
     f = request.files.get("file")
     if not f:
         return jsonify({"error": "Missing file"}), 400
 
-    target = (request.form.get("target")
-              or (request.json.get("target") if request.is_json else "")
-              or "current").strip().lower()
-    new_qname = (request.form.get("new_quarter_name")
-                 or (request.json.get("new_quarter_name") if request.is_json else "")
-                 or "").strip()
+    target, new_qname = _upload_form()
 
     try:
-        df = pd.read_excel(f)
+        job_id = _submit_upload(_save_upload(f), target, new_qname)
+    except (jobs.TargetBusy, jobs.QueueFull) as e:
+        return _queue_error(e)
     except Exception as e:
-        return jsonify({"error": f"Failed to read Excel: {e}"}), 400
-
-    job_id = secrets.token_hex(8)
-    _PROGRESS[job_id] = {"percent": 1, "status": "running"}
+        return jsonify({"error": f"Could not register upload job: {e}"}), 500
+    return jsonify({"job_id": job_id}), 202
 
-    def _worker():
-        try:
-            def cb(p):
-                _progress_update(job_id, percent=p, status="running")
-            rows, qid = _perform_upload(df, target, new_qname, progress=cb)
-            _progress_update(job_id, percent=100, status="done", rows=int(rows), target_quarter_id=int(qid))
-        except Exception as e:
-            _progress_update(job_id, percent=100, status="error", error=str(e))
 
-    threading.Thread(target=_worker, daemon=True).start()
-    return jsonify({"job_id": job_id}), 202
+@bp.post("/upload_cancel/<job_id>")
+@admin_required
+def upload_cancel(job_id):
+    """Drop a queued upload, or stop a running one at its next checkpoint (rolled back)."""
+    status = jobs.uploads.cancel(job_id)
+    if status is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify({"job_id": job_id, "status": status})
 
 
 @bp.get("/upload_progress/<job_id>")
 @admin_required
 def upload_progress(job_id):
-    p = _PROGRESS.get(job_id)
+    p = jobs.get(job_id)
     if not p:
         return jsonify({"percent": 0, "status": "unknown"}), 404
-    return jsonify({
-        "percent": p.get("percent", 0),
-        "status": p.get("status", "running"),
-        "rows": p.get("rows"),
-        "target_quarter_id": p.get("target_quarter_id"),
-        "error": p.get("error")
-    })
+    return jsonify(p)
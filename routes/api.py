@@ -1,78 +1,20 @@
 # routes/api.py
-from flask import Blueprint, request, jsonify, send_file
-from io import BytesIO
+from flask import Blueprint, request, jsonify, send_file, Response, stream_with_context
+from io import StringIO
 from datetime import datetime
-import pandas as pd
-from sqlalchemy import text
-from db import fetch_one, fetch_all, execute, engine, get_current_qid
+import os, csv, tempfile
+import xlsxwriter
+from db import fetch_one, fetch_all, fetch_iter, get_current_qid, transaction, retry_on_conflict
+import occupancy
+import changes
+import events
+import paging
+from search import text_search
 
 bp = Blueprint("api", __name__)
 
 # ---------- helpers ----------
 
-def _has_table_api(table: str) -> bool:
-    return bool(fetch_one("""
-        SELECT 1 FROM information_schema.tables
-        WHERE table_schema='public' AND table_name=:t
-        LIMIT 1
-    """, t=table))
-
-def _has_col_api(table: str, col: str) -> bool:
-    return bool(fetch_one("""
-        SELECT 1 FROM information_schema.columns
-        WHERE table_name=:t AND column_name=:c
-        LIMIT 1
-    """, t=table, c=col))
-
-def _ensure_master_assignments_shape_api():
-    """Minimal shape needed by /api/assignments."""
-    if not _has_table_api("master_assignments"):
-        execute("""
-            CREATE TABLE IF NOT EXISTS master_assignments (
-              id SERIAL PRIMARY KEY,
-              quarter_id INT NOT NULL REFERENCES quarters(id) ON DELETE CASCADE,
-              tribe_name TEXT,
-              app_name TEXT,
-              resource_name TEXT,
-              role TEXT,
-              assignment_type TEXT,
-              s1 BOOLEAN NOT NULL DEFAULT FALSE,
-              s2 BOOLEAN NOT NULL DEFAULT FALSE,
-              s3 BOOLEAN NOT NULL DEFAULT FALSE,
-              s4 BOOLEAN NOT NULL DEFAULT FALSE,
-              s5 BOOLEAN NOT NULL DEFAULT FALSE,
-              s6 BOOLEAN NOT NULL DEFAULT FALSE,
-              edited BOOLEAN NOT NULL DEFAULT FALSE,
-              updated_at TIMESTAMP NOT NULL DEFAULT NOW()
-            )
-        """)
-    else:
-        for need_col, ddl in [
-            ("quarter_id",      "INT REFERENCES quarters(id) ON DELETE CASCADE"),
-            ("tribe_name",      "TEXT"),
-            ("app_name",        "TEXT"),
-            ("resource_name",   "TEXT"),
-            ("role",            "TEXT"),
-            ("assignment_type", "TEXT"),
-            ("s1",              "BOOLEAN NOT NULL DEFAULT FALSE"),
-            ("s2",              "BOOLEAN NOT NULL DEFAULT FALSE"),
-            ("s3",              "BOOLEAN NOT NULL DEFAULT FALSE"),
-            ("s4",              "BOOLEAN NOT NULL DEFAULT FALSE"),
-            ("s5",              "BOOLEAN NOT NULL DEFAULT FALSE"),
-            ("s6",              "BOOLEAN NOT NULL DEFAULT FALSE"),
-            ("edited",          "BOOLEAN NOT NULL DEFAULT FALSE"),
-            ("updated_at",      "TIMESTAMP NOT NULL DEFAULT NOW()"),
-        ]:
-            if not _has_col_api("master_assignments", need_col):
-                execute(f"ALTER TABLE master_assignments ADD COLUMN {need_col} {ddl}")
-
-    # Cheap index if missing
-    try:
-        execute("CREATE INDEX IF NOT EXISTS idx_ma_qid_api ON master_assignments(quarter_id)")
-    except Exception:
-        pass
-      
-      
 def _row_to_dict(r):
     m = getattr(r, "_mapping", None)
     return dict(m) if m is not None else dict(r)
@@ -97,6 +39,7 @@ def ilike_clause(col, val):
 
 # ---------- catalog endpoints ----------
 @bp.get("/tribes")
+@changes.conditional
 def list_tribes():
     qid = current_quarter_id()
     rows = fetch_all("""
@@ -109,6 +52,7 @@ def list_tribes():
     return jsonify(_dicts(rows))
 
 @bp.get("/resources")
+@changes.conditional
 def list_resources():
     """Optionally filter by tribe_id or tribe_name (one or the other)."""
     qid = current_quarter_id()
@@ -192,55 +136,25 @@ def availability():
     if not tribe_name:
         return jsonify({"error": "tribe is required"}), 400
 
-    # ---- Resolve a single temp row for (tribe, resource) in this quarter ----
-    temp = None
-    if rid:
-        temp = fetch_one("""
-          SELECT
-            r.id                 AS resource_id,
-            r.name               AS resource_name,
-            COALESCE(t.name, ta.tribe_name) AS tribe_name,
-            ta.assign_type       AS assign_type,
-            ta.reserved_sprints  AS reserved_sprints
-          FROM temp_assignments ta
-          JOIN resources r ON r.id = ta.resource_id
-          LEFT JOIN tribes  t ON t.id = ta.tribe_id
-          WHERE ta.quarter_id = :qid
-            AND r.id = :rid
-            AND (t.name = :tname OR ta.tribe_name = :tname)
-          LIMIT 1
-        """, qid=qid, rid=rid, tname=tribe_name)
-    elif resource_nm:
-        # map (resource_name [+ role]) -> resource id
-        res = (fetch_one("""
-                  SELECT id, name FROM resources
-                  WHERE name = :rname AND role = :role
-                  LIMIT 1
-               """, rname=resource_nm, role=role) if role else
-               fetch_one("""SELECT id, name FROM resources WHERE name = :rname LIMIT 1""",
-                         rname=resource_nm))
-        if not res:
-            return jsonify({"error": "resource not found"}), 404
-        rid = int(res["id"])
-
-        temp = fetch_one("""
-          SELECT
-            r.id                 AS resource_id,
-            r.name               AS resource_name,
-            COALESCE(t.name, ta.tribe_name) AS tribe_name,
-            ta.assign_type       AS assign_type,
-            ta.reserved_sprints  AS reserved_sprints
-          FROM temp_assignments ta
-          JOIN resources r ON r.id = ta.resource_id
-          LEFT JOIN tribes  t ON t.id = ta.tribe_id
-          WHERE ta.quarter_id = :qid
-            AND r.id = :rid
-            AND (t.name = :tname OR ta.tribe_name = :tname)
-          LIMIT 1
-        """, qid=qid, rid=rid, tname=tribe_name)
-    else:
+    # ---- Resolve a single temp row for (tribe, resource) in this quarter (in-memory index) ----
+    if not rid and resource_nm:
+        # map (resource_name [+ role]) -> resource id; only unreserved names fall through to the DB
+        rid = occupancy.resource_id(qid, resource_nm, role or None)
+        if not rid:
+            res = (fetch_one("""
+                      SELECT id, name FROM resources
+                      WHERE name = :rname AND role = :role
+                      LIMIT 1
+                   """, rname=resource_nm, role=role) if role else
+                   fetch_one("""SELECT id, name FROM resources WHERE name = :rname LIMIT 1""",
+                             rname=resource_nm))
+            if not res:
+                return jsonify({"error": "resource not found"}), 404
+            rid = int(res["id"])
+    elif not rid:
         return jsonify({"error": "resource_id or resource_name is required"}), 400
 
+    temp = occupancy.reservation(qid, tribe_name, rid)
     if not temp:
         return jsonify({"error": "This resource is not reserved for the selected tribe."}), 400
 
@@ -250,47 +164,16 @@ def availability():
     # Cap per this tribe comes directly from the TEMP row
     max_for_tribe = int((temp.get("reserved_sprints") or 0))
 
-    # ---- Blocked sprints by ANY tribe on this resource (booleans) ----
-    agg = fetch_one("""
-      SELECT
-        COALESCE(MAX(CASE WHEN s1 IS TRUE THEN 1 ELSE 0 END),0) AS s1,
-        COALESCE(MAX(CASE WHEN s2 IS TRUE THEN 1 ELSE 0 END),0) AS s2,
-        COALESCE(MAX(CASE WHEN s3 IS TRUE THEN 1 ELSE 0 END),0) AS s3,
-        COALESCE(MAX(CASE WHEN s4 IS TRUE THEN 1 ELSE 0 END),0) AS s4,
-        COALESCE(MAX(CASE WHEN s5 IS TRUE THEN 1 ELSE 0 END),0) AS s5,
-        COALESCE(MAX(CASE WHEN s6 IS TRUE THEN 1 ELSE 0 END),0) AS s6
-      FROM master_assignments
-      WHERE quarter_id = :qid AND resource_name = :rname
-    """, qid=qid, rname=resource_name) or {c: 0 for c in sprint_cols()}
-    blocked = [int(bool(agg[c])) for c in sprint_cols()]
-
-        # ---- Sprints already held by THIS tribe (bitset) ----
-    mine_row = fetch_one("""
-      SELECT
-        COALESCE(MAX(CASE WHEN s1 IS TRUE THEN 1 ELSE 0 END),0) AS s1,
-        COALESCE(MAX(CASE WHEN s2 IS TRUE THEN 1 ELSE 0 END),0) AS s2,
-        COALESCE(MAX(CASE WHEN s3 IS TRUE THEN 1 ELSE 0 END),0) AS s3,
-        COALESCE(MAX(CASE WHEN s4 IS TRUE THEN 1 ELSE 0 END),0) AS s4,
-        COALESCE(MAX(CASE WHEN s5 IS TRUE THEN 1 ELSE 0 END),0) AS s5,
-        COALESCE(MAX(CASE WHEN s6 IS TRUE THEN 1 ELSE 0 END),0) AS s6
-      FROM master_assignments
-      WHERE quarter_id = :qid AND resource_name = :rname AND tribe_name = :tname
-    """, qid=qid, rname=resource_name, tname=tribe_name) or {c:0 for c in sprint_cols()}
-    mine = [int(bool(mine_row[c])) for c in sprint_cols()]
-
-    # ---- Already booked by THIS tribe on this resource ----
-    taken = fetch_one("""
-      SELECT COALESCE(
-        SUM( (CASE WHEN s1 THEN 1 ELSE 0 END) +
-             (CASE WHEN s2 THEN 1 ELSE 0 END) +
-             (CASE WHEN s3 THEN 1 ELSE 0 END) +
-             (CASE WHEN s4 THEN 1 ELSE 0 END) +
-             (CASE WHEN s5 THEN 1 ELSE 0 END) +
-             (CASE WHEN s6 THEN 1 ELSE 0 END) ), 0) AS cnt
-      FROM master_assignments
-      WHERE quarter_id = :qid AND resource_name = :rname AND tribe_name = :tname
-    """, qid=qid, rname=resource_name, tname=tribe_name)
-    booked_by_tribe = int((taken or {}).get("cnt", 0))
+    # ---- Occupancy of this resource: blocked by ANY tribe, held by THIS tribe ----
+    masks = occupancy.tribe_masks(qid, resource_id)
+    blocked_mask = 0
+    for m in masks.values():
+        blocked_mask |= m
+    mine_mask = masks.get(tribe_name, 0)
+
+    blocked = occupancy.to_flags(blocked_mask)
+    mine    = occupancy.to_flags(mine_mask)
+    booked_by_tribe = occupancy.popcount(mine_mask)
     remaining = max(0, max_for_tribe - booked_by_tribe)
 
     # ---- Back-compat keys (some UI code expects these names) ----
@@ -316,9 +199,21 @@ def availability():
 
 # ---------- assignments list ----------
 @bp.get("/assignments")
+@changes.conditional
 def list_assignments():
+    """
+    One page, newest first: ?limit= (default paging.DEFAULT_LIMIT) and ?cursor= from the
+    previous page's X-Next-Cursor header (absent on the last page). Body stays a JSON array.
+    ?q= searches tribe/app/resource/role at once and returns the best `limit` matches
+    (ranked, not paged).
+    """
     qid = current_quarter_id()
-    #_ensure_master_assignments_shape_api()
+    limit = paging.page_limit(request.args.get("limit"))
+    try:
+        after = paging.decode_cursor(request.args.get("cursor"), 2)
+    except paging.BadCursor as e:
+        return jsonify({"error": str(e)}), 400
+
     base = """
       SELECT id, tribe_name, app_name, resource_name, role, assignment_type,
              s1,s2,s3,s4,s5,s6, edited, updated_at
@@ -326,7 +221,7 @@ def list_assignments():
       WHERE quarter_id = :qid
     """
     q = base
-    params = {"qid": qid}
+    params = {"qid": qid, "lim": limit + 1}
 
     for key, col in [
         ("tribe","tribe_name"),("app","app_name"),
@@ -337,12 +232,28 @@ def list_assignments():
         q += clause
         params.update(extra)
 
-    q += " ORDER BY updated_at DESC NULLS LAST, id DESC"
-    rows = fetch_all(q, **params)
-    return jsonify(_dicts(rows))
+    s_where, s_rank, s_params = text_search(
+        ["tribe_name", "app_name", "resource_name", "role"], request.args.get("q"))
+    if s_where:
+        q += s_where + f" ORDER BY {s_rank} DESC, updated_at DESC, id DESC LIMIT :lim"
+        params.update(s_params)
+        params["lim"] = limit
+        return jsonify(_dicts(fetch_all(q, **params)))
+
+    if after:
+        q += " AND (updated_at, id) < (CAST(:c_ts AS timestamp), :c_id)"
+        params.update(c_ts=after[0], c_id=int(after[1]))
+
+    q += " ORDER BY updated_at DESC, id DESC LIMIT :lim"
+    rows, nxt = paging.split_page(fetch_all(q, **params), limit, lambda r: [r["updated_at"], r["id"]])
+    resp = jsonify(_dicts(rows))
+    if nxt:
+        resp.headers["X-Next-Cursor"] = nxt
+    return resp
 
 # ---------- edit (PATCH) ----------
 @bp.patch("/assignments/<int:aid>")
+@retry_on_conflict
 def patch_assignment(aid):
     """
     Partial update for s1..s6 in edit mode.
@@ -354,100 +265,164 @@ def patch_assignment(aid):
     qid = current_quarter_id()
     data = request.get_json(force=True) or {}
 
-    # Load the row we are editing
-    row = fetch_one("""
-      SELECT id, tribe_name, resource_name, assignment_type AS assign_type,
-             s1,s2,s3,s4,s5,s6
-      FROM master_assignments
-      WHERE id = :id AND quarter_id = :qid
-    """, id=aid, qid=qid)
-    if not row:
-        return jsonify({"error":"not found"}), 404
-
-    tribe = row["tribe_name"]
-    rname = row["resource_name"]
-    asg_type = (row["assign_type"] or "Shared").strip() or "Shared"
-
-    # normalize incoming booleans (final state)
-    future = {}
-    for i in range(1,7):
-        k = f"s{i}"
-        if k in data:
-            v = data[k]
-            if isinstance(v, bool): future[k] = v
-            elif isinstance(v, (int,)): future[k] = bool(v)
-            elif isinstance(v, str):
-                vv = v.strip().lower()
-                future[k] = vv in ("1","true","t","yes","y")
-            else:
-                future[k] = False
-        else:
-            # keep current value if not provided
-            future[k] = bool(row[k])
+    with transaction() as tx:
+        # Serialize with other writers on this resource before reading its occupancy
+        me = tx.fetch_one("""
+          SELECT resource_id FROM master_assignments WHERE id = :id AND quarter_id = :qid
+        """, id=aid, qid=qid)
+        if not me:
+            return jsonify({"error":"not found"}), 404
+        tx.lock_resources(qid, [me["resource_id"]])
+
+        # One round trip: the row we are editing, what OTHER tribes hold on this
+        # resource, and this tribe's cap from temp_assignments.reserved_sprints
+        # (all joined on resource_id / tribe_id)
+        row = tx.fetch_one("""
+          WITH me AS (
+            SELECT id, tribe_id, tribe_name, resource_id, resource_name,
+                   assignment_type AS assign_type, sprint_mask
+            FROM master_assignments
+            WHERE id = :id AND quarter_id = :qid
+          ),
+          others AS (
+            SELECT COALESCE(bit_or(ma.sprint_mask), 0) AS blocked_mask
+            FROM master_assignments ma
+            JOIN me ON ma.resource_id = me.resource_id AND ma.tribe_id IS DISTINCT FROM me.tribe_id
+            WHERE ma.quarter_id = :qid
+          ),
+          cap AS (
+            SELECT ta.reserved_sprints
+            FROM temp_assignments ta
+            JOIN me ON ta.resource_id = me.resource_id AND ta.tribe_id = me.tribe_id
+            WHERE ta.quarter_id = :qid
+            ORDER BY ta.id DESC
+            LIMIT 1
+          )
+          SELECT me.*, others.blocked_mask,
+                 (SELECT reserved_sprints FROM cap) AS reserved_sprints
+          FROM me CROSS JOIN others
+        """, id=aid, qid=qid)
+        if not row:
+            return jsonify({"error":"not found"}), 404
+
+        tribe = row["tribe_name"]
+        rid   = row["resource_id"]
+        asg_type = (row["assign_type"] or "Shared").strip() or "Shared"
+
+        # normalize incoming booleans into the final mask (unsent sprints keep their value)
+        current = int(row["sprint_mask"] or 0)
+        future = current
+        for i, k in enumerate(occupancy.SPRINTS):
+            if k in data:
+                v = data[k]
+                if isinstance(v, bool): on = v
+                elif isinstance(v, (int,)): on = bool(v)
+                elif isinstance(v, str):
+                    vv = v.strip().lower()
+                    on = vv in ("1","true","t","yes","y")
+                else:
+                    on = False
+                future = (future | (1 << i)) if on else (future & ~(1 << i))
         # --- Early exit: if no sprint values changed, skip update so 'edited' stays as-is ---
-    if all(bool(row[f"s{i}"]) == future[f"s{i}"] for i in range(1,7)):
-        return jsonify({"ok": True, "unchanged": True})
-
-
-    # 1) Blocked by OTHER tribes on this resource (boolean-safe)
-    blocked = fetch_one("""
-      SELECT
-        COALESCE(MAX(CASE WHEN s1 IS TRUE THEN 1 ELSE 0 END),0) AS s1,
-        COALESCE(MAX(CASE WHEN s2 IS TRUE THEN 1 ELSE 0 END),0) AS s2,
-        COALESCE(MAX(CASE WHEN s3 IS TRUE THEN 1 ELSE 0 END),0) AS s3,
-        COALESCE(MAX(CASE WHEN s4 IS TRUE THEN 1 ELSE 0 END),0) AS s4,
-        COALESCE(MAX(CASE WHEN s5 IS TRUE THEN 1 ELSE 0 END),0) AS s5,
-        COALESCE(MAX(CASE WHEN s6 IS TRUE THEN 1 ELSE 0 END),0) AS s6
-      FROM master_assignments
-      WHERE quarter_id = :qid
-        AND resource_name = :rname
-        AND tribe_name <> :tname
-    """, qid=qid, rname=rname, tname=tribe) or {f"s{i}": 0 for i in range(1,7)}
-
-    # You can turn OFF a sprint even if others booked it; but you cannot turn ON if blocked by another tribe.
-    bad = [i for i in range(1,7)
-           if future[f"s{i}"] and int(blocked[f"s{i}"]) == 1]
-    if bad:
-        return jsonify({"error": f"Sprint(s) {', '.join(map(str, bad))} already booked by another tribe."}), 409
-
-    # 2) Cap per tribe for this (tribe, resource), from temp_assignments.reserved_sprints
-    #    (works whether temp stores tribe_id or tribe_name)
-    rs = fetch_one("""
-      SELECT ta.reserved_sprints
-      FROM temp_assignments ta
-      JOIN resources r ON r.id = ta.resource_id
-      LEFT JOIN tribes   t ON t.id = ta.tribe_id
-      WHERE ta.quarter_id = :qid
-        AND r.name = :rname
-        AND (t.name = :tname OR ta.tribe_name = :tname)
-      ORDER BY ta.id DESC
-      LIMIT 1
-    """, qid=qid, rname=rname, tname=tribe)
-    cap_per_tribe = int((rs or {}).get("reserved_sprints") or 0)
-    # Dedicated safety (in case temp said 0 but assignment is Dedicated)
-    if asg_type == "Dedicated":
-        cap_per_tribe = max(cap_per_tribe, 6)
-
-    # Count how many sprints will be ON after this edit
-    future_on = sum(1 for i in range(1,7) if future[f"s{i}"])
-    if future_on > cap_per_tribe:
-        return jsonify({"error": f"you’ve exceeded max allowed number of sprints ({cap_per_tribe})."}), 400
-
-    # 3) Apply the update
-    cols = [f"{k} = :{k}" for k in [f"s{i}" for i in range(1,7)]]
-    params = {"id": aid, "qid": qid, **future}
-    query = "UPDATE master_assignments SET " + ",".join(cols) + \
-            ", edited = TRUE, updated_at = NOW() WHERE id = :id AND quarter_id = :qid"
-    execute(query, **params)
+        if future == current:
+            return jsonify({"ok": True, "unchanged": True})
+
+
+        # 1) Blocked by OTHER tribes on this resource
+        blocked = int(row["blocked_mask"] or 0)
+
+        # You can turn OFF a sprint even if others booked it; but you cannot turn ON if blocked by another tribe.
+        bad = occupancy.sprint_numbers(future & blocked)
+        if bad:
+            return jsonify({"error": f"Sprint(s) {', '.join(map(str, bad))} already booked by another tribe."}), 409
+
+        # 2) Cap per tribe for this (tribe, resource)
+        cap_per_tribe = int(row["reserved_sprints"] or 0)
+        # Dedicated safety (in case temp said 0 but assignment is Dedicated)
+        if asg_type == "Dedicated":
+            cap_per_tribe = max(cap_per_tribe, 6)
+
+        # Count how many sprints will be ON after this edit
+        if occupancy.popcount(future) > cap_per_tribe:
+            return jsonify({"error": f"you’ve exceeded max allowed number of sprints ({cap_per_tribe})."}), 400
+
+        # 3) Apply the update (sprint_mask follows s1..s6 as a generated column)
+        tx.execute("""
+          UPDATE master_assignments
+          SET s1=:s1, s2=:s2, s3=:s3, s4=:s4, s5=:s5, s6=:s6,
+              edited = TRUE, updated_at = NOW()
+          WHERE id = :id AND quarter_id = :qid
+        """, id=aid, qid=qid, **occupancy.to_columns(future))
+        ev = {"id": aid, "tribe_name": tribe, "resource_id": rid, "sprint_mask": future, "edited": True}
+        changes.notify(tx, qid, [ev])
+    changes.bump(qid)
+    occupancy.refresh(qid, rid, tribe)
+    events.publish("assignment", qid, **ev)
     return jsonify({"ok": True})
 
 # ---------- export ----------
+EXPORT_COLS = ["tribe_name", "app_name", "resource_name", "role", "assignment_type",
+               "s1", "s2", "s3", "s4", "s5", "s6", "edited", "updated_at"]
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "2000"))
+
+def _stream_rows(sql, params, batch_size=EXPORT_BATCH_ROWS):
+    """Yield export rows as value lists (EXPORT_COLS order), fetched `batch_size` at a time."""
+    for batch in fetch_iter(sql, batch_size=batch_size, **params):
+        for r in batch:
+            yield [r[c] for c in EXPORT_COLS]
+
+def _csv_chunks(first, rows, batch_size=EXPORT_BATCH_ROWS):
+    buf = StringIO()
+    w = csv.writer(buf)
+    buf.write("\ufeff")  # BOM so Excel opens the UTF-8 file with the right encoding
+    w.writerow(EXPORT_COLS)
+    w.writerow(first)
+    n = 1
+    for r in rows:
+        w.writerow(r)
+        n += 1
+        if n % batch_size == 0:
+            yield buf.getvalue()
+            buf.seek(0); buf.truncate()
+    yield buf.getvalue()
+
+def _xlsx_file(first, rows) -> str:
+    """Write rows to a temp .xlsx with constant_memory (one row in RAM at a time); returns the path."""
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    try:
+        os.close(fd)
+        wb = xlsxwriter.Workbook(path, {
+            "constant_memory": True,
+            "default_date_format": "yyyy-mm-dd hh:mm:ss",
+            "remove_timezone": True,
+        })
+        try:
+            ws = wb.add_worksheet("assignments")
+            ws.write_row(0, 0, EXPORT_COLS)
+            ws.write_row(1, 0, first)
+            for i, r in enumerate(rows, start=2):
+                ws.write_row(i, 0, r)
+        finally:
+            wb.close()
+    except Exception:
+        os.unlink(path)  # half-written export: don't leave it in the temp dir
+        raise
+    return path
+
 @bp.get("/export")
 def export_assignments():
+    """
+    ?format=xlsx (default) | csv. Rows come through a server-side cursor either way:
+    CSV is streamed to the client chunk by chunk; XLSX is built with XlsxWriter's
+    constant_memory mode in a temp file, then sent from disk.
+    """
     qid = current_quarter_id()
-    base = """
-      SELECT tribe_name, app_name, resource_name, role, assignment_type,
-             s1,s2,s3,s4,s5,s6, edited, updated_at
+    fmt = (request.args.get("format") or "xlsx").strip().lower()
+    if fmt not in ("xlsx", "csv"):
+        return jsonify({"error": "format must be xlsx or csv"}), 400
+
+    base = f"""
+      SELECT {', '.join(EXPORT_COLS)}
       FROM master_assignments
       WHERE quarter_id = :qid
     """
@@ -461,23 +436,48 @@ def export_assignments():
         base += clause
         params.update(extra)
 
-    rows = fetch_all(base + " ORDER BY tribe_name, resource_name, role", **params)
-    if not rows:
+    rows = _stream_rows(base + " ORDER BY tribe_name, resource_name, role", params)
+    first = next(rows, None)
+    if first is None:
         return jsonify({"error":"nothing to export"}), 400
 
-    df = pd.DataFrame(rows)
-    buf = BytesIO()
-    with pd.ExcelWriter(buf, engine="openpyxl") as xw:
-        df.to_excel(xw, sheet_name="assignments", index=False)
-    buf.seek(0)
-    fname = f"assignments_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    bio = BytesIO(buf.read())
-    bio.seek(0)
-    return send_file(bio, as_attachment=True, download_name=fname,
-                     mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if fmt == "csv":
+        return Response(
+            stream_with_context(_csv_chunks(first, rows)),
+            mimetype="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="assignments_{stamp}.csv"'},
+        )
+
+    try:
+        path = _xlsx_file(first, rows)
+    finally:
+        rows.close()
+    try:
+        resp = send_file(path, as_attachment=True, download_name=f"assignments_{stamp}.xlsx",
+                         mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    except Exception:
+        os.unlink(path)
+        raise
+    resp.call_on_close(lambda: os.path.exists(path) and os.remove(path))
+    return resp
+
+# ---------- live updates ----------
+@bp.get("/events")
+def event_stream():
+    """Server-Sent Events: one `assignment` event per committed booking/edit, `reload` after uploads."""
+    q = events.subscribe()
+    if q is None:
+        # all stream slots taken: the client falls back to polling
+        return jsonify({"error": "too many live-update streams"}), 503
+    resp = Response(stream_with_context(events.stream(q)), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    resp.call_on_close(lambda: events.unsubscribe(q))  # also if the body never started
+    return resp
 
 # ---------- booking (create new assignment row) ----------
 @bp.post("/book")
+@retry_on_conflict
 def create_booking():
     """
     Body:
@@ -499,118 +499,113 @@ def create_booking():
     if not tribe_name or not isinstance(rid, int):
         return jsonify({"error": "tribe (name) and resource_id are required"}), 400
 
-    # Resolve resource_name and assign_type from temp_assignments for this tribe/resource
-    temp = fetch_one("""
-      SELECT r.name AS resource_name,
-       r.role AS resource_role,
-       ta.assign_type,
-       ta.app_name
-      FROM temp_assignments ta
-      JOIN resources r ON r.id = ta.resource_id
-      JOIN tribes    t ON t.id = ta.tribe_id
-      WHERE ta.quarter_id = :qid AND t.name = :tname AND r.id = :rid
-      LIMIT 1
-    """, qid=qid, tname=tribe_name, rid=rid)
-    if not temp:
-        return jsonify({"error":"This resource is not reserved for the selected tribe."}), 400
-
-    resource_name = temp["resource_name"]
-    assign_type   = temp["assign_type"]
-
-    # normalize incoming bools
-    def to_bool(v):
-        if isinstance(v, bool): return v
-        if isinstance(v, (int,)): return bool(v)
-        if isinstance(v, str): 
-            v = v.strip().lower()
-            if v in ("1","true","t","yes","y"): return True
-            if v in ("0","false","f","no","n",""): return False
-        return False
-
-    future = { f"s{i}": to_bool(payload.get(f"s{i}", False)) for i in range(1,7) }
-    requested_cnt = sum(1 for i in range(1,7) if future[f"s{i}"])
-
-    # 1) Blocked sprints by other tribes on same resource (boolean-safe)
-    blocked = fetch_one("""
-      SELECT
-        COALESCE(MAX(CASE WHEN s1 IS TRUE THEN 1 ELSE 0 END),0) AS s1,
-        COALESCE(MAX(CASE WHEN s2 IS TRUE THEN 1 ELSE 0 END),0) AS s2,
-        COALESCE(MAX(CASE WHEN s3 IS TRUE THEN 1 ELSE 0 END),0) AS s3,
-        COALESCE(MAX(CASE WHEN s4 IS TRUE THEN 1 ELSE 0 END),0) AS s4,
-        COALESCE(MAX(CASE WHEN s5 IS TRUE THEN 1 ELSE 0 END),0) AS s5,
-        COALESCE(MAX(CASE WHEN s6 IS TRUE THEN 1 ELSE 0 END),0) AS s6
-      FROM master_assignments
-      WHERE quarter_id = :qid AND resource_name = :rname AND tribe_name <> :tname
-    """, qid=qid, rname=resource_name, tname=tribe_name) or {f"s{i}": 0 for i in range(1,7)}
-
-    bad = [i for i in range(1,7) if future[f"s{i}"] and int(blocked[f"s{i}"]) == 1]
-    if bad:
-        return jsonify({"error": f"Sprint(s) {', '.join(map(str, bad))} already booked by another tribe."}), 409
-
-    # 2) Capacity per tribe on Shared vs Dedicated
-    share = fetch_one("""
-      SELECT COUNT(DISTINCT ta.tribe_id) AS n
-      FROM temp_assignments ta
-      WHERE ta.quarter_id = :qid AND ta.resource_id = :rid
-    """, qid=qid, rid=rid)
-    num_sharing = int(share["n"]) if share and share.get("n") else 1
-    cap_per_tribe = 6 if assign_type == "Dedicated" else max(1, (6 // max(1, num_sharing)))
-
-    # 3) What has THIS tribe already booked on this resource?
-    already = fetch_one("""
-      SELECT COALESCE(SUM(
-        (CASE WHEN s1 IS TRUE THEN 1 ELSE 0 END) +
-        (CASE WHEN s2 IS TRUE THEN 1 ELSE 0 END) +
-        (CASE WHEN s3 IS TRUE THEN 1 ELSE 0 END) +
-        (CASE WHEN s4 IS TRUE THEN 1 ELSE 0 END) +
-        (CASE WHEN s5 IS TRUE THEN 1 ELSE 0 END) +
-        (CASE WHEN s6 IS TRUE THEN 1 ELSE 0 END)
-      ), 0) AS cnt
-      FROM master_assignments
-      WHERE quarter_id = :qid AND resource_name = :rname AND tribe_name = :tname
-    """, qid=qid, rname=resource_name, tname=tribe_name)
-    already_cnt = int((already or {}).get("cnt", 0))
-    if already_cnt + requested_cnt > cap_per_tribe:
-        return jsonify({"error": f"you’ve exceeded max allowed number of sprints ({cap_per_tribe})."}), 400
-
-    # 4) Upsert row for this tribe/resource
-    existing = fetch_one("""
-      SELECT id
-      FROM master_assignments
-      WHERE quarter_id = :qid AND tribe_name = :tname AND resource_name = :rname
-      ORDER BY id ASC
-      LIMIT 1
-    """, qid=qid, tname=tribe_name, rname=resource_name)
-
-    params = {
-        "qid": qid,
-        "tname": tribe_name,
-        "rname": resource_name,
-        "rrole": temp["resource_role"],
-        "aname": temp["app_name"],
-        **future
-    }
-
-    if existing:
-        execute("""
-          UPDATE master_assignments
-          SET s1=:s1, s2=:s2, s3=:s3, s4=:s4, s5=:s5, s6=:s6,
-           updated_at = NOW()
-          WHERE id = :id AND quarter_id = :qid
-        """, **params, id=existing["id"])
-        return jsonify({"ok": True, "id": existing["id"], "mode": "updated"})
-    else:
-        execute("""
-          INSERT INTO master_assignments
-            (quarter_id, tribe_name, app_name, resource_name, role, assignment_type,
-            s1, s2, s3, s4, s5, s6, edited, updated_at)
-          VALUES
-            (:qid, :tname, :aname, :rname, :rrole, :atype,
-            :s1, :s2, :s3, :s4, :s5, :s6, FALSE, NOW())
-        """, **params, atype=assign_type)
-        newrow = fetch_one("""
-          SELECT id FROM master_assignments
-          WHERE quarter_id = :qid AND tribe_name = :tname AND resource_name = :rname
-          ORDER BY id DESC LIMIT 1
-        """, qid=qid, tname=tribe_name, rname=resource_name)
-        return jsonify({"ok": True, "id": int(newrow["id"]), "mode": "created"})
+    with transaction() as tx:
+        # Check + write under the (quarter, resource) lock: two tribes can't both pass
+        tx.lock_resources(qid, [rid])
+
+        # One round trip: the temp reservation for this tribe/resource, what other
+        # tribes hold, what THIS tribe holds, how many tribes share it, and the row to merge into
+        temp = tx.fetch_one(f"""
+          WITH tmp AS (
+            SELECT r.name AS resource_name,
+                   r.role AS resource_role,
+                   t.id   AS tribe_id,
+                   ta.assign_type,
+                   ta.app_name
+            FROM temp_assignments ta
+            JOIN resources r ON r.id = ta.resource_id
+            JOIN tribes    t ON t.id = ta.tribe_id
+            WHERE ta.quarter_id = :qid AND t.name = :tname AND r.id = :rid
+            LIMIT 1
+          ),
+          occ AS (
+            SELECT
+              COALESCE(bit_or(ma.sprint_mask) FILTER (WHERE ma.tribe_id IS DISTINCT FROM tmp.tribe_id), 0) AS blocked_mask,
+              COALESCE({occupancy.bit_count_sql("bit_or(ma.sprint_mask) FILTER (WHERE ma.tribe_id = tmp.tribe_id)")}, 0) AS mine_cnt,
+              MIN(ma.id) FILTER (WHERE ma.tribe_id = tmp.tribe_id)                            AS existing_id
+            FROM master_assignments ma
+            JOIN tmp ON TRUE
+            WHERE ma.quarter_id = :qid AND ma.resource_id = :rid
+          ),
+          share AS (
+            SELECT COUNT(DISTINCT ta.tribe_id) AS n
+            FROM temp_assignments ta
+            WHERE ta.quarter_id = :qid AND ta.resource_id = :rid
+          )
+          SELECT tmp.*, occ.*, share.n AS num_sharing
+          FROM tmp CROSS JOIN occ CROSS JOIN share
+        """, qid=qid, tname=tribe_name, rid=rid)
+        if not temp:
+            return jsonify({"error":"This resource is not reserved for the selected tribe."}), 400
+
+        resource_name = temp["resource_name"]
+        assign_type   = temp["assign_type"]
+
+        # normalize incoming bools
+        def to_bool(v):
+            if isinstance(v, bool): return v
+            if isinstance(v, (int,)): return bool(v)
+            if isinstance(v, str): 
+                v = v.strip().lower()
+                if v in ("1","true","t","yes","y"): return True
+                if v in ("0","false","f","no","n",""): return False
+            return False
+
+        future = occupancy.to_mask({k: to_bool(payload.get(k, False)) for k in occupancy.SPRINTS})
+        requested_cnt = occupancy.popcount(future)
+
+        # 1) Blocked sprints by other tribes on same resource
+        blocked = int(temp["blocked_mask"] or 0)
+        bad = occupancy.sprint_numbers(future & blocked)
+        if bad:
+            return jsonify({"error": f"Sprint(s) {', '.join(map(str, bad))} already booked by another tribe."}), 409
+
+        # 2) Capacity per tribe on Shared vs Dedicated
+        num_sharing = int(temp["num_sharing"] or 0) or 1
+        cap_per_tribe = 6 if assign_type == "Dedicated" else max(1, (6 // max(1, num_sharing)))
+
+        # 3) What has THIS tribe already booked on this resource?
+        already_cnt = int(temp["mine_cnt"] or 0)
+        if already_cnt + requested_cnt > cap_per_tribe:
+            return jsonify({"error": f"you’ve exceeded max allowed number of sprints ({cap_per_tribe})."}), 400
+
+        # 4) Upsert row for this tribe/resource
+        existing_id = temp["existing_id"]
+
+        params = {
+            "qid": qid,
+            "tname": tribe_name,
+            "rname": resource_name,
+            "rrole": temp["resource_role"],
+            "aname": temp["app_name"],
+            "rid": rid,
+            "tid": temp["tribe_id"],
+            **occupancy.to_columns(future)
+        }
+
+        if existing_id:
+            tx.execute("""
+              UPDATE master_assignments
+              SET s1=:s1, s2=:s2, s3=:s3, s4=:s4, s5=:s5, s6=:s6,
+               updated_at = NOW()
+              WHERE id = :id AND quarter_id = :qid
+            """, **params, id=existing_id)
+            result = {"ok": True, "id": existing_id, "mode": "updated"}
+        else:
+            newrow = tx.fetch_one("""
+              INSERT INTO master_assignments
+                (quarter_id, tribe_id, tribe_name, app_name, resource_id, resource_name, role, assignment_type,
+                s1, s2, s3, s4, s5, s6, edited, updated_at)
+              VALUES
+                (:qid, :tid, :tname, :aname, :rid, :rname, :rrole, :atype,
+                :s1, :s2, :s3, :s4, :s5, :s6, FALSE, NOW())
+              RETURNING id
+            """, **params, atype=assign_type)
+            result = {"ok": True, "id": int(newrow["id"]), "mode": "created"}
+        ev = {"id": result["id"], "tribe_name": tribe_name, "resource_id": rid,
+              "sprint_mask": future, "created": result["mode"] == "created"}
+        changes.notify(tx, qid, [ev])
+    changes.bump(qid)
+    occupancy.refresh(qid, rid, tribe_name)
+    events.publish("assignment", qid, **ev)
+    return jsonify(result)
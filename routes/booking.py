@@ -1,6 +1,12 @@
 from flask import Blueprint, request, jsonify, render_template
 import os
-from db import fetch_all, fetch_one, execute, get_current_qid
+from db import fetch_all, fetch_one, get_current_qid, transaction, retry_on_conflict
+import occupancy
+import quarters
+import changes
+import events
+import paging
+from search import text_search
 
 bp = Blueprint("booking", __name__)
 
@@ -31,11 +37,22 @@ def _build_filter_sql(params_in):
     return where_sql, params
 
 @bp.get("/api/temp-assignments")
+@changes.conditional
 def temp_assignments_list():
+    """
+    One page of reservations: ?limit=, ?cursor= (the previous page's next_cursor).
+    ?q= searches tribe/app/resource/role at once; best `limit` matches, no next page.
+    """
     qid = get_current_quarter_id()
     if not qid:
         return jsonify({"error": "No quarter configured"}), 400
 
+    limit = paging.page_limit(request.args.get("limit"))
+    try:
+        after = paging.decode_cursor(request.args.get("cursor"), 3)
+    except paging.BadCursor as e:
+        return jsonify({"error": str(e)}), 400
+
     where_sql, params = _build_filter_sql({
         "qid": qid,
         "tribe": request.args.get("tribe"),
@@ -44,6 +61,19 @@ def temp_assignments_list():
         "role": request.args.get("role"),
         "resource": request.args.get("resource"),
     })
+    s_where, s_rank, s_params = text_search(
+        ["ta.tribe_name", "ta.app_name", "r.name", "r.role"], request.args.get("q"))
+    order_sql = "ta.tribe_name, ta.resource_name, ta.id"
+    if s_where:
+        where_sql += s_where
+        order_sql = f"{s_rank} DESC, " + order_sql
+        params.update(s_params)
+        params["lim"] = limit
+    else:
+        if after:
+            where_sql += " AND (ta.tribe_name, ta.resource_name, ta.id) > (:c_tribe, :c_res, :c_id)"
+            params.update(c_tribe=after[0], c_res=after[1], c_id=int(after[2]))
+        params["lim"] = limit + 1
 
     rows = fetch_all(
         f"""
@@ -55,16 +85,21 @@ def temp_assignments_list():
             r.name          AS resource_name,
             r.role          AS role,
             ta.resource_id  AS resource_id,
-             ta.reserved_sprints AS reserved
+             ta.reserved_sprints AS reserved,
+            ta.resource_name AS _sort_res
         FROM temp_assignments ta
         JOIN resources r ON r.id = ta.resource_id
         WHERE {where_sql}
-        ORDER BY ta.tribe_name, r.name
+        ORDER BY {order_sql}
+        LIMIT :lim
         """,
         **params,
     )
+    rows, nxt = paging.split_page(rows, limit, lambda r: [r["tribe"], r["_sort_res"], r["temp_id"]])
+    for r in rows:
+        r.pop("_sort_res", None)
 
-    return jsonify({"items": rows})
+    return jsonify({"items": rows, "next_cursor": nxt})
 
 @bp.get("/booking/<int:temp_id>")
 def booking_detail_page(temp_id):
@@ -72,13 +107,7 @@ def booking_detail_page(temp_id):
     qid = get_current_quarter_id()
     
     
-    row = fetch_one("""
-        SELECT COALESCE(name, code) AS title
-        FROM quarters
-        WHERE is_current = TRUE
-        LIMIT 1
-    """)
-    current = (row or {}).get("title") or ""
+    current = quarters.current_title()
 
     if not qid:
         return render_template(
@@ -91,7 +120,7 @@ def booking_detail_page(temp_id):
 
     temp = fetch_one(
         """
-        SELECT ta.id AS temp_id, ta.tribe_name, ta.assign_type, ta.app_name,
+        SELECT ta.id AS temp_id, ta.tribe_id, ta.tribe_name, ta.assign_type, ta.app_name,
                ta.resource_id, r.name AS resource_name, r.role, ta.reserved_sprints
         FROM temp_assignments ta
         JOIN resources r ON r.id = ta.resource_id
@@ -112,63 +141,20 @@ def booking_detail_page(temp_id):
     # Per-sprint capacity (applies to Shared)
     cap = int(os.getenv("SHARED_MAX_TRIBES_PER_SPRINT", "3"))
 
-    # booking.py (inside booking_detail_page)
-    master = fetch_all(
-        """
-        SELECT ma.tribe_name, ma.s1, ma.s2, ma.s3, ma.s4, ma.s5, ma.s6
+    # Sprints booked by ANY tribe on this resource, and how many THIS tribe holds
+    occ = fetch_one(f"""
+        SELECT COALESCE(bit_or(ma.sprint_mask), 0) AS booked_mask,
+               COALESCE({occupancy.bit_count_sql("bit_or(ma.sprint_mask) FILTER (WHERE ma.tribe_id = :tid)")}, 0) AS mine_cnt
         FROM master_assignments ma
-        JOIN resources r
-        ON r.id = :rid
-        AND ma.resource_name = r.name
-        WHERE ma.quarter_id = :qid
+        WHERE ma.quarter_id = :qid AND ma.resource_id = :rid
         """,
-        qid=qid, rid=temp["resource_id"],
-    )
-
-
-    # Combine ALL tribes’ rows for that resource to get truly "booked" sprints
-    booked_flags = [False]*6
-    
-    for row in master:
-        for i, col in enumerate(("s1","s2","s3","s4","s5","s6")):
-            v = row.get(col)
-            if isinstance(v, bool):
-                booked_flags[i] |= v
-            elif v in (1, "1", "Y", "y", "T", "t", "true", "True"):
-                booked_flags[i] = True
-
-        # How many sprints are already booked by THIS tribe on this resource?
-    mine_count_row = fetch_one("""
-      SELECT COALESCE(
-        SUM( (CASE WHEN s1 THEN 1 ELSE 0 END) +
-             (CASE WHEN s2 THEN 1 ELSE 0 END) +
-             (CASE WHEN s3 THEN 1 ELSE 0 END) +
-             (CASE WHEN s4 THEN 1 ELSE 0 END) +
-             (CASE WHEN s5 THEN 1 ELSE 0 END) +
-             (CASE WHEN s6 THEN 1 ELSE 0 END) ), 0) AS cnt
-      FROM master_assignments
-      WHERE quarter_id = :qid AND resource_name = :rname AND tribe_name = :tname
-    """, qid=qid, rname=temp["resource_name"], tname=temp["tribe_name"]) or {"cnt":0}
-    booked_by_tribe = int(mine_count_row["cnt"])
-
-
-    # Build counts and who booked each sprint
-    counts = {i: 0 for i in range(1, 7)}
-    booked_by = {i: [] for i in range(1, 7)}
-    for row in master:
-        for i, col in enumerate(["s1", "s2", "s3", "s4", "s5", "s6"], start=1):
-            if bool(row[col]):
-                counts[i] += 1
-                booked_by[i].append(row["tribe_name"])
-
-    # Decide which sprint indexes are blocked for this temp assignment
-# Block a sprint if ANY tribe has it (same rule as the JSON API)
-    booked_indices = [i for i, flag in enumerate(booked_flags, start=1) if flag]
-
+        qid=qid, rid=temp["resource_id"], tid=temp["tribe_id"],
+    ) or {}
+    booked_by_tribe = int(occ.get("mine_cnt") or 0)
 
     reserved = int(temp.get("reserved_sprints") or 0)
 
-    booked_sprints = [i+1 for i, flag in enumerate(booked_flags) if flag]
+    booked_sprints = occupancy.sprint_numbers(int(occ.get("booked_mask") or 0))
     return render_template(
         "booking_detail.html",
         temp_id=temp_id,
@@ -221,15 +207,11 @@ def temp_assignment_detail(temp_id):
     # Shared per-sprint capacity (default 3) — kept for sprint-level blocking
     cap = int(os.getenv("SHARED_MAX_TRIBES_PER_SPRINT", "3"))
 
-    # master_assignments has resource_name, not resource_id
     master = fetch_all(
         """
-        SELECT ma.tribe_name, ma.s1, ma.s2, ma.s3, ma.s4, ma.s5, ma.s6
+        SELECT ma.tribe_name, ma.sprint_mask
         FROM master_assignments ma
-        JOIN resources r
-        ON r.id = :rid
-        AND ma.resource_name = r.name
-        WHERE ma.quarter_id = :qid
+        WHERE ma.quarter_id = :qid AND ma.resource_id = :rid
         """,
         qid=qid,
         rid=temp["resource_id"],
@@ -240,10 +222,9 @@ def temp_assignment_detail(temp_id):
     booked_by = {i: [] for i in range(1, 7)}
     counts = {i: 0 for i in range(1, 7)}
     for row in master:
-        for i, col in enumerate(["s1", "s2", "s3", "s4", "s5", "s6"], start=1):
-            if bool(row[col]):
-                counts[i] += 1
-                booked_by[i].append(row["tribe_name"])
+        for i in occupancy.sprint_numbers(int(row["sprint_mask"] or 0)):
+            counts[i] += 1
+            booked_by[i].append(row["tribe_name"])
 
     sprints = []
     for i in range(1, 7):
@@ -266,147 +247,303 @@ def temp_assignment_detail(temp_id):
         }
     )
 
-@bp.post("/api/book-temp/<int:temp_id>")
-def book_temp(temp_id):
-    qid = get_current_quarter_id()
-    if not qid:
-        return jsonify({"error": "No quarter configured"}), 400
+# ---------- shared by book_temp / book_batch ----------
+_UPSERT_COLS = """quarter_id, tribe_id, tribe_name, app_name, resource_id, resource_name, role,
+                  assignment_type, s1, s2, s3, s4, s5, s6, edited, updated_at"""
 
-    payload = request.get_json(force=True) or {}
-    selected_sprints = payload.get("sprints", [])
-    # normalize/validate sprint indices 1..6
-    try:
-        selected_sprints = sorted({int(s) for s in selected_sprints if 1 <= int(s) <= 6})
-    except Exception:
-        return jsonify({"error": "Invalid sprint indexes"}), 400
+def _upsert_sql(n: int) -> str:
+    """
+    Insert-or-OR-in the sprints of `n` rows on (quarter, tribe, resource, role).
+    Binds are suffixed _0.._{n-1}; keys must be distinct within one statement
+    (ON CONFLICT can't touch the same row twice).
+    """
+    rows = ",\n            ".join(
+        f"(:qid_{i}, :tid_{i}, :tname_{i}, :appname_{i}, :rid_{i}, :rname_{i}, :rrole_{i}, :atype_{i}, "
+        f":s1_{i}, :s2_{i}, :s3_{i}, :s4_{i}, :s5_{i}, :s6_{i}, FALSE, NOW())"
+        for i in range(n)
+    )
+    return f"""
+        INSERT INTO master_assignments ({_UPSERT_COLS})
+        VALUES
+            {rows}
+        ON CONFLICT (quarter_id, tribe_name, resource_name, role)
+        DO UPDATE SET
+            assignment_type = EXCLUDED.assignment_type,
+            tribe_id = EXCLUDED.tribe_id,
+            resource_id = EXCLUDED.resource_id,
+            s1 = COALESCE(master_assignments.s1, FALSE) OR COALESCE(EXCLUDED.s1, FALSE),
+            s2 = COALESCE(master_assignments.s2, FALSE) OR COALESCE(EXCLUDED.s2, FALSE),
+            s3 = COALESCE(master_assignments.s3, FALSE) OR COALESCE(EXCLUDED.s3, FALSE),
+            s4 = COALESCE(master_assignments.s4, FALSE) OR COALESCE(EXCLUDED.s4, FALSE),
+            s5 = COALESCE(master_assignments.s5, FALSE) OR COALESCE(EXCLUDED.s5, FALSE),
+            s6 = COALESCE(master_assignments.s6, FALSE) OR COALESCE(EXCLUDED.s6, FALSE),
+            updated_at = NOW()
+        RETURNING id, tribe_name, resource_id, sprint_mask, (xmax = 0) AS created
+    """
 
-    # Load the temp row with all fields we need
-    temp = fetch_one("""
-        SELECT ta.id AS temp_id,
-               ta.tribe_name,
-               ta.assign_type,
-               ta.app_name,
-               ta.resource_id,
-               r.name AS resource_name,
-               r.role AS resource_role
-        FROM temp_assignments ta
-        JOIN resources r ON r.id = ta.resource_id
-        WHERE ta.id = :id AND ta.quarter_id = :qid
-        """, id=temp_id, qid=qid)
-    if not temp:
-        return jsonify({"error": "Temp assignment not found"}), 404
+def _upsert_params(i: int, qid: int, temp: dict, assign_type: str, want_mask: int) -> dict:
+    vals = {
+        "qid": qid,
+        "tid": temp["tribe_id"],
+        "tname": temp["tribe_name"],
+        "appname": temp["app_name"],
+        "rid": int(temp["resource_id"]),
+        "rname": temp["resource_name"],
+        "rrole": temp["resource_role"],
+        "atype": assign_type,  # 'Shared' or 'Dedicated'
+        **occupancy.to_columns(want_mask),
+    }
+    return {f"{k}_{i}": v for k, v in vals.items()}
 
-    tribe       = temp["tribe_name"]
-    rid         = int(temp["resource_id"])
-    resource    = temp["resource_name"]
-    role        = temp["resource_role"]
-    assign_type = (temp["assign_type"] or "Shared").strip() or "Shared"
-
-    # master rows for THIS resource+role in THIS quarter (need tribe_name for per-tribe checks)
-    master = fetch_all("""
-        SELECT id, tribe_name, s1, s2, s3, s4, s5, s6
-        FROM master_assignments
-        WHERE quarter_id = :qid
-          AND resource_name = :rname
-          AND role = :rrole
-        """, qid=qid, rname=resource, rrole=role)
-
-    # Build per-sprint occupancy + whether THIS tribe already has it
-    cap_shared = int(os.getenv("SHARED_MAX_TRIBES_PER_SPRINT", "3"))
-    counts     = {i: 0 for i in range(1, 7)}
-    tribe_has  = {i: False for i in range(1, 7)}
-    for m in master:
-        for i, col in enumerate(["s1","s2","s3","s4","s5","s6"], start=1):
-            if bool(m[col]):
-                counts[i] += 1
-                if m["tribe_name"] == tribe:
-                    tribe_has[i] = True
-
-    # sprint-level blocking
+def _assignment_event(row) -> dict:
+    """"assignment" event fields for one upserted row (see _upsert_sql's RETURNING)."""
+    return {"id": int(row["id"]), "tribe_name": row["tribe_name"], "resource_id": int(row["resource_id"]),
+            "sprint_mask": int(row["sprint_mask"]), "created": bool(row["created"])}
+
+def _booking_error(assign_type, masks, mine_mask, want_mask, reserved, cap_shared):
+    """
+    Sprint clash, shared-capacity and per-tribe cap rules for booking `want_mask`.
+    `masks` are the resource's current rows (any tribe), `mine_mask` what this tribe
+    already holds. Returns (status, body) for the first failing rule, else None.
+    """
     errors = []
-    for s in selected_sprints:
+    for s in occupancy.sprint_numbers(want_mask & ~mine_mask):
+        taken = sum((m >> (s - 1)) & 1 for m in masks)
         if assign_type == "Dedicated":
-            if counts[s] > 0 and not tribe_has[s]:
+            if taken > 0:
                 errors.append(f"Sprint S{s} already taken by another tribe")
         else:
-            if counts[s] >= cap_shared and not tribe_has[s]:
+            if taken >= cap_shared:
                 errors.append(f"Sprint S{s} has reached the shared capacity")
     if errors:
-        return jsonify({"error": "Validation failed", "details": errors}), 409
+        return 409, {"error": "Validation failed", "details": errors}
 
-    # Enforce per-tribe TOTAL cap for this (tribe, resource) from temp.reserved_sprints
-    reserved_row = fetch_one("""
-        SELECT ta.reserved_sprints
-        FROM temp_assignments ta
-        WHERE ta.quarter_id = :qid
-          AND ta.resource_id = :rid
-          AND ta.tribe_name = :tname
-        ORDER BY ta.id DESC
-        LIMIT 1
-        """, qid=qid, rid=rid, tname=tribe)
-    cap_per_tribe = int((reserved_row or {}).get("reserved_sprints") or 0)
+    # per-tribe TOTAL cap for this (tribe, resource) from temp.reserved_sprints
+    cap_per_tribe = int(reserved or 0)
     if assign_type == "Dedicated":
         cap_per_tribe = max(cap_per_tribe, 6)
+    if occupancy.popcount(mine_mask | want_mask) > cap_per_tribe:
+        return 400, {"error": f"you’ve exceeded max allowed number of sprints ({cap_per_tribe})."}
+    return None
 
-    already_cnt_row = fetch_one("""
-        SELECT COALESCE(SUM(
-          (CASE WHEN s1 THEN 1 ELSE 0 END) +
-          (CASE WHEN s2 THEN 1 ELSE 0 END) +
-          (CASE WHEN s3 THEN 1 ELSE 0 END) +
-          (CASE WHEN s4 THEN 1 ELSE 0 END) +
-          (CASE WHEN s5 THEN 1 ELSE 0 END) +
-          (CASE WHEN s6 THEN 1 ELSE 0 END)
-        ), 0) AS cnt
-        FROM master_assignments
-        WHERE quarter_id = :qid
-          AND resource_name = :rname
-          AND role = :rrole
-          AND tribe_name = :tname
-        """, qid=qid, rname=resource, rrole=role, tname=tribe)
-    already_cnt = int((already_cnt_row or {}).get("cnt", 0))
-    if already_cnt + len([s for s in selected_sprints if not tribe_has[s]]) > cap_per_tribe:
-        return jsonify({"error": f"you’ve exceeded max allowed number of sprints ({cap_per_tribe})."}), 400
-
-    # Build the six sprint booleans once
-    svals_bool = {i: (i in selected_sprints) for i in range(1, 7)}
+def _parse_sprints(raw) -> list[int]:
+    """Sprint numbers 1..6, sorted and de-duplicated; ValueError/TypeError on junk."""
+    return sorted({int(s) for s in (raw or []) if 1 <= int(s) <= 6})
 
-        # ONE statement: insert-or-update on (quarter, tribe, resource, role)
-    sql = """
-            INSERT INTO master_assignments (
-            quarter_id, tribe_name, app_name, resource_name, role, assignment_type,
-            s1, s2, s3, s4, s5, s6, edited, updated_at
-        )
-        VALUES (
-            :qid, :tname, :appname, :rname, :rrole, :atype,
-            :s1, :s2, :s3, :s4, :s5, :s6, FALSE, NOW()
-        )
-        ON CONFLICT (quarter_id, tribe_name, resource_name, role)
-        DO UPDATE SET
-            assignment_type = EXCLUDED.assignment_type,
-            s1 = COALESCE(master_assignments.s1, FALSE) OR COALESCE(EXCLUDED.s1, FALSE),
-            s2 = COALESCE(master_assignments.s2, FALSE) OR COALESCE(EXCLUDED.s2, FALSE),
-            s3 = COALESCE(master_assignments.s3, FALSE) OR COALESCE(EXCLUDED.s3, FALSE),
-            s4 = COALESCE(master_assignments.s4, FALSE) OR COALESCE(EXCLUDED.s4, FALSE),
-            s5 = COALESCE(master_assignments.s5, FALSE) OR COALESCE(EXCLUDED.s5, FALSE),
-            s6 = COALESCE(master_assignments.s6, FALSE) OR COALESCE(EXCLUDED.s6, FALSE),
-            updated_at = NOW();
-    """
+@bp.post("/api/book-temp/<int:temp_id>")
+@retry_on_conflict
+def book_temp(temp_id):
+    qid = get_current_quarter_id()
+    if not qid:
+        return jsonify({"error": "No quarter configured"}), 400
 
+    payload = request.get_json(force=True) or {}
+    # normalize/validate sprint indices 1..6
+    try:
+        selected_sprints = _parse_sprints(payload.get("sprints", []))
+    except Exception:
+        return jsonify({"error": "Invalid sprint indexes"}), 400
 
-    execute(sql, **{
-        "qid": qid,
-        "tname": tribe,
-        "appname": temp["app_name"],
-        "rname": resource,
-        "rrole": role,
-        "atype": assign_type,  # 'Shared' or 'Dedicated'
-        "s1": svals_bool[1],
-        "s2": svals_bool[2],
-        "s3": svals_bool[3],
-        "s4": svals_bool[4],
-        "s5": svals_bool[5],
-        "s6": svals_bool[6],
-    })
+    with transaction() as tx:
+        # Serialize with other writers on this resource before reading its occupancy
+        target = tx.fetch_one("""
+            SELECT resource_id FROM temp_assignments WHERE id = :id AND quarter_id = :qid
+            """, id=temp_id, qid=qid)
+        if not target:
+            return jsonify({"error": "Temp assignment not found"}), 404
+        tx.lock_resources(qid, [target["resource_id"]])
+
+        # One round trip: the temp row, per-sprint occupancy of this resource+role,
+        # what THIS tribe already holds there, and its reserved cap
+        temp = tx.fetch_one("""
+            WITH tmp AS (
+                SELECT ta.id AS temp_id,
+                       ta.tribe_id,
+                       ta.tribe_name,
+                       ta.assign_type,
+                       ta.app_name,
+                       ta.resource_id,
+                       r.name AS resource_name,
+                       r.role AS resource_role
+                FROM temp_assignments ta
+                JOIN resources r ON r.id = ta.resource_id
+                WHERE ta.id = :id AND ta.quarter_id = :qid
+            ),
+            occ AS (
+                SELECT
+                    COALESCE(array_agg(ma.sprint_mask), '{}')                                      AS masks,
+                    COALESCE(bit_or(ma.sprint_mask) FILTER (WHERE ma.tribe_id = tmp.tribe_id), 0) AS mine_mask
+                FROM master_assignments ma
+                JOIN tmp ON ma.resource_id = tmp.resource_id
+                WHERE ma.quarter_id = :qid
+            ),
+            cap AS (
+                SELECT ta.reserved_sprints
+                FROM temp_assignments ta
+                JOIN tmp ON ta.resource_id = tmp.resource_id AND ta.tribe_id = tmp.tribe_id
+                WHERE ta.quarter_id = :qid
+                ORDER BY ta.id DESC
+                LIMIT 1
+            )
+            SELECT tmp.*, occ.*, (SELECT reserved_sprints FROM cap) AS reserved_sprints
+            FROM tmp CROSS JOIN occ
+            """, id=temp_id, qid=qid)
+        if not temp:
+            return jsonify({"error": "Temp assignment not found"}), 404
+
+        tribe       = temp["tribe_name"]
+        rid         = int(temp["resource_id"])
+        assign_type = (temp["assign_type"] or "Shared").strip() or "Shared"
+
+        # Per-sprint occupancy + whether THIS tribe already has it
+        cap_shared = int(os.getenv("SHARED_MAX_TRIBES_PER_SPRINT", "3"))
+        masks      = [int(m or 0) for m in (temp["masks"] or [])]
+        mine_mask  = int(temp["mine_mask"] or 0)
+        want_mask  = occupancy.to_mask({f"s{s}": True for s in selected_sprints})
+
+        failed = _booking_error(assign_type, masks, mine_mask, want_mask,
+                                temp["reserved_sprints"], cap_shared)
+        if failed:
+            status, body = failed
+            return jsonify(body), status
 
+        # ONE statement: insert-or-update on (quarter, tribe, resource, role)
+        saved = tx.fetch_one(_upsert_sql(1), **_upsert_params(0, qid, temp, assign_type, want_mask))
+        ev = _assignment_event(saved)
+        changes.notify(tx, qid, [ev])
+    changes.bump(qid)
+    occupancy.refresh(qid, rid, tribe)
+    events.publish("assignment", qid, **ev)
 
     return jsonify({"ok": True})
+
+BOOK_BATCH_MAX = int(os.getenv("BOOK_BATCH_MAX", "200"))
+
+@bp.post("/api/book-batch")
+@retry_on_conflict
+def book_batch():
+    """
+    Book many temp assignments at once:
+        {"items": [{"temp_id": 12, "sprints": [1, 2]}, ...], "partial": false}
+    Every item is checked against ONE occupancy snapshot that also absorbs the
+    earlier items of the batch, so two items can't both take the last slot of a
+    sprint. All accepted rows go in with one multi-row upsert in one transaction.
+    By default the batch is all-or-nothing (409, nothing written, if any item
+    fails); with "partial": true the valid items are written and the rest reported.
+    """
+    qid = get_current_quarter_id()
+    if not qid:
+        return jsonify({"error": "No quarter configured"}), 400
+
+    payload = request.get_json(force=True) or {}
+    items = payload.get("items") if isinstance(payload, dict) else payload
+    partial = bool(payload.get("partial")) if isinstance(payload, dict) else False
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "items must be a non-empty list"}), 400
+    if len(items) > BOOK_BATCH_MAX:
+        return jsonify({"error": f"At most {BOOK_BATCH_MAX} items per batch"}), 400
+
+    results = []
+    wanted = []  # (result index, temp_id, sprints)
+    for it in items:
+        tid = it.get("temp_id") if isinstance(it, dict) else None
+        res = {"temp_id": tid, "ok": False}
+        results.append(res)
+        try:
+            tid = res["temp_id"] = int(tid)
+            sprints = _parse_sprints(it.get("sprints", []))
+        except Exception:
+            res.update(status=400, error="Invalid temp_id or sprint indexes")
+            continue
+        wanted.append((len(results) - 1, tid, sprints))
+
+    cap_shared = int(os.getenv("SHARED_MAX_TRIBES_PER_SPRINT", "3"))
+    saved = []
+    with transaction() as tx:
+        temp_ids = sorted({tid for _, tid, _ in wanted})
+        temps = {r["temp_id"]: r for r in tx.fetch_all("""
+            SELECT ta.id AS temp_id,
+                   ta.tribe_id,
+                   ta.tribe_name,
+                   ta.assign_type,
+                   ta.app_name,
+                   ta.resource_id,
+                   r.name AS resource_name,
+                   r.role AS resource_role,
+                   (SELECT c.reserved_sprints
+                    FROM temp_assignments c
+                    WHERE c.quarter_id = :qid
+                      AND c.resource_id = ta.resource_id AND c.tribe_id = ta.tribe_id
+                    ORDER BY c.id DESC
+                    LIMIT 1) AS reserved_sprints
+            FROM temp_assignments ta
+            JOIN resources r ON r.id = ta.resource_id
+            WHERE ta.quarter_id = :qid AND ta.id = ANY(:ids)
+            """, qid=qid, ids=temp_ids)} if temp_ids else {}
+
+        # occupancy snapshot: resource_id -> {tribe_id: mask}, taken under the
+        # (quarter, resource) locks so it stays true until COMMIT
+        rids = sorted({int(t["resource_id"]) for t in temps.values()})
+        tx.lock_resources(qid, rids)
+        snap = {rid: {} for rid in rids}
+        if rids:
+            for r in tx.fetch_all("""
+                SELECT resource_id, tribe_id, sprint_mask
+                FROM master_assignments
+                WHERE quarter_id = :qid AND resource_id = ANY(:rids)
+                """, qid=qid, rids=rids):
+                held = snap[int(r["resource_id"])]
+                held[r["tribe_id"]] = held.get(r["tribe_id"], 0) | int(r["sprint_mask"] or 0)
+
+        # validate in request order; accepted items join the snapshot
+        rows = {}  # upsert key -> [temp, assign_type, mask]; merged, one VALUES row each
+        for i, tid, sprints in wanted:
+            res, temp = results[i], temps.get(tid)
+            if not temp:
+                res.update(status=404, error="Temp assignment not found")
+                continue
+            rid = int(temp["resource_id"])
+            held = snap[rid]
+            assign_type = (temp["assign_type"] or "Shared").strip() or "Shared"
+            mine_mask = held.get(temp["tribe_id"], 0)
+            want_mask = occupancy.to_mask({f"s{s}": True for s in sprints})
+            failed = _booking_error(assign_type, list(held.values()), mine_mask, want_mask,
+                                    temp["reserved_sprints"], cap_shared)
+            if failed:
+                status, body = failed
+                res.update(status=status, **body)
+                continue
+            held[temp["tribe_id"]] = mine_mask | want_mask
+            key = (temp["tribe_name"], temp["resource_name"], temp["resource_role"])
+            row = rows.setdefault(key, [temp, assign_type, 0])
+            row[1], row[2] = assign_type, row[2] | want_mask
+            res.update(ok=True, tribe_name=temp["tribe_name"], resource_id=rid, sprints=sprints)
+
+        all_ok = all(r["ok"] for r in results)
+        if rows and (all_ok or partial):
+            params = {}
+            for n, (temp, assign_type, mask) in enumerate(rows.values()):
+                params.update(_upsert_params(n, qid, temp, assign_type, mask))
+            saved = tx.fetch_all(_upsert_sql(len(rows)), **params)
+            changes.notify(tx, qid, [_assignment_event(r) for r in saved])
+
+    if not saved:
+        if not all_ok:
+            for r in results:
+                if r["ok"]:
+                    r.update(ok=False, status=409, error="Not booked: other items in the batch failed")
+            return jsonify({"ok": False, "results": results}), 409 if not partial else 200
+        return jsonify({"ok": True, "results": results})
+
+    by_key = {(r["tribe_name"], int(r["resource_id"])): r for r in saved}
+    for res in results:
+        if res["ok"]:
+            row = by_key[(res["tribe_name"], res["resource_id"])]
+            res.update(id=int(row["id"]), sprint_mask=int(row["sprint_mask"]))
+    changes.bump(qid)
+    for r in saved:
+        occupancy.refresh(qid, int(r["resource_id"]), r["tribe_name"])
+    for r in saved:
+        events.publish("assignment", qid, **_assignment_event(r))
+
+    return jsonify({"ok": all_ok, "results": results})
@@ -0,0 +1,132 @@
+# scripts/booking_stress.py
+# Hammer ONE resource with concurrent bookings and check that no sprint ends up
+# over-booked. Runs the real Flask app (test client) against DATABASE_URL:
+#   python scripts/booking_stress.py --resource-id 7 --threads 16 --requests 400 --reset
+# --reset deletes the resource's master_assignments rows in the current quarter
+# first (use a scratch database). Exit code 1 if an invariant is broken.
+import os, sys, random, argparse, threading, time
+from collections import Counter
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
+
+from app import create_app
+from db import fetch_all, execute, get_current_qid
+import occupancy
+
+
+def _temps(qid, rid):
+    return fetch_all("""
+        SELECT id, tribe_id, tribe_name, assign_type, reserved_sprints
+        FROM temp_assignments
+        WHERE quarter_id = :qid AND resource_id = :rid
+        ORDER BY id
+    """, qid=qid, rid=rid)
+
+def _pick_resource(qid):
+    row = fetch_all("""
+        SELECT resource_id
+        FROM temp_assignments
+        WHERE quarter_id = :qid
+        GROUP BY resource_id
+        ORDER BY COUNT(DISTINCT tribe_id) DESC, resource_id
+        LIMIT 1
+    """, qid=qid)
+    return row[0]["resource_id"] if row else None
+
+def _check(qid, rid, temps, cap_shared):
+    """Return a list of invariant violations for the resource's booked rows."""
+    rows = fetch_all("""
+        SELECT tribe_id, tribe_name, assignment_type, sprint_mask
+        FROM master_assignments
+        WHERE quarter_id = :qid AND resource_id = :rid
+    """, qid=qid, rid=rid)
+    problems = []
+    held = Counter()
+    for r in rows:
+        for s in occupancy.sprint_numbers(int(r["sprint_mask"] or 0)):
+            held[s] += 1
+    all_dedicated = temps and all((t["assign_type"] or "").strip() == "Dedicated" for t in temps)
+    limit = 1 if all_dedicated else cap_shared
+    for s, n in sorted(held.items()):
+        if n > limit:
+            problems.append(f"S{s} held by {n} tribes (limit {limit})")
+    caps = {}
+    for t in temps:
+        cap = int(t["reserved_sprints"] or 0)
+        if (t["assign_type"] or "").strip() == "Dedicated":
+            cap = max(cap, 6)
+        caps[t["tribe_id"]] = max(caps.get(t["tribe_id"], 0), cap)
+    for r in rows:
+        n = occupancy.popcount(int(r["sprint_mask"] or 0))
+        if n > caps.get(r["tribe_id"], 6):
+            problems.append(f"{r['tribe_name']} holds {n} sprints (cap {caps.get(r['tribe_id'])})")
+    return problems, held
+
+def main():
+    ap = argparse.ArgumentParser(description="Concurrent booking stress test for one resource")
+    ap.add_argument("--resource-id", type=int)
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--requests", type=int, default=400)
+    ap.add_argument("--batch-every", type=int, default=5, help="every Nth request goes through /api/book-batch")
+    ap.add_argument("--reset", action="store_true")
+    args = ap.parse_args()
+
+    app = create_app()
+    qid = get_current_qid()
+    if not qid:
+        sys.exit("No current quarter")
+    rid = args.resource_id or _pick_resource(qid)
+    temps = _temps(qid, rid) if rid else []
+    if not temps:
+        sys.exit("No temp assignments for that resource in the current quarter")
+    if args.reset:
+        execute("DELETE FROM master_assignments WHERE quarter_id = :qid AND resource_id = :rid", qid=qid, rid=rid)
+        occupancy.invalidate()
+
+    cap_shared = int(os.getenv("SHARED_MAX_TRIBES_PER_SPRINT", "3"))
+    statuses = Counter()
+    lock = threading.Lock()
+    todo = iter(range(args.requests))
+
+    def worker():
+        client = app.test_client()
+        rnd = random.Random()
+        while True:
+            with lock:
+                n = next(todo, None)
+            if n is None:
+                return
+            if args.batch_every and n % args.batch_every == 0:
+                items = [{"temp_id": t["id"], "sprints": rnd.sample(range(1, 7), rnd.randint(1, 2))}
+                         for t in rnd.sample(temps, min(len(temps), 3))]
+                resp = client.post("/api/book-batch", json={"items": items, "partial": True})
+            else:
+                t = rnd.choice(temps)
+                resp = client.post(f"/api/book-temp/{t['id']}",
+                                   json={"sprints": rnd.sample(range(1, 7), rnd.randint(1, 2))})
+            with lock:
+                statuses[resp.status_code] += 1
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    dt = time.perf_counter() - t0
+
+    problems, held = _check(qid, rid, temps, cap_shared)
+    print(f"resource {rid}: {args.requests} requests / {args.threads} threads in {dt:.2f}s "
+          f"({args.requests / dt:.0f} req/s)")
+    print("status codes:", dict(sorted(statuses.items())))
+    print("tribes per sprint:", {f"S{s}": n for s, n in sorted(held.items())})
+    if statuses.get(500):
+        problems.append(f"{statuses[500]} requests failed with 500")
+    for p in problems:
+        print("❌", p)
+    if problems:
+        sys.exit(1)
+    print("✅ no over-booking")
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,20 @@
 # scripts/db_init.py
-import os
-from db import engine
-from sqlalchemy import text
+import os, sys
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
 
-BASE = os.path.dirname(os.path.dirname(__file__))
+from db import engine
+from migrate import migrate, run_script
 
 def run_sql(path):
     p = os.path.join(BASE, path)
     with open(p, "r", encoding="utf-8") as f:
         sql = f.read()
-    stmts = [s.strip() for s in sql.split(";") if s.strip()]
     with engine.begin() as conn:
-        for i, s in enumerate(stmts, 1):
-            conn.exec_driver_sql(s + ";")
-            print(f"✔ Ran statement {i} from {path}")
+        n = run_script(conn, sql)
+    print(f"✔ Ran {n} statements from {path}")
 
 if __name__ == "__main__":
-    run_sql(r"sql\create_tables.sql")
-    run_sql(r"sql\seed_sample.sql")
+    print(f"✔ Schema at version {migrate()}")
+    run_sql(os.path.join("sql", "seed_sample.sql"))
     print("✅ DB initialized/seeded")
@@ -0,0 +1,102 @@
+# scripts/occupancy_race.py
+# Check that out-of-order occupancy refreshes can't leave a stale cell in the index.
+#   python scripts/occupancy_race.py --threads 8 --writes 200
+# 1. interleave: refresh A reads the cell, writer B commits and refreshes, then A
+#    applies its older read last; the index must still match the DB.
+# 2. hammer: threads rewrite the same cell under lock_resources and refresh after
+#    commit (the booking paths' order); afterwards every cell must match the DB.
+# Rewrites one booked master_assignments row of the current quarter and restores it:
+# use a scratch database. Exit code 1 on a mismatch.
+import os, sys, random, argparse, threading
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
+
+from db import fetch_one, fetch_all, transaction, get_current_qid
+from migrate import ensure_current
+import occupancy
+
+
+def _pick(qid):
+    return fetch_one("""
+        SELECT id, resource_id, tribe_name, sprint_mask
+        FROM master_assignments
+        WHERE quarter_id = :qid AND resource_id IS NOT NULL
+        ORDER BY id
+        LIMIT 1
+    """, qid=qid)
+
+def _write(qid, row, mask):
+    with transaction() as tx:
+        tx.lock_resources(qid, [row["resource_id"]])
+        tx.execute(f"""
+            UPDATE master_assignments
+            SET {", ".join(f"{c} = :{c}" for c in occupancy.SPRINTS)}
+            WHERE id = :id
+        """, id=row["id"], **occupancy.to_columns(mask))
+
+def _db_masks(qid, rid):
+    out = {}
+    for r in fetch_all("""
+        SELECT tribe_name, sprint_mask FROM master_assignments
+        WHERE quarter_id = :qid AND resource_id = :rid
+    """, qid=qid, rid=rid):
+        out[r["tribe_name"]] = out.get(r["tribe_name"], 0) | int(r["sprint_mask"] or 0)
+    return out
+
+def _compare(label, qid, rid) -> bool:
+    idx, db = occupancy.tribe_masks(qid, rid), _db_masks(qid, rid)
+    if idx != db:
+        print(f"❌ {label}: index {idx} != db {db}")
+        return False
+    print(f"✅ {label}: index matches db")
+    return True
+
+def main():
+    ap = argparse.ArgumentParser(description="Out-of-order occupancy refresh check")
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--writes", type=int, default=200)
+    a = ap.parse_args()
+
+    ensure_current()
+    qid = get_current_qid()
+    row = _pick(qid) if qid else None
+    if not row:
+        sys.exit("No booked master_assignments row in the current quarter")
+    rid, tribe, original = int(row["resource_id"]), row["tribe_name"], int(row["sprint_mask"] or 0)
+    occupancy.tribe_masks(qid, rid)  # build the index
+    ok = True
+    try:
+        # 1. A's read, then B's write + refresh, then A's (older) apply
+        _write(qid, row, 0b000011)
+        occupancy.refresh(qid, rid, tribe)
+        stale = occupancy._read_cell(qid, rid, tribe)
+        _write(qid, row, 0b110000)
+        occupancy.refresh(qid, rid, tribe)
+        occupancy._apply(qid, rid, tribe, stale)
+        ok &= _compare("interleaved refreshes", qid, rid)
+
+        # 2. concurrent writers on one cell, each refreshing after its commit
+        todo = iter(range(a.writes))
+        lock = threading.Lock()
+        def worker(seed):
+            rnd = random.Random(seed)
+            while True:
+                with lock:
+                    if next(todo, None) is None:
+                        return
+                _write(qid, row, rnd.randrange(occupancy.FULL_MASK + 1))
+                occupancy.refresh(qid, rid, tribe)
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(a.threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        ok &= _compare(f"{a.writes} writes / {a.threads} threads", qid, rid)
+    finally:
+        _write(qid, row, original)
+        occupancy.refresh(qid, rid, tribe)
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+# search.py
+# Combined ?q= search for the list endpoints: one term matched as a substring against
+# several text columns (each served by its trigram GIN index, see
+# sql/migrations/0003_trigram_search.sql) and ranked by pg_trgm word similarity.
+
+def text_search(cols: list[str], q: str|None, prefix: str = "s") -> tuple[str, str, dict]:
+    """
+    Returns (where_sql, rank_sql, params) for `q` over `cols`:
+      where_sql: " AND (col1 ILIKE :s_like OR col2 ILIKE :s_like ...)"
+      rank_sql:  "GREATEST(word_similarity(:s_q, col1), ...)" - higher is better
+    All three are empty when q is blank.
+    """
+    q = (q or "").strip()
+    if not q or not cols:
+        return "", "", {}
+    like, term = f"{prefix}_like", f"{prefix}_q"
+    where = " AND (" + " OR ".join(f"{c} ILIKE :{like}" for c in cols) + ")"
+    rank = "GREATEST(" + ", ".join(f"COALESCE(word_similarity(:{term}, {c}), 0)" for c in cols) + ")"
+    return where, rank, {like: f"%{q}%", term: q}
@@ -0,0 +1,89 @@
+# serve.py
+# Production entry point: create_app() under waitress instead of Flask's dev server.
+#   python serve.py            (HOST / PORT as for app.py)
+# Tuning via env (or .env):
+#   SERVE_THREADS            request worker threads                   (default 16)
+#   SSE_MAX_STREAMS          live-update streams, each its own thread (default 256)
+#   SERVE_CONNECTION_LIMIT   request connections before accept() pauses (default 200)
+#   SERVE_CHANNEL_TIMEOUT    seconds an idle connection is kept        (default 120)
+#   SERVE_BACKLOG            listen() backlog                          (default 1024)
+# Live-update streams (/api/events) each pin a thread for their lifetime but never touch
+# the DB, so waitress gets one shared pool of SERVE_THREADS + SSE_MAX_STREAMS threads (and
+# connections). Waitress can't reserve threads per route, so RequestSlots lets at most
+# SERVE_THREADS other requests run at once; the rest wait for a slot on their thread
+# instead of piling onto the DB pool, which db.py sizes from SERVE_THREADS too
+# (DB_POOL_SIZE overrides) and which would otherwise raise after DB_POOL_TIMEOUT seconds.
+import os, logging, threading
+import db  # loads .env before the settings below are read
+import events
+from waitress import serve as _waitress_serve
+
+
+SERVE_THREADS = int(os.getenv("SERVE_THREADS", "16"))
+STREAM_PATHS = ("/api/events",)
+
+
+class RequestSlots:
+    """
+    WSGI wrapper: at most `slots` requests outside STREAM_PATHS run at once. A slot is
+    held until the response body is closed, so streamed exports keep theirs (and their
+    DB connection) to the end.
+    """
+    def __init__(self, app, slots: int):
+        self.app = app
+        self._slots = threading.BoundedSemaphore(slots)
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO") in STREAM_PATHS:
+            return self.app(environ, start_response)
+        self._slots.acquire()
+        try:
+            body = self.app(environ, start_response)
+        except BaseException:
+            self._slots.release()
+            raise
+        return _Released(body, self._slots.release)
+
+class _Released:
+    """Response body that calls `release` once, when the server closes it."""
+    def __init__(self, body, release):
+        self._body, self._release = body, release
+
+    def __iter__(self):
+        return iter(self._body)
+
+    def close(self):
+        try:
+            if hasattr(self._body, "close"):
+                self._body.close()
+        finally:
+            release, self._release = self._release, None
+            if release:
+                release()
+
+
+def settings() -> dict:
+    return {
+        "threads": SERVE_THREADS + events.MAX_STREAMS,
+        "connection_limit": int(os.getenv("SERVE_CONNECTION_LIMIT", "200")) + events.MAX_STREAMS,
+        "channel_timeout": int(os.getenv("SERVE_CHANNEL_TIMEOUT", "120")),
+        "backlog": int(os.getenv("SERVE_BACKLOG", "1024")),
+    }
+
+def serve(app=None, host: str|None = None, port: int|None = None):
+    """Run `app` (default: create_app()) under waitress; blocks until shutdown."""
+    if app is None:
+        from app import create_app
+        app = create_app()
+    host = host or os.getenv("HOST", "127.0.0.1")
+    port = port or int(os.getenv("PORT", "5000"))
+    opts = settings()
+    logging.info("SERVE http://%s:%d threads=%d (requests %d, sse streams %d) connection_limit=%d "
+                 "channel_timeout=%ds backlog=%d db_pool=%d+%d",
+                 host, port, opts["threads"], SERVE_THREADS, events.MAX_STREAMS, opts["connection_limit"],
+                 opts["channel_timeout"], opts["backlog"], db.POOL_SIZE, db.POOL_MAX_OVERFLOW)
+    _waitress_serve(RequestSlots(app, SERVE_THREADS), host=host, port=port, ident="booking", **opts)
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,285 @@
+-- sql/migrations/0001_baseline.sql
+-- Baseline schema. Creates a fresh database and, being idempotent, also brings
+-- legacy databases to the same shape (what _ensure_min_schema() used to patch
+-- at runtime): label -> name, assign_type -> assignment_type, SMALLINT -> BOOLEAN
+-- sprints, missing columns/constraints/history tables.
+
+-- ---------- quarters ----------
+CREATE TABLE IF NOT EXISTS quarters (
+  id SERIAL PRIMARY KEY,
+  name TEXT,
+  code TEXT,
+  is_current BOOLEAN NOT NULL DEFAULT FALSE,
+  created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM information_schema.columns
+             WHERE table_schema = 'public' AND table_name = 'quarters' AND column_name = 'label') THEN
+    IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_schema = 'public' AND table_name = 'quarters' AND column_name = 'name') THEN
+      ALTER TABLE quarters RENAME COLUMN label TO name;
+    ELSE
+      EXECUTE 'ALTER TABLE quarters ALTER COLUMN label DROP NOT NULL';
+      EXECUTE 'UPDATE quarters SET name = COALESCE(name, label)';
+    END IF;
+  END IF;
+END $$;
+
+ALTER TABLE quarters ADD COLUMN IF NOT EXISTS name TEXT;
+ALTER TABLE quarters ADD COLUMN IF NOT EXISTS code TEXT;
+ALTER TABLE quarters ADD COLUMN IF NOT EXISTS is_current BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE quarters ADD COLUMN IF NOT EXISTS created_at TIMESTAMP NOT NULL DEFAULT NOW();
+
+-- the app writes both title columns; backfill whichever one legacy rows lack
+UPDATE quarters SET name = COALESCE(name, code), code = COALESCE(code, name)
+WHERE name IS NULL OR code IS NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_quarters_current ON quarters (is_current) WHERE is_current = TRUE;
+
+-- ---------- dimensions ----------
+CREATE TABLE IF NOT EXISTS tribes (
+  id SERIAL PRIMARY KEY,
+  name TEXT UNIQUE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS apps (
+  id SERIAL PRIMARY KEY,
+  name TEXT UNIQUE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS resources (
+  id SERIAL PRIMARY KEY,
+  name TEXT UNIQUE NOT NULL,
+  role TEXT
+);
+ALTER TABLE resources ADD COLUMN IF NOT EXISTS role TEXT;
+
+-- ---------- temp_assignments: what each tribe reserved ----------
+CREATE TABLE IF NOT EXISTS temp_assignments (
+  id SERIAL PRIMARY KEY,
+  quarter_id INT NOT NULL REFERENCES quarters(id) ON DELETE CASCADE,
+  tribe_id INT,
+  app_id INT,
+  -- denormalized names (for history ease)
+  tribe_name TEXT,
+  app_name TEXT,
+  -- resource linkage
+  resource_id INT,
+  resource_name TEXT,
+  role TEXT,
+  assign_type TEXT,
+  reserved_sprints INT NOT NULL DEFAULT 0
+);
+
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                 WHERE table_schema = 'public' AND table_name = 'temp_assignments' AND column_name = 'resource_name')
+     AND EXISTS (SELECT 1 FROM information_schema.columns
+                 WHERE table_schema = 'public' AND table_name = 'temp_assignments' AND column_name = 'resource') THEN
+    ALTER TABLE temp_assignments RENAME COLUMN resource TO resource_name;
+  END IF;
+END $$;
+
+ALTER TABLE temp_assignments ADD COLUMN IF NOT EXISTS quarter_id INT REFERENCES quarters(id) ON DELETE CASCADE;
+ALTER TABLE temp_assignments ADD COLUMN IF NOT EXISTS tribe_id INT;
+ALTER TABLE temp_assignments ADD COLUMN IF NOT EXISTS app_id INT;
+ALTER TABLE temp_assignments ADD COLUMN IF NOT EXISTS tribe_name TEXT;
+ALTER TABLE temp_assignments ADD COLUMN IF NOT EXISTS app_name TEXT;
+ALTER TABLE temp_assignments ADD COLUMN IF NOT EXISTS resource_id INT;
+ALTER TABLE temp_assignments ADD COLUMN IF NOT EXISTS resource_name TEXT;
+ALTER TABLE temp_assignments ADD COLUMN IF NOT EXISTS role TEXT;
+ALTER TABLE temp_assignments ADD COLUMN IF NOT EXISTS assign_type TEXT;
+ALTER TABLE temp_assignments ADD COLUMN IF NOT EXISTS reserved_sprints INT NOT NULL DEFAULT 0;
+
+DO $$
+BEGIN
+  BEGIN
+    ALTER TABLE temp_assignments
+      ADD CONSTRAINT temp_assignments_resource_id_fkey
+      FOREIGN KEY (resource_id) REFERENCES resources(id) ON DELETE CASCADE;
+  EXCEPTION WHEN duplicate_object THEN
+  END;
+  BEGIN
+    ALTER TABLE temp_assignments
+      ADD CONSTRAINT temp_assignments_assign_type_chk
+      CHECK (assign_type IN ('Dedicated','Shared'));
+  EXCEPTION WHEN duplicate_object THEN
+  END;
+  BEGIN
+    ALTER TABLE temp_assignments
+      ADD CONSTRAINT ta_reserved_chk
+      CHECK (reserved_sprints >= 0 AND reserved_sprints <= 6);
+  EXCEPTION WHEN duplicate_object THEN
+  END;
+END $$;
+
+-- ---------- master_assignments: what tribes actually booked ----------
+CREATE TABLE IF NOT EXISTS master_assignments (
+  id SERIAL PRIMARY KEY,
+  quarter_id INT NOT NULL REFERENCES quarters(id) ON DELETE CASCADE,
+  tribe_name TEXT,
+  app_name TEXT,
+  resource_name TEXT,
+  role TEXT,
+  assignment_type TEXT,
+  s1 BOOLEAN NOT NULL DEFAULT FALSE,
+  s2 BOOLEAN NOT NULL DEFAULT FALSE,
+  s3 BOOLEAN NOT NULL DEFAULT FALSE,
+  s4 BOOLEAN NOT NULL DEFAULT FALSE,
+  s5 BOOLEAN NOT NULL DEFAULT FALSE,
+  s6 BOOLEAN NOT NULL DEFAULT FALSE,
+  edited BOOLEAN NOT NULL DEFAULT FALSE,
+  updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+DO $$
+DECLARE
+  c text;
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                 WHERE table_schema = 'public' AND table_name = 'master_assignments' AND column_name = 'assignment_type')
+     AND EXISTS (SELECT 1 FROM information_schema.columns
+                 WHERE table_schema = 'public' AND table_name = 'master_assignments' AND column_name = 'assign_type') THEN
+    ALTER TABLE master_assignments RENAME COLUMN assign_type TO assignment_type;
+  END IF;
+
+  -- legacy SMALLINT 0/1 sprints -> BOOLEAN (every query treats them as booleans)
+  FOREACH c IN ARRAY ARRAY['s1','s2','s3','s4','s5','s6'] LOOP
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = 'public' AND table_name = 'master_assignments'
+                 AND column_name = c AND data_type <> 'boolean') THEN
+      EXECUTE format('ALTER TABLE master_assignments ALTER COLUMN %I DROP DEFAULT', c);
+      EXECUTE format('ALTER TABLE master_assignments ALTER COLUMN %I TYPE BOOLEAN USING (%I <> 0)', c, c);
+      EXECUTE format('ALTER TABLE master_assignments ALTER COLUMN %I SET DEFAULT FALSE', c);
+    END IF;
+  END LOOP;
+END $$;
+
+ALTER TABLE master_assignments ADD COLUMN IF NOT EXISTS quarter_id INT REFERENCES quarters(id) ON DELETE CASCADE;
+ALTER TABLE master_assignments ADD COLUMN IF NOT EXISTS tribe_name TEXT;
+ALTER TABLE master_assignments ADD COLUMN IF NOT EXISTS app_name TEXT;
+ALTER TABLE master_assignments ADD COLUMN IF NOT EXISTS resource_name TEXT;
+ALTER TABLE master_assignments ADD COLUMN IF NOT EXISTS role TEXT;
+ALTER TABLE master_assignments ADD COLUMN IF NOT EXISTS assignment_type TEXT;
+ALTER TABLE master_assignments ADD COLUMN IF NOT EXISTS s1 BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE master_assignments ADD COLUMN IF NOT EXISTS s2 BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE master_assignments ADD COLUMN IF NOT EXISTS s3 BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE master_assignments ADD COLUMN IF NOT EXISTS s4 BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE master_assignments ADD COLUMN IF NOT EXISTS s5 BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE master_assignments ADD COLUMN IF NOT EXISTS s6 BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE master_assignments ADD COLUMN IF NOT EXISTS edited BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE master_assignments ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT NOW();
+
+-- upsert identity used by POST /api/book-temp (ON CONFLICT target);
+-- skipped with a notice if legacy rows already violate it
+DO $$
+BEGIN
+  CREATE UNIQUE INDEX IF NOT EXISTS uq_ma_quarter_tribe_resource_role
+    ON master_assignments (quarter_id, tribe_name, resource_name, role);
+EXCEPTION WHEN unique_violation THEN
+  RAISE NOTICE 'uq_ma_quarter_tribe_resource_role not created: duplicate bookings exist';
+END $$;
+
+-- ---------- history snapshots (written by the admin upload) ----------
+CREATE TABLE IF NOT EXISTS history_resources (
+  quarter_id INT NOT NULL,
+  id INT,
+  name TEXT,
+  role TEXT
+);
+
+CREATE TABLE IF NOT EXISTS history_tribes (
+  quarter_id INT NOT NULL,
+  id INT,
+  name TEXT
+);
+
+CREATE TABLE IF NOT EXISTS history_apps (
+  quarter_id INT NOT NULL,
+  id INT,
+  name TEXT
+);
+
+CREATE TABLE IF NOT EXISTS history_temp_assignments (
+  quarter_id INT,
+  orig_id INT,
+  tribe_name TEXT,
+  app_name TEXT,
+  resource_id INT,
+  resource_name TEXT,
+  role TEXT,
+  assign_type TEXT,
+  reserved_sprints INT NOT NULL DEFAULT 0
+);
+ALTER TABLE history_temp_assignments ADD COLUMN IF NOT EXISTS orig_id INT;
+ALTER TABLE history_temp_assignments ADD COLUMN IF NOT EXISTS reserved_sprints INT NOT NULL DEFAULT 0;
+ALTER TABLE history_temp_assignments ALTER COLUMN resource_id DROP NOT NULL;
+
+-- history keeps its rows when a resource goes away
+DO $$
+DECLARE
+  conname text;
+BEGIN
+  BEGIN
+    ALTER TABLE history_temp_assignments
+      ADD CONSTRAINT hta_reserved_chk
+      CHECK (reserved_sprints >= 0 AND reserved_sprints <= 6);
+  EXCEPTION WHEN duplicate_object THEN
+  END;
+
+  SELECT c.conname
+  INTO conname
+  FROM pg_constraint c
+  JOIN pg_class t     ON t.oid = c.conrelid
+  JOIN pg_namespace n ON n.oid = t.relnamespace
+  WHERE c.contype = 'f'
+    AND t.relname = 'history_temp_assignments'
+    AND n.nspname = 'public'
+    AND c.confrelid = 'resources'::regclass
+    AND c.conname <> 'hta_resource_id_fkey';
+
+  IF conname IS NOT NULL THEN
+    EXECUTE format('ALTER TABLE history_temp_assignments DROP CONSTRAINT %I', conname);
+  END IF;
+
+  BEGIN
+    ALTER TABLE history_temp_assignments
+      ADD CONSTRAINT hta_resource_id_fkey
+      FOREIGN KEY (resource_id) REFERENCES resources(id) ON DELETE SET NULL;
+  EXCEPTION WHEN duplicate_object THEN
+  END;
+END $$;
+
+CREATE TABLE IF NOT EXISTS history_master_assignments (
+  quarter_id INT,
+  orig_id INT,
+  tribe_name TEXT,
+  app_name TEXT,
+  resource_name TEXT,
+  role TEXT,
+  assignment_type TEXT,
+  s1 BOOLEAN, s2 BOOLEAN, s3 BOOLEAN,
+  s4 BOOLEAN, s5 BOOLEAN, s6 BOOLEAN,
+  edited BOOLEAN,
+  updated_at TIMESTAMP
+);
+ALTER TABLE history_master_assignments ADD COLUMN IF NOT EXISTS orig_id INT;
+
+-- ---------- indexes for availability checks and lookups ----------
+CREATE INDEX IF NOT EXISTS idx_master_assignments_qid
+  ON master_assignments (quarter_id);
+
+CREATE INDEX IF NOT EXISTS idx_ma_quarter_resource
+  ON master_assignments (quarter_id, resource_name);
+
+CREATE INDEX IF NOT EXISTS idx_ma_quarter_resource_tribe
+  ON master_assignments (quarter_id, resource_name, tribe_name);
+
+CREATE INDEX IF NOT EXISTS idx_ta_quarter_res
+  ON temp_assignments (quarter_id, resource_id);
+
+CREATE INDEX IF NOT EXISTS idx_ta_quarter_res_tribe
+  ON temp_assignments (quarter_id, resource_id, tribe_id);
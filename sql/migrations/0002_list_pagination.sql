@@ -0,0 +1,25 @@
+-- sql/migrations/0002_list_pagination.sql
+-- Keyset pagination for /api/assignments and /api/temp-assignments: make the sort keys
+-- total (no NULLs) and give each listing a composite index in its ORDER BY.
+
+-- /api/assignments: ORDER BY updated_at DESC, id DESC
+UPDATE master_assignments SET updated_at = NOW() WHERE updated_at IS NULL;
+ALTER TABLE master_assignments ALTER COLUMN updated_at SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_ma_quarter_updated_id
+  ON master_assignments (quarter_id, updated_at DESC, id DESC);
+
+-- /api/temp-assignments: ORDER BY tribe_name, resource_name, id
+-- (denormalized names are what the upload writes; backfill rows that predate it)
+UPDATE temp_assignments ta
+SET resource_name = r.name
+FROM resources r
+WHERE r.id = ta.resource_id AND ta.resource_name IS DISTINCT FROM r.name;
+
+UPDATE temp_assignments ta
+SET tribe_name = t.name
+FROM tribes t
+WHERE t.id = ta.tribe_id AND ta.tribe_name IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_ta_quarter_tribe_resource_id
+  ON temp_assignments (quarter_id, tribe_name, resource_name, id);
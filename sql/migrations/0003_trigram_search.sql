@@ -0,0 +1,20 @@
+-- sql/migrations/0003_trigram_search.sql
+-- Substring filters (col ILIKE '%x%') and the ranked ?q= search can't use btree
+-- indexes; trigram GIN indexes serve both. pg_trgm is a trusted extension (PG13+),
+-- so the app role can install it.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- /api/assignments, /api/export
+CREATE INDEX IF NOT EXISTS idx_ma_tribe_trgm    ON master_assignments USING gin (tribe_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_ma_app_trgm      ON master_assignments USING gin (app_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_ma_resource_trgm ON master_assignments USING gin (resource_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_ma_role_trgm     ON master_assignments USING gin (role gin_trgm_ops);
+
+-- /api/temp-assignments (resource/role filters go through resources)
+CREATE INDEX IF NOT EXISTS idx_ta_tribe_trgm    ON temp_assignments USING gin (tribe_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_ta_app_trgm      ON temp_assignments USING gin (app_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_res_name_trgm    ON resources USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_res_role_trgm    ON resources USING gin (role gin_trgm_ops);
+
+-- assignment type is only ever 'Dedicated' / 'Shared'; a trigram index there would
+-- never beat the quarter_id scan, so it is left out on purpose.
@@ -0,0 +1,14 @@
+-- sql/migrations/0004_sprint_mask.sql
+-- Packed sprint bitmap next to the six booleans: bit 0 = s1 ... bit 5 = s6.
+-- Generated, so every writer of s1..s6 keeps it in sync for free; clash checks become
+-- bit_or(sprint_mask) and counts bit_count(mask::bit(6)).
+ALTER TABLE master_assignments
+  ADD COLUMN IF NOT EXISTS sprint_mask SMALLINT
+  GENERATED ALWAYS AS ((
+      (s1::int)      | (s2::int << 1) | (s3::int << 2) |
+      (s4::int << 3) | (s5::int << 4) | (s6::int << 5)
+  )::smallint) STORED;
+
+-- occupancy of one resource in a quarter, answered from the index alone
+CREATE INDEX IF NOT EXISTS idx_ma_quarter_resource_mask
+  ON master_assignments (quarter_id, resource_name) INCLUDE (tribe_name, sprint_mask);
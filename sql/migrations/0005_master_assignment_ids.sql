@@ -0,0 +1,42 @@
+-- sql/migrations/0005_master_assignment_ids.sql
+-- master_assignments gets integer keys to resources/tribes so availability and booking
+-- lookups join on ids instead of names (and survive renames). Names stay for display.
+ALTER TABLE master_assignments ADD COLUMN IF NOT EXISTS resource_id INT;
+ALTER TABLE master_assignments ADD COLUMN IF NOT EXISTS tribe_id INT;
+
+UPDATE master_assignments ma
+SET resource_id = r.id
+FROM resources r
+WHERE r.name = ma.resource_name AND ma.resource_id IS NULL;
+
+UPDATE master_assignments ma
+SET tribe_id = t.id
+FROM tribes t
+WHERE t.name = ma.tribe_name AND ma.tribe_id IS NULL;
+
+DO $$
+BEGIN
+  BEGIN
+    ALTER TABLE master_assignments
+      ADD CONSTRAINT master_assignments_resource_id_fkey
+      FOREIGN KEY (resource_id) REFERENCES resources(id) ON DELETE CASCADE;
+  EXCEPTION WHEN duplicate_object THEN
+  END;
+  BEGIN
+    ALTER TABLE master_assignments
+      ADD CONSTRAINT master_assignments_tribe_id_fkey
+      FOREIGN KEY (tribe_id) REFERENCES tribes(id) ON DELETE CASCADE;
+  EXCEPTION WHEN duplicate_object THEN
+  END;
+END $$;
+
+-- occupancy of one resource (all tribes), answered from the index alone
+CREATE INDEX IF NOT EXISTS idx_ma_quarter_rid_mask
+  ON master_assignments (quarter_id, resource_id) INCLUDE (tribe_id, tribe_name, sprint_mask);
+
+-- one tribe's row on one resource
+CREATE INDEX IF NOT EXISTS idx_ma_quarter_tribe_rid
+  ON master_assignments (quarter_id, tribe_id, resource_id);
+
+-- superseded by idx_ma_quarter_rid_mask
+DROP INDEX IF EXISTS idx_ma_quarter_resource_mask;
@@ -0,0 +1,18 @@
+-- sql/migrations/0006_upload_jobs.sql
+-- Upload job registry (jobs.py PgJobStore): progress readable from every server
+-- process and across restarts. Rows are short-lived: jobs.py evicts by age and count.
+CREATE TABLE IF NOT EXISTS upload_jobs (
+  id TEXT PRIMARY KEY,
+  status TEXT NOT NULL DEFAULT 'queued',   -- queued | running | done | error
+  phase TEXT,
+  percent SMALLINT NOT NULL DEFAULT 0,
+  row_count INT,
+  target_quarter_id INT,
+  error TEXT,
+  created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+  started_at TIMESTAMP,
+  finished_at TIMESTAMP,
+  updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_upload_jobs_created ON upload_jobs (created_at DESC);
@@ -0,0 +1,6 @@
+-- sql/migrations/0007_upload_queue.sql
+-- Upload executor state on the job row (jobs.py): which quarter a job targets, its
+-- place in the queue, and a cancel flag any server process can set.
+ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS target TEXT;
+ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS queue_position INT;
+ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS cancel_requested BOOLEAN NOT NULL DEFAULT FALSE;
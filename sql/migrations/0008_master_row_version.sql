@@ -0,0 +1,22 @@
+-- sql/migrations/0008_master_row_version.sql
+-- Monotonic version per master_assignments row, taken from one sequence on every
+-- INSERT and UPDATE. Booking writers hold the (quarter, resource) advisory lock, so
+-- for one resource the versions follow commit order: occupancy.py keeps an index cell
+-- only if its MAX(row_version) is at least what it already has (a late refresh that
+-- read older rows can't overwrite a newer one).
+CREATE SEQUENCE IF NOT EXISTS master_assignments_version_seq;
+
+ALTER TABLE master_assignments
+  ADD COLUMN IF NOT EXISTS row_version BIGINT NOT NULL DEFAULT nextval('master_assignments_version_seq');
+
+CREATE OR REPLACE FUNCTION master_assignments_bump_version() RETURNS trigger AS $$
+BEGIN
+  NEW.row_version := nextval('master_assignments_version_seq');
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_master_assignments_version ON master_assignments;
+CREATE TRIGGER trg_master_assignments_version
+  BEFORE UPDATE ON master_assignments
+  FOR EACH ROW EXECUTE FUNCTION master_assignments_bump_version();
@@ -0,0 +1,16 @@
+-- sql/migrations/0009_upload_jobs_active_target.sql
+-- At most one queued/running upload per target quarter, across every server process
+-- (jobs.Executor checks its own process first; this catches the others).
+-- Older duplicates, if any, are closed first so the index can be built.
+UPDATE upload_jobs j
+SET status = 'error', error = 'Superseded by a newer upload for the same quarter',
+    queue_position = NULL, finished_at = NOW(), updated_at = NOW()
+WHERE status IN ('queued', 'running')
+  AND target IS NOT NULL
+  AND EXISTS (
+    SELECT 1 FROM upload_jobs n
+    WHERE n.target = j.target AND n.status IN ('queued', 'running') AND (n.created_at, n.id) > (j.created_at, j.id)
+  );
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_upload_jobs_active_target
+  ON upload_jobs (target) WHERE status IN ('queued', 'running');
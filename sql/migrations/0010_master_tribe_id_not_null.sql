@@ -0,0 +1,27 @@
+-- sql/migrations/0010_master_tribe_id_not_null.sql
+-- Booking checks and sprint caps tell tribes apart by master_assignments.tribe_id
+-- (`tribe_id IS DISTINCT FROM :tid`, `= tmp.tribe_id`), so a row 0005 couldn't backfill
+-- would count as another tribe's booking, even against its own tribe. Backfill once more
+-- (tribes may have been added since), refuse to go on while any row still has no tribe,
+-- then make tribe_id required.
+UPDATE master_assignments ma
+SET tribe_id = t.id
+FROM tribes t
+WHERE t.name = ma.tribe_name AND ma.tribe_id IS NULL;
+
+DO $$
+DECLARE
+  n INT;
+  names TEXT;
+BEGIN
+  SELECT COUNT(*), string_agg(DISTINCT COALESCE(quote_literal(tribe_name), 'NULL'), ', ')
+  INTO n, names
+  FROM master_assignments
+  WHERE tribe_id IS NULL;
+  IF n > 0 THEN
+    RAISE EXCEPTION '% master_assignments rows have a tribe_name with no tribes row: %', n, names
+      USING HINT = 'Add the missing tribes (or fix/delete those rows), then restart to migrate.';
+  END IF;
+END $$;
+
+ALTER TABLE master_assignments ALTER COLUMN tribe_id SET NOT NULL;
@@ -1,7 +1,13 @@
 -- sql/seed_sample.sql
 -- Set current quarter and minimal sample temp rows (your example).
-INSERT INTO quarters(label, is_current) VALUES ('2025Q3', TRUE)
-ON CONFLICT (label) DO UPDATE SET is_current = EXCLUDED.is_current;
+-- Run after the migrations (python scripts/db_init.py does both).
+UPDATE quarters SET is_current = FALSE WHERE COALESCE(code, name) <> '2025Q3';
+
+INSERT INTO quarters(code, name, is_current)
+SELECT '2025Q3', '2025Q3', TRUE
+WHERE NOT EXISTS (SELECT 1 FROM quarters WHERE code = '2025Q3' OR name = '2025Q3');
+
+UPDATE quarters SET is_current = TRUE WHERE code = '2025Q3' OR name = '2025Q3';
 
 INSERT INTO tribes(name) VALUES
   ('Digital Tribe'), ('Business Operations'), ('Fixed')
@@ -11,10 +17,27 @@ INSERT INTO apps(name) VALUES
   ('B2CCRM/ULA'), ('CRM/RBM/BSSTEAI')
 ON CONFLICT (name) DO NOTHING;
 
-WITH q AS (SELECT id FROM quarters WHERE is_current = TRUE)
-INSERT INTO temp_assignments(quarter_id, tribe_id, app_id, resource_name, role, assign_type)
-VALUES
-((SELECT id FROM q), (SELECT id FROM tribes WHERE name='Digital Tribe'),       (SELECT id FROM apps WHERE name='B2CCRM/ULA'),      'Mohanad Bin Taleb',    'Designer',  'Dedicated'),
-((SELECT id FROM q), (SELECT id FROM tribes WHERE name='Business Operations'), (SELECT id FROM apps WHERE name='B2CCRM/ULA'),      'Siri Chandana Vemana', 'Developer', 'Dedicated'),
-((SELECT id FROM q), (SELECT id FROM tribes WHERE name='Fixed'),               (SELECT id FROM apps WHERE name='CRM/RBM/BSSTEAI'), 'Abhishekha Behera',    'Tester',    'Shared')
-ON CONFLICT DO NOTHING;
+INSERT INTO resources(name, role) VALUES
+  ('Mohanad Bin Taleb', 'Designer'),
+  ('Siri Chandana Vemana', 'Developer'),
+  ('Abhishekha Behera', 'Tester')
+ON CONFLICT (name) DO NOTHING;
+
+WITH q AS (SELECT id FROM quarters WHERE is_current = TRUE),
+v(tribe, app, resource, role, assign_type, reserved_sprints) AS (
+  VALUES
+  ('Digital Tribe',       'B2CCRM/ULA',      'Mohanad Bin Taleb',    'Designer',  'Dedicated', 6),
+  ('Business Operations', 'B2CCRM/ULA',      'Siri Chandana Vemana', 'Developer', 'Dedicated', 6),
+  ('Fixed',               'CRM/RBM/BSSTEAI', 'Abhishekha Behera',    'Tester',    'Shared',    3)
+)
+INSERT INTO temp_assignments(quarter_id, tribe_id, app_id, tribe_name, app_name,
+                             resource_id, resource_name, role, assign_type, reserved_sprints)
+SELECT (SELECT id FROM q), t.id, a.id, v.tribe, v.app, r.id, v.resource, v.role, v.assign_type, v.reserved_sprints
+FROM v
+JOIN tribes t    ON t.name = v.tribe
+JOIN apps a      ON a.name = v.app
+JOIN resources r ON r.name = v.resource
+WHERE NOT EXISTS (
+  SELECT 1 FROM temp_assignments ta
+  WHERE ta.quarter_id = (SELECT id FROM q) AND ta.resource_id = r.id AND ta.tribe_id = t.id
+);
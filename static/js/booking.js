@@ -46,8 +46,18 @@
     }
   };
 
-  const renderRows = (items=[]) => {
+  // ----- Paging (/api/temp-assignments returns next_cursor until the last page) -----
+  let nextCursor = null;
+  const moreBtn = document.createElement('button');
+  moreBtn.className = 'btn btn-outline-secondary btn-sm d-block mx-auto my-2 d-none';
+  moreBtn.textContent = 'Load more';
+  (els.tableBody.closest('.scroll-wrap') || els.tableBody.closest('table'))?.after(moreBtn);
+  moreBtn.addEventListener('click', () => load({source: 'more', more: true}));
+  const syncMore = () => moreBtn.classList.toggle('d-none', !nextCursor);
+
+  const renderRows = (items=[], {append=false} = {}) => {
     if (!Array.isArray(items) || items.length === 0) {
+      if (append) return;
       els.tableBody.innerHTML = `<tr><td colspan="7" class="text-center py-3 text-muted">No matching rows</td></tr>`;
       els.ok?.setAttribute('disabled', 'true');
       styleSelectOk();     
@@ -67,23 +77,38 @@
         </tr>
       `;
     }).join('');
+    if (append) {
+      els.tableBody.insertAdjacentHTML('beforeend', rowsHtml);
+      return; // keep the current selection
+    }
     els.tableBody.innerHTML = rowsHtml;
     els.ok?.setAttribute('disabled', 'true'); // reset until a row is chosen
   };
 
   // ----- Load function (public) -----
-  async function load({source} = {}) {
-    setLoading(true);
-    const q = buildQuery();
+  // {more: true} appends the next page; anything else reloads from the first page
+  async function load({source, more=false} = {}) {
+    if (more && !nextCursor) return;
+    if (!more) setLoading(true);
+    const p = new URLSearchParams(buildQuery());
+    if (more) p.set('cursor', nextCursor);
+    const q = p.toString();
     const url = q ? `/api/temp-assignments?${q}` : `/api/temp-assignments`;
+    moreBtn.disabled = true;
     try {
-      const resp = await fetch(url);
+      const resp = await fetchWithETag(url);
       const text = await resp.text();
       if (!resp.ok) throw new Error(text);
       const json = JSON.parse(text);
-      renderRows(json.items || []);
+      renderRows(json.items || [], {append: more});
+      nextCursor = json.next_cursor || null;
     } catch (err) {
+      if (more) { alert(`Failed to load more: ${String(err).slice(0,200)}`); return; }
+      nextCursor = null;
       els.tableBody.innerHTML = `<tr><td colspan="7" class="text-danger py-3">Failed to load: ${String(err).slice(0,200)}</td></tr>`;
+    } finally {
+      moreBtn.disabled = false;
+      syncMore();
     }
   }
 
@@ -0,0 +1,29 @@
+// Conditional GET for the list endpoints: remember the ETag + body per URL and send
+// If-None-Match next time. A 304 is turned back into a normal 200 Response built from
+// the cached body, so callers use it exactly like fetch().
+(function(){
+  const cache = new Map(); // url -> { etag, body, headers }
+  const MAX_ENTRIES = 200;
+
+  async function fetchWithETag(url, opts = {}){
+    const hit = cache.get(url);
+    const headers = new Headers(opts.headers || {});
+    if (hit) headers.set('If-None-Match', hit.etag);
+
+    const resp = await fetch(url, { ...opts, headers });
+    if (resp.status === 304 && hit) {
+      return new Response(hit.body, { status: 200, headers: hit.headers });
+    }
+
+    const etag = resp.headers.get('ETag');
+    if (!resp.ok || !etag) return resp;
+
+    const body = await resp.text();
+    cache.delete(url);
+    cache.set(url, { etag, body, headers: new Headers(resp.headers) });
+    if (cache.size > MAX_ENTRIES) cache.delete(cache.keys().next().value); // oldest first
+    return new Response(body, { status: resp.status, headers: resp.headers });
+  }
+
+  window.fetchWithETag = fetchWithETag;
+})();
@@ -4,8 +4,16 @@ function qsa(sel, root=document){ return Array.from(root.querySelectorAll(sel));
 
 let _loadingAssignments = false; // prevent overlapping loads
 
+// ---- paging (/api/assignments is keyset-paged; cursor comes back in X-Next-Cursor) ----
+const PAGE_SIZE = 200;
+let _asgCursor = null;  // cursor of the next unseen page (null = everything loaded)
+let _asgPages  = 1;     // pages currently shown; a refresh re-reads this many
+
+// row objects bound to the rendered <tr>s (edit handlers close over them), by id
+const _rowById = new Map();
+
 async function fetchJSON(url){
-  const r = await fetch(url);
+  const r = await fetchWithETag(url);
   const t = await r.text();
   if (!r.ok) { throw new Error(t.slice(0, 400)); }
   try { return JSON.parse(t); } catch { throw new Error(t.slice(0, 400)); }
@@ -35,9 +43,12 @@ function sprintsToText(row){
 }
 
 // --- FAST local availability (no network) ---
-// Caches populated once and refreshed with loadAssignments()
-const _ASG = { rows: [], byResRole: new Map() }; // key: `${resource}::${row.role||""}`
+// Caches populated once and refreshed with loadAssignments().
+// Only trusted when they hold the whole quarter (no filters, every page loaded);
+// otherwise edit mode asks /api/availability.
+const _ASG = { rows: [], byResRole: new Map(), complete: false }; // key: `${resource}::${row.role||""}`
 const _CAP = new Map(); // key: `${tribe}::${resource}::${role||""}` -> { reserved, type }
+let _capComplete = false;
 
 function _keyResRole(name, role){ return `${name}::${role||""}`; }
 function _keyCap(tribe, name, role){ return `${tribe}::${name}::${role||""}`; }
@@ -45,12 +56,14 @@ function _keyCap(tribe, name, role){ return `${tribe}::${name}::${role||""}`; }
 async function warmAvailabilityCaches(){
   // We already call /api/assignments in loadAssignments(); just make sure we also load temp caps once.
   // Safe to call multiple times; it just refreshes the maps.
+  // One bounded request; if the quarter has more reservations than that, edit mode uses the server.
   try {
-    const temps = await fetchJSON("/api/temp-assignments");
+    const temps = await fetchJSON("/api/temp-assignments?limit=1000");
     _CAP.clear();
     for (const t of (temps.items || [])){
       _CAP.set(_keyCap(t.tribe, t.resource_name, t.role), { reserved: Number(t.reserved||0), type: t.type || "Shared" });
     }
+    _capComplete = !temps.next_cursor;
   } catch {}
 }
 
@@ -122,16 +135,28 @@ function createActionCell(row, tr, tdS){
       btn.disabled = true;              // optional UX
       btn.textContent = "…";            // optional UX
 
-      // INSTANT: compute availability locally (no network)
-      const avail = availabilityFromCaches(row);
+      // INSTANT when the caches hold the whole quarter; otherwise ask the server
+      let avail;
+      if (_ASG.complete && _capComplete) {
+        avail = availabilityFromCaches(row);
+        // (OPTIONAL) also kick off a background refresh to keep data fresh,
+        // but DO NOT await it (so UI stays instant)
+        fetchAvailabilityForRow(row).catch(()=>{ /* ignore */ });
+      } else {
+        try {
+          avail = await fetchAvailabilityForRow(row);
+        } catch (err) {
+          alert(String(err.message || err));
+          btn.textContent = "Edit";
+          btn.disabled = false;
+          btn.dataset.busy = "0";
+          return;
+        }
+      }
       const blocked = avail.blocked;
       const mine    = avail.mine;
       const capPerTribe   = avail.cap_per_tribe;
       const bookedByTribe = avail.booked_by_tribe;
-
-      // (OPTIONAL) also kick off a background refresh to keep data fresh,
-      // but DO NOT await it (so UI stays instant)
-      fetchAvailabilityForRow(row).catch(()=>{ /* ignore */ });
   
       const wrap = document.createElement("div");
       wrap.className = "sprint-inline";
@@ -253,6 +278,7 @@ function createActionCell(row, tr, tdS){
 function buildRow(row){
   const tr = document.createElement("tr");
   tr.dataset.id = String(row.id);
+  _rowById.set(String(row.id), row);
 
   for (const key of ["tribe_name","app_name","role","resource_name","assignment_type"]){
     const td = document.createElement("td");
@@ -281,21 +307,86 @@ function buildRow(row){
   return tr;
 }
 
-async function loadAssignments(){
+async function fetchAssignmentsPage(cursor){
+  const p = { ...getFilters(), limit: PAGE_SIZE };
+  if (cursor) p.cursor = cursor;
+  const r = await fetchWithETag("/api/assignments" + toQS(p));
+  const t = await r.text();
+  if (!r.ok) { throw new Error(t.slice(0, 400)); }
+  let rows; try { rows = JSON.parse(t); } catch { throw new Error(t.slice(0, 400)); }
+  return { rows, next: r.headers.get("X-Next-Cursor") || null };
+}
+
+function _indexAssignments(rows){
+  for (const r of rows){
+    const k = _keyResRole(r.resource_name, r.role);
+    if (!_ASG.byResRole.has(k)) _ASG.byResRole.set(k, []);
+    _ASG.byResRole.get(k).push(r);
+  }
+}
+
+function _syncMoreButton(){
+  const tbody = $("assignBody");
+  if (!tbody) return;
+  let btn = $("assignMore");
+  if (!btn){
+    btn = document.createElement("button");
+    btn.id = "assignMore";
+    btn.className = "btn btn-outline-secondary btn-sm d-block mx-auto my-2";
+    btn.textContent = "Load more";
+    btn.addEventListener("click", () => loadAssignments({ more: true }));
+    const wrap = tbody.closest(".scroll-wrap") || tbody.closest("table");
+    wrap.after(btn);
+  }
+  btn.classList.toggle("d-none", !_asgCursor);
+}
+
+function _hasFilters(){
+  return Object.values(getFilters()).some(Boolean);
+}
+
+// Default: re-read the pages already on screen (page by page) and reconcile the table.
+// {more: true}: append the next page only.
+async function loadAssignments({ more = false } = {}){
   if (_loadingAssignments) return; // don't overlap
+  if (more && !_asgCursor) return;
   _loadingAssignments = true;
   try {
     const tbody = $("assignBody");
-    const latest = await fetchJSON("/api/assignments" + toQS(getFilters()));
+
+    if (more){
+      const page = await fetchAssignmentsPage(_asgCursor);
+      _asgCursor = page.next;
+      _asgPages++;
+      _ASG.rows = _ASG.rows.concat(page.rows);
+      _indexAssignments(page.rows);
+      _ASG.complete = !_asgCursor && !_hasFilters();
+      const frag = document.createDocumentFragment();
+      for (const row of page.rows){
+        if (!tbody.querySelector(`tr[data-id="${row.id}"]`)) frag.appendChild(buildRow(row));
+      }
+      tbody.appendChild(frag);
+      return;
+    }
+
+    let latest = [];
+    let cursor = null;
+    let pages = 0;
+    do {
+      const page = await fetchAssignmentsPage(cursor);
+      latest = latest.concat(page.rows);
+      cursor = page.next;
+      pages++;
+    } while (cursor && pages < _asgPages);
+    _asgCursor = cursor;
+    _asgPages = pages;
 
     // --- refresh local caches for instant edit mode ---
     _ASG.rows = latest;
     _ASG.byResRole.clear();
-    for (const r of latest){
-      const k = _keyResRole(r.resource_name, r.role);
-      if (!_ASG.byResRole.has(k)) _ASG.byResRole.set(k, []);
-      _ASG.byResRole.get(k).push(r);
-    }
+    _indexAssignments(latest);
+    _ASG.complete = !_asgCursor && !_hasFilters();
+    _availCache.clear();
     
     // index existing
     const existing = new Map();
@@ -306,6 +397,9 @@ async function loadAssignments(){
     for (const row of latest){
       let tr = existing.get(String(row.id));
       if (tr){
+        // keep the row object the edit handler holds in sync
+        const bound = _rowById.get(String(row.id));
+        if (bound && bound !== row) Object.assign(bound, row);
         // update text if needed
         const cells = tr.querySelectorAll("td");
         const values = [row.tribe_name,row.app_name,row.role,row.resource_name,row.assignment_type];
@@ -328,18 +422,81 @@ async function loadAssignments(){
     }
 
     // remove stale
-    for (const [id, tr] of existing.entries()) tr.remove();
+    for (const [id, tr] of existing.entries()) { tr.remove(); _rowById.delete(id); }
 
     // append new ones
     tbody.appendChild(frag);
   } finally {
     _loadingAssignments = false;
+    _syncMoreButton();
+  }
+}
+
+// ---- live updates (/api/events, Server-Sent Events) ----
+function _renderEdited(tr, row){
+  const note = tr.querySelector(".edited-note");
+  if (!note) return;
+  note.innerHTML = row.edited
+    ? `<span class="edited-at">(edited at ${new Date(row.updated_at || Date.now()).toLocaleString()})</span>`
+    : "";
+}
+
+// Patch one booked row in place from an `assignment` event; unknown ids mean a new
+// booking somewhere, which needs the server's ordering, so re-read the visible pages.
+function applyAssignmentEvent(ev){
+  _availCache.clear();
+  const row = _rowById.get(String(ev.id));
+  const tr = $("assignBody")?.querySelector(`tr[data-id="${ev.id}"]`);
+  if (!row || !tr){
+    if (ev.created || !_asgCursor) loadAssignments();
+    return;
+  }
+  const cached = _ASG.rows.find(r => String(r.id) === String(ev.id));
+  for (const r of cached && cached !== row ? [row, cached] : [row]){
+    for (let i=1;i<=6;i++) r[`s${i}`] = !!((ev.sprint_mask >> (i-1)) & 1);
+    if (ev.edited) r.edited = true;
+    r.updated_at = new Date().toISOString();
   }
+
+  const tdS = tr.querySelectorAll("td")[5];
+  if (tdS && tdS.dataset.mode === "view") tdS.textContent = sprintsToText(row);
+  _renderEdited(tr, row);
+}
+
+function startLiveUpdates(){
+  if (!window.EventSource){
+    setInterval(() => loadAssignments(), 30000); // old browsers: keep polling
+    return;
+  }
+  let dropped = false;
+  const es = new EventSource("/api/events");
+  es.addEventListener("assignment", (e) => {
+    try { applyAssignmentEvent(JSON.parse(e.data)); } catch {}
+  });
+  es.addEventListener("reload", () => {
+    _availCache.clear();
+    loadAssignments();
+    warmAvailabilityCaches();
+    window.loadTempAssignments?.();
+  });
+  es.addEventListener("resync", () => { dropped = true; });
+  es.onerror = () => {
+    dropped = true;                          // the browser reconnects by itself...
+    if (es.readyState === EventSource.CLOSED) {
+      // ...unless the server refused the stream (503: all slots busy): poll, retry later
+      const poll = setInterval(() => loadAssignments(), 30000);
+      setTimeout(() => { clearInterval(poll); loadAssignments(); startLiveUpdates(); }, 120000);
+    }
+  };
+  es.onopen = () => {
+    // anything published while we were disconnected was missed: catch up once
+    if (dropped) { dropped = false; loadAssignments(); }
+  };
 }
 
 function initView(){
   ["fTribe","fApp","fRole","fResource","fType"].forEach(id => {
-    const el = $(id); if(el) el.addEventListener("input", loadAssignments);
+    const el = $(id); if(el) el.addEventListener("input", () => { _asgPages = 1; loadAssignments(); });
   });
   const exportBtn = $("exportBtn");
   if(exportBtn){
@@ -349,7 +506,7 @@ function initView(){
     });
   }
   loadAssignments();
-  setInterval(loadAssignments, 30000); // lighter polling; we refresh on edits anyway
+  startLiveUpdates(); // server pushes changes; no polling
 }
 
 document.addEventListener("DOMContentLoaded", () => {
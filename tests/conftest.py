@@ -0,0 +1,6 @@
+# tests/conftest.py
+# The app modules live at the repo root and are imported by name (as app.py does).
+# Tests that need Postgres skip themselves when DATABASE_URL is unset.
+import os, sys
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
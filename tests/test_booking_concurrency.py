@@ -0,0 +1,101 @@
+# tests/test_booking_concurrency.py
+# Concurrent /api/book-temp and /api/book-batch calls on one resource (the real app via
+# its test client, many threads) must leave it within its caps: no sprint held by more
+# tribes than allowed, no tribe over its reserved sprints (6 at most), one row per tribe.
+# Runs against DATABASE_URL; the resource's master_assignments rows in the current quarter
+# are put back afterwards, but use a scratch database.
+import os, random, threading
+from collections import Counter
+import pytest
+
+if not os.getenv("DATABASE_URL"):
+    pytest.skip("DATABASE_URL is not set", allow_module_level=True)
+
+from app import create_app
+from db import fetch_all, transaction, get_current_qid
+from migrate import ensure_current
+from scripts.booking_stress import _temps, _pick_resource, _check
+import occupancy
+
+THREADS = 8
+REQUESTS = 160
+BATCH_EVERY = 4
+
+
+@pytest.fixture
+def target():
+    """(qid, rid, temps) for the busiest resource; its booked rows are restored afterwards."""
+    ensure_current()
+    qid = get_current_qid()
+    rid = _pick_resource(qid) if qid else None
+    temps = _temps(qid, rid) if rid else []
+    if not temps:
+        pytest.skip("no temp assignments in the current quarter")
+    before = {r["id"]: int(r["sprint_mask"] or 0) for r in fetch_all("""
+        SELECT id, sprint_mask FROM master_assignments
+        WHERE quarter_id = :qid AND resource_id = :rid
+    """, qid=qid, rid=rid)}
+    try:
+        yield qid, rid, temps
+    finally:
+        with transaction() as tx:
+            tx.execute("""
+                DELETE FROM master_assignments
+                WHERE quarter_id = :qid AND resource_id = :rid AND NOT (id = ANY(:ids))
+            """, qid=qid, rid=rid, ids=list(before))
+            for aid, mask in before.items():
+                tx.execute(f"""
+                    UPDATE master_assignments
+                    SET {", ".join(f"{c} = :{c}" for c in occupancy.SPRINTS)}
+                    WHERE id = :id
+                """, id=aid, **occupancy.to_columns(mask))
+        occupancy.invalidate(qid)
+
+
+def _hammer(app, temps) -> Counter:
+    statuses, lock = Counter(), threading.Lock()
+    todo = iter(range(REQUESTS))
+
+    def worker(seed):
+        client, rnd = app.test_client(), random.Random(seed)
+        while True:
+            with lock:
+                n = next(todo, None)
+            if n is None:
+                return
+            if n % BATCH_EVERY == 0:
+                items = [{"temp_id": t["id"], "sprints": rnd.sample(range(1, 7), rnd.randint(1, 3))}
+                         for t in rnd.sample(temps, min(len(temps), 3))]
+                resp = client.post("/api/book-batch", json={"items": items, "partial": True})
+            else:
+                resp = client.post(f"/api/book-temp/{rnd.choice(temps)['id']}",
+                                   json={"sprints": rnd.sample(range(1, 7), rnd.randint(1, 3))})
+            with lock:
+                statuses[resp.status_code] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return statuses
+
+
+def test_concurrent_bookings_stay_within_caps(target):
+    qid, rid, temps = target
+    statuses = _hammer(create_app(), temps)
+    assert not statuses.get(500), f"server errors: {dict(statuses)}"
+
+    rows = fetch_all("""
+        SELECT tribe_name, sprint_mask FROM master_assignments
+        WHERE quarter_id = :qid AND resource_id = :rid
+    """, qid=qid, rid=rid)
+    held = Counter()
+    for r in rows:
+        held[r["tribe_name"]] += occupancy.popcount(int(r["sprint_mask"] or 0))
+    assert max(held.values(), default=0) <= len(occupancy.SPRINTS), dict(held)
+    dupes = [t for t, n in Counter(r["tribe_name"] for r in rows).items() if n > 1]
+    assert not dupes, f"tribes with more than one row: {dupes}"
+
+    problems, _ = _check(qid, rid, temps, int(os.getenv("SHARED_MAX_TRIBES_PER_SPRINT", "3")))
+    assert not problems
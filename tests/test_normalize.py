@@ -0,0 +1,43 @@
+# tests/test_normalize.py
+# Golden check for the upload path: what _normalize_chunk + _stage_upload stage, chunk by
+# chunk, must equal the whole-sheet implementation it replaced (bench/normalize.py
+# `reference`: normalize, drop duplicates, classify) row for row.
+# Needs Postgres (the dedup/classify step runs in SQL); only a temp table is written.
+import os
+import pytest
+
+pd = pytest.importorskip("pandas")
+if not os.getenv("DATABASE_URL"):
+    pytest.skip("DATABASE_URL is not set", allow_module_level=True)
+
+from bench.normalize import messy_sheet, reference
+from db import transaction
+from ingest import iter_chunks
+from routes.admin import _stage_upload
+
+COLS = ["tribe", "app", "resource", "role", "reserved_sprints", "assign_type"]
+
+
+def _staged(df: pd.DataFrame, chunk_rows: int) -> list[tuple]:
+    with transaction() as tx:
+        _stage_upload(tx, iter_chunks(df, chunk_rows=chunk_rows))
+        return [tuple(r[c] for c in COLS) for r in tx.fetch_all(f"""
+            SELECT {", ".join(COLS)} FROM _upload_stage ORDER BY seq
+        """)]
+
+
+@pytest.mark.parametrize("seed,rows,chunk_rows", [
+    (0, 5000, 5000),  # one chunk
+    (1, 5000, 700),   # duplicates and resources split across chunks
+    (2, 1000, 1),
+])
+def test_staged_rows_match_reference(seed, rows, chunk_rows):
+    df = messy_sheet(rows, seed)
+    expected = [tuple(r) for r in reference(df.copy())[COLS].itertuples(index=False, name=None)]
+    assert _staged(df, chunk_rows) == expected
+
+
+def test_missing_columns_rejected():
+    df = messy_sheet(10, 0).drop(columns=["Role"])
+    with pytest.raises(ValueError, match="Missing required columns: role"):
+        _staged(df, 5)